@@ -1,20 +1,33 @@
 # app.py — Flask final para TTN v3 + ThingsBoard (CON epoch_s integrado + MULTI-NODO)
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import os
-import traceback
-from datetime import datetime
-import pytz
-
-from utils.procesamiento_temp import procesar_temperatura
-from utils.procesamiento_accel import procesar_acelerometro
-from utils.procesamiento_gps import procesar_gps
-from utils.envio_thingsboard import enviar_a_thingsboard
+import time
+import atexit
+from math import ceil
+
+_T_INICIO = time.perf_counter()
+
+from utils.parseo import normalizar, leer_json, cargar_json
+from utils.pipeline import clave_dispositivo, clave_animal, ts_lectura, procesar, procesar_lote, EstadoHato
+from utils.cola_thingsboard import ColaThingsBoard, ts_ms
+from utils.outbox import crear_desde_entorno as crear_outbox
+from utils.serie_tiempo import crear_desde_entorno as crear_serie_tiempo
+from utils.modelo_temp import gestor_modelo
+from utils.trayectorias import AlmacenTrayectorias
+from utils.linea_base import LineaBaseAnimal
+from utils.celo import DetectorCelo
+from utils.geocercas import Geocercas
+from utils.agregacion import AgregadorTelemetria
+from utils.duplicados import CacheDuplicados, clave_uplink
+from utils.admision import ControlAdmision, dispositivo_rapido, clave_admision
+from utils.reorden import BufferOrden
+from utils.dispositivos import RegistroDispositivos, desde_dict_tokens
+from utils.logs import obtener_logger, registrar_secretos, configurar as configurar_logs
+from utils.metricas import REGISTRO, ETAPAS, UPLINKS, ESTADOS, rss_bytes
 
 app = Flask(__name__)
-
-# ───────── Zona horaria ─────────
-TZ = pytz.timezone("America/Bogota")
+log = obtener_logger("app")
 
 # ───────────────────────────────────────────────────────────────
 # 🔥 TOKENS DE THINGSBOARD POR NODO (rellena con tus tokens reales)
@@ -32,6 +45,12 @@ TZ = pytz.timezone("America/Bogota")
 #    "nodo-temp-1": "TOKEN1",
 #    "nodo-temp-2": "TOKEN2",
 # }
+#
+# Para muchos collares usa un archivo de registro (JSON/CSV/SQLite) en
+# DISPOSITIVOS_PATH con columnas dev_eui, device_id, cow_id, token y ajustes
+# extra por dispositivo (p. ej. `potrero` para las geocercas). Se recarga solo al
+# cambiar; DEVICE_TOKENS queda como base. La búsqueda es por DevEUI o device_id;
+# DISPOSITIVOS_POR_COW_ID=1 acepta además el cow_id del payload como último recurso.
 
 DEVICE_TOKENS = {
     "AC1F09FFFE1D8048": "bMGUo9y39gbdPXJD7yRn",
@@ -41,197 +60,460 @@ DEVICE_TOKENS = {
 # Base URL de ThingsBoard
 TB_BASE = os.getenv("THINGSBOARD_BASE", "https://thingsboard.cloud")
 
+# Registro de dispositivos (los tokens nunca deben aparecer en los logs)
+registro_dispositivos = RegistroDispositivos(
+    os.getenv("DISPOSITIVOS_PATH"),
+    base=desde_dict_tokens(DEVICE_TOKENS),
+    intervalo_s=float(os.getenv("DISPOSITIVOS_REVISION_S", 2)),
+    al_recargar=lambda reg: registrar_secretos(reg.tokens()),
+    por_cow_id=os.getenv("DISPOSITIVOS_POR_COW_ID", "0") == "1",
+)
+
+# Cola de envío en segundo plano (el webhook no espera a TB)
+cola_tb = ColaThingsBoard(
+    TB_BASE,
+    max_items=int(os.getenv("TB_COLA_MAX", 10000)),
+    workers=int(os.getenv("TB_WORKERS", 2)),
+    lote_max=int(os.getenv("TB_LOTE_MAX", 100)),
+    espera_encolar_s=float(os.getenv("TB_ESPERA_ENCOLAR_S", 0)),
+    timeout=float(os.getenv("TB_TIMEOUT_S", 5)),
+)
+# Outbox persistente: lo que TB no recibe se guarda en disco y se reenvía
+cola_tb.outbox = crear_outbox(cola_tb.enviar, lote_max=cola_tb.lote_max)
+
+# Estado por animal: trayectorias (distancia/velocidad/rectitud entre uplinks),
+# línea base de temperatura por hora del día y detector de celo por ventanas
+estado_hato = EstadoHato(
+    trayectorias=AlmacenTrayectorias(
+        capacidad=int(os.getenv("TRAY_CAPACIDAD", 32)),
+        ventana_s=float(os.getenv("TRAY_VENTANA_S", 3600)),
+        inactividad_s=float(os.getenv("TRAY_INACTIVIDAD_S", 86400)),
+    ),
+    linea_base=LineaBaseAnimal(
+        os.getenv("LINEA_BASE_PATH", "linea_base.npz") or None,
+        alpha=float(os.getenv("LINEA_BASE_ALPHA", 0.05)),
+        umbral_z=float(os.getenv("LINEA_BASE_UMBRAL_Z", 2.5)),
+    ),
+    celo=DetectorCelo(
+        ventana_s=float(os.getenv("CELO_VENTANA_S", 2 * 3600)),
+        umbral_inicio=float(os.getenv("CELO_UMBRAL_INICIO", 0.6)),
+        umbral_fin=float(os.getenv("CELO_UMBRAL_FIN", 0.3)),
+        confirmaciones=int(os.getenv("CELO_CONFIRMACIONES", 2)),
+    ),
+)
+
+
+def _potrero_asignado(norm):
+    dispositivo = registro_dispositivos.resolver_norm(norm)
+    return dispositivo.ajustes.get("potrero") if dispositivo else None
+
+
+# Geocercas: polígonos de potreros (GeoJSON); el potrero asignado a cada animal
+# sale del ajuste `potrero` del registro de dispositivos
+if os.getenv("GEOCERCAS_PATH"):
+    estado_hato.geocercas = Geocercas.desde_geojson(os.getenv("GEOCERCAS_PATH"), asignado=_potrero_asignado)
+
+# Modo agregado (0 = deshabilitado): un resumen por dispositivo y ventana en lugar de
+# una escritura a TB por uplink; las alertas (AGREGACION_URGENTES) pasan de inmediato
+_ventana_agregacion = float(os.getenv("AGREGACION_VENTANA_S", 0))
+agregador = AgregadorTelemetria(
+    cola_tb.encolar_lote,
+    ventana_s=_ventana_agregacion,
+    urgentes=[e.strip() for e in os.getenv("AGREGACION_URGENTES", "alerta_celo").split(",") if e.strip()],
+) if _ventana_agregacion > 0 else None
+
+# Historial local de la telemetría procesada (consultas por rango y agregados)
+serie_tiempo = crear_serie_tiempo()
+
+# Deduplicación de uplinks (reintentos de TTN / copias por varios gateways)
+duplicados = CacheDuplicados(
+    ttl_s=float(os.getenv("DEDUP_TTL_S", 600)),
+    max_items=int(os.getenv("DEDUP_MAX", 200_000)),
+)
+
+# Control de admisión: 429 inmediato, sin procesar, cuando un collar supera su cupo
+# (ADMISION_TASA_S uplinks/s, ráfagas de ADMISION_RAFAGA) o cuando ya hay
+# ADMISION_MAX_CONCURRENTES peticiones en curso. 0 deshabilita cada límite.
+admision = ControlAdmision(
+    tasa_s=float(os.getenv("ADMISION_TASA_S", 0)),
+    rafaga=float(os.getenv("ADMISION_RAFAGA", 10)),
+    max_concurrentes=int(os.getenv("ADMISION_MAX_CONCURRENTES", 0)),
+    espera_s=float(os.getenv("ADMISION_ESPERA_S", 0)),
+    max_dispositivos=int(os.getenv("ADMISION_MAX_DISPOSITIVOS", 100_000)),
+)
+
+# Buffer de orden por animal (0 = deshabilitado: se procesa al recibir).
+# Con retardo, el webhook responde sin `data` y el procesamiento ocurre al liberarse.
+_retardo_orden = float(os.getenv("ORDEN_RETARDO_S", 0))
+# El último ts liberado por animal se olvida con el mismo TTL y tope que la deduplicación
+reorden = BufferOrden(lambda item: _procesar_reordenado(item), retardo_s=_retardo_orden,
+                      max_items=int(os.getenv("ORDEN_MAX", 10000)),
+                      ttl_s=duplicados.ttl_s, max_claves=duplicados.max_items) if _retardo_orden > 0 else None
+
+# Modelo de temperatura: se carga una vez al arrancar (no por uplink)
+gestor_modelo.cargar()
+
+# Estado de la cola y del modelo como gauges en /metrics
+REGISTRO.medidor("cola_tb", "Contadores y tamaño de la cola de envío a ThingsBoard",
+                 cola_tb.estadisticas, ("campo",))
+if cola_tb.outbox is not None:
+    REGISTRO.medidor("outbox_tb", "Estado del outbox persistente hacia ThingsBoard",
+                     cola_tb.outbox.estadisticas, ("campo",))
+if serie_tiempo is not None:
+    REGISTRO.medidor("serie_tiempo", "Escrituras del historial local de telemetría",
+                     serie_tiempo.estadisticas, ("campo",))
+REGISTRO.medidor("modelo_temp", "Caché y disponibilidad del modelo de temperatura",
+                 gestor_modelo.estado, ("campo",))
+REGISTRO.medidor("dedup", "Caché de uplinks duplicados", duplicados.estadisticas, ("campo",))
+REGISTRO.medidor("admision", "Peticiones admitidas, limitadas y en curso en las rutas de uplink",
+                 admision.estadisticas, ("campo",))
+REGISTRO.medidor("admision_limitados", "Rechazos por cupo de los dispositivos más limitados",
+                 admision.limitados, ("dispositivo",))
+if agregador is not None:
+    REGISTRO.medidor("agregacion", "Lecturas acumuladas y resúmenes emitidos en modo agregado",
+                     agregador.estadisticas, ("campo",))
+if reorden is not None:
+    REGISTRO.medidor("reorden", "Buffer de orden por animal", reorden.estadisticas, ("campo",))
+REGISTRO.medidor("proceso_rss_bytes", "Memoria residente del proceso (worker)", rss_bytes)
+
+
+# ───────────────────────────────────────────────────────────────
+# HILOS DE FONDO (por proceso)
+# ───────────────────────────────────────────────────────────────
+# Con gunicorn + preload_app el módulo se importa una vez en el master
+# (modelo, registro y numpy quedan compartidos copy-on-write) y los hilos
+# se arrancan en cada worker desde post_fork; ver gunicorn.conf.py.
+_servicios = {"pid": None}
+
+
+def iniciar_servicios():
+    """Arranca los hilos de fondo de este proceso (idempotente por PID)."""
+    if _servicios["pid"] == os.getpid():
+        return
+    _servicios["pid"] = os.getpid()
+    configurar_logs()
+    if cola_tb.outbox is not None:
+        cola_tb.outbox.iniciar()  # reenvía lo que haya quedado de una ejecución anterior
+    cola_tb.iniciar()
+    if reorden is not None:
+        reorden.iniciar()
+    if agregador is not None:
+        agregador.iniciar()
+    estado_hato.linea_base.iniciar()
+    if serie_tiempo is not None:
+        serie_tiempo.iniciar()
+    atexit.register(detener_servicios)
+
+
+def detener_servicios(timeout=None):
+    """
+    Apagado ordenado: primero se vacía la cola TB (lo que falle o no alcance a salir
+    en APAGADO_TIMEOUT_S cae al outbox), luego se persisten historial, outbox y línea base.
+    """
+    if _servicios["pid"] != os.getpid():
+        return
+    _servicios["pid"] = None
+    timeout = float(os.getenv("APAGADO_TIMEOUT_S", 10) if timeout is None else timeout)
+    log.info("🛑 Deteniendo servicios (cola TB: %d pendientes)", cola_tb.estadisticas()["pendientes"])
+    if reorden is not None:
+        reorden.detener()  # procesa y encola lo retenido antes de vaciar la cola
+    if agregador is not None:
+        agregador.detener()  # emite los resúmenes de las ventanas abiertas
+    cola_tb.detener(timeout)
+    if serie_tiempo is not None:
+        serie_tiempo.detener()
+    if cola_tb.outbox is not None:
+        cola_tb.outbox.detener()
+    estado_hato.linea_base.detener()
+
+
+if not os.getenv("INICIO_DIFERIDO"):
+    iniciar_servicios()
+log.info("🚀 App cargada en %.0f ms (RSS %.1f MB)",
+         (time.perf_counter() - _T_INICIO) * 1000, rss_bytes() / 2**20)
+
 
 # ───────────────────────────────────────────────────────────────
 # ENDPOINT SALUD
 # ───────────────────────────────────────────────────────────────
 @app.get("/")
 def health():
-    return jsonify({"ok": True, "service": "iot_ganaderia"})
-
-
-# ===================================================================
-# PARSEO DE UPLINK TTN V3  (AQUÍ TOMAMOS epoch_s ENVIADO POR TU NODO)
-# ===================================================================
-def _parse_ttn_v3(body: dict):
-    end_ids = body.get("end_device_ids") or {}
-
-    dev_id = end_ids.get("device_id")
-    dev_eui = end_ids.get("dev_eui")  # para caso DevEUI
-
-    uplink = body.get("uplink_message") or {}
-    dec = uplink.get("decoded_payload") or {}
-
-    # 1. Valor epoch enviado por tu nodo LoRaWAN
-    ts_epoch = dec.get("epoch_s")
-
-    received_at = body.get("received_at") or uplink.get("received_at")
-    local_iso = None
-    if received_at:
-        try:
-            dt_utc = datetime.fromisoformat(received_at.replace("Z", "+00:00"))
-            local_iso = dt_utc.astimezone(TZ).isoformat()
-        except:
-            pass
-
-    # GPS
-    lat = dec.get("latitude") or dec.get("lat")
-    lon = dec.get("longitude") or dec.get("lon")
+    return jsonify({
+        "ok": True,
+        "service": "iot_ganaderia",
+        "cola_tb": cola_tb.estadisticas(),
+        "outbox_tb": cola_tb.outbox.estadisticas() if cola_tb.outbox is not None else None,
+        "serie_tiempo": serie_tiempo.estadisticas() if serie_tiempo is not None else None,
+        "dedup": duplicados.estadisticas(),
+        "admision": {**admision.estadisticas(), "limitados": admision.limitados(5)},
+        "reorden": reorden.estadisticas() if reorden is not None else None,
+        "agregacion": agregador.estadisticas() if agregador is not None else None,
+        "modelo_temp": gestor_modelo.estado(),
+    })
 
-    # fallback usando gateway metadata
-    if lat is None or lon is None:
-        rxm = uplink.get("rx_metadata") or []
-        if isinstance(rxm, list) and rxm:
-            loc = rxm[0].get("location") or {}
-            lat = loc.get("latitude", lat)
-            lon = loc.get("longitude", lon)
 
-    return {
-        "dev_id": dev_id,          # por device_id
-        "dev_eui": dev_eui,        # por DevEUI (más seguro)
-
-        "cow_id": dec.get("cow_id"),
-
-        "temp_body_c": dec.get("To_c") or dec.get("temp_body_c"),
-        "temp_amb_c":  dec.get("Ta_c") or dec.get("temp_amb_c"),
-
-        "humedad":     dec.get("humedad", 65),
-
-        "v_max_ms":    dec.get("v_max_ms"),
-        "v_mean_ms":   dec.get("v_mean_ms"),
-        "ODBA_g":      dec.get("ODBA_g"),
-        "VeDBA_g":     dec.get("VeDBA_g"),
-
-        "lat": lat,
-        "lon": lon,
-
-        "ts_epoch": ts_epoch,
-        "received_local_iso": local_iso
-    }
+@app.get("/metrics")
+def metrics():
+    return Response(REGISTRO.exponer(), mimetype="text/plain; version=0.0.4")
 
 
 # ===================================================================
-# PARSEO FORMATO PLANO (no TTN)
+# MANEJO COMPLETO DEL UPLINK
 # ===================================================================
-def _parse_flat(body: dict):
-    return {
-        "dev_id":      body.get("dev_id"),
-        "dev_eui":     body.get("dev_eui"),
+def _token_tb(norm):
+    dispositivo = registro_dispositivos.resolver_norm(norm)
+    return dispositivo.token if dispositivo else None
+
+
+def _log_evento_celo(salida):
+    evento = salida.get("celo_evento")
+    if evento == "inicio":
+        log.info("🐄 Inicio de celo: vaca %s (confianza %.2f)",
+                 salida.get("cow_id") or salida.get("dev_eui"), salida.get("celo_confianza") or 0)
+    elif evento == "fin":
+        log.info("🐄 Fin de celo: vaca %s", salida.get("cow_id") or salida.get("dev_eui"))
+
+
+def _procesar_y_encolar(norm, tb_token):
+    # ───────────────────────────────────────────
+    # 4. Procesamientos → telemetría final (se envía a TB)
+    # ───────────────────────────────────────────
+    salida = procesar(norm, estado_hato)
+    ESTADOS.inc(salida["estado_general"])
+
+    log.info("✅ PARSED: %s", salida, extra={"muestreo": True})
+    _log_evento_celo(salida)
+    _log_evento_cerca(salida)
+    if serie_tiempo is not None:
+        serie_tiempo.agregar(salida, clave_animal(norm))
+
+    # ───────────────────────────────────────────
+    # 5. Encolar para ThingsBoard (envío en segundo plano) o acumular en el resumen
+    # ───────────────────────────────────────────
+    with ETAPAS.medir("encolado"):
+        if agregador is not None:
+            encolado = agregador.agregar(tb_token, salida)
+        else:
+            encolado = cola_tb.encolar(tb_token, salida, salida["ts"])
+    if not encolado:
+        duplicados.olvidar(clave_uplink(norm))
+        log.warning("⚠️ Cola TB llena, telemetría descartada para %s", clave_dispositivo(norm))
+    UPLINKS.inc("ok" if encolado else "cola_llena")
+    return salida, encolado
 
-        "cow_id":      body.get("cow_id"),
 
-        "temp_body_c": body.get("temp_body_c"),
-        "temp_amb_c":  body.get("temp_amb_c"),
+def _procesar_reordenado(item):
+    norm, tb_token = item
+    try:
+        _procesar_y_encolar(norm, tb_token)
+    except Exception:
+        duplicados.olvidar(clave_uplink(norm))
+        raise
 
-        "humedad": body.get("humedad", 65),
 
-        "v_max_ms":  body.get("v_max_ms"),
-        "v_mean_ms": body.get("v_mean_ms"),
-        "ODBA_g":    body.get("ODBA_g"),
-        "VeDBA_g":   body.get("VeDBA_g"),
+def _log_evento_cerca(salida):
+    evento = salida.get("cerca_evento")
+    if evento == "salida":
+        log.warning("🚧 Vaca %s fuera de su potrero (en %s)",
+                    salida.get("cow_id") or salida.get("dev_eui"), salida.get("potrero") or "ningún potrero")
+    elif evento == "entrada":
+        log.info("🚧 Vaca %s volvió a su potrero (%s)", salida.get("cow_id") or salida.get("dev_eui"),
+                 salida.get("potrero"))
 
-        "lat": body.get("lat"),
-        "lon": body.get("lon"),
 
-        "ts_epoch": body.get("ts_epoch"),
-        "received_local_iso": None
-    }
+def _handle_uplink():
+    with ETAPAS.medir("total"):
+        return _handle_uplink_medido()
 
 
-# ===================================================================
-# MANEJO COMPLETO DEL UPLINK
-# ===================================================================
-def _handle_uplink():
+def _handle_uplink_medido():
+    clave = None
     try:
-        body = request.get_json(force=True, silent=True) or {}
-        print("📩 RAW BODY:", body)
+        with ETAPAS.medir("json"):
+            body = leer_json(request.get_data())
+            if not isinstance(body, dict):
+                body = {}
+        log.debug("📩 RAW BODY: %s", body, extra={"muestreo": True})
 
         # 1. Normalización según TTN o plano
-        if "uplink_message" in body or "end_device_ids" in body:
-            norm = _parse_ttn_v3(body)
-        else:
-            norm = _parse_flat(body)
+        with ETAPAS.medir("parseo"):
+            norm = normalizar(body)
 
-        # Si TTN no envió timestamp, usar local
-        if not norm.get("received_local_iso"):
-            norm["received_local_iso"] = datetime.now(TZ).isoformat()
+        # 2. Copias repetidas (reintentos de TTN, varios gateways) → fuera antes de procesar
+        # (la clave se retira si el uplink no termina encolado: el reintento no es duplicado)
+        clave = clave_uplink(norm)
+        if duplicados.visto(clave):
+            UPLINKS.inc("duplicado")
+            return jsonify({"ok": True, "duplicado": True}), 200
 
         # ───────────────────────────────────────────
-        # 🔥 2. Identificar el nodo → seleccionar token TB
+        # 🔥 3. Identificar el nodo → seleccionar token TB
         # ───────────────────────────────────────────
-        # Preferimos DevEUI (más estable)
-        dev_key = norm.get("dev_eui") or norm.get("dev_id")
+        dev_key = clave_dispositivo(norm)
 
-        tb_token = DEVICE_TOKENS.get(dev_key)
+        tb_token = _token_tb(norm)
         if not tb_token:
-            print(f"❌ No existe token TB para nodo: {dev_key}")
+            log.warning("❌ No existe token TB para nodo: %s", dev_key)
+            duplicados.olvidar(clave)
+            UPLINKS.inc("sin_token")
             return jsonify({"ok": False, "error": f"No TB token for {dev_key}"}), 400
 
-        # URL del dispositivo específico en TB
-        tb_url = f"{TB_BASE}/api/v1/{tb_token}/telemetry"
-        print("📡 Enviando a TB URL:", tb_url)
+        # Con buffer de orden, el procesamiento ocurre al liberarse (en orden de ts por animal)
+        if reorden is not None:
+            reorden.agregar(clave_animal(norm), ts_lectura(norm), (norm, tb_token))
+            return jsonify({"ok": True, "diferido": True}), 200
 
-        # ───────────────────────────────────────────
-        # 3. Procesamientos
-        # ───────────────────────────────────────────
-        resultados_temp  = procesar_temperatura(
-            norm.get("temp_body_c"),
-            norm.get("temp_amb_c"),
-            norm.get("humedad")
-        )
-
-        resultados_accel = procesar_acelerometro({
-            "v_max_ms":  norm.get("v_max_ms"),
-            "v_mean_ms": norm.get("v_mean_ms"),
-            "ODBA_g":    norm.get("ODBA_g"),
-            "VeDBA_g":   norm.get("VeDBA_g"),
-        })
-
-        resultados_gps = procesar_gps({
-            "lat": norm.get("lat"),
-            "lon": norm.get("lon")
-        })
+        salida, encolado = _procesar_y_encolar(norm, tb_token)
+        return jsonify({"ok": True, "data": salida, "encolado": encolado}), 200
 
-        # ───────────────────────────────────────────
-        # 4. Telemetría final (se envía a TB)
-        # ───────────────────────────────────────────
-        salida = {
-            "ts_epoch": norm.get("ts_epoch"),
-            "timestamp_local": norm["received_local_iso"],
-
-            "dev_id": norm.get("dev_id"),
-            "dev_eui": norm.get("dev_eui"),
-            "cow_id": norm.get("cow_id"),
+    except Exception as e:
+        log.exception("❌ Error procesando uplink: %s", e)
+        duplicados.olvidar(clave)
+        UPLINKS.inc("error")
+        return jsonify({"ok": False, "error": str(e)}), 200
 
-            **(resultados_temp or {}),
-            **(resultados_accel or {}),
-            **(resultados_gps or {})
-        }
 
-        # Estado general
-        salida["estado_general"] = (
-            "alerta_celo"
-            if salida.get("estado") == "posible_celo" and salida.get("actividad") == "alta"
-            else salida.get("estado", "desconocido")
-        )
+# ===================================================================
+# MANEJO DE UPLINKS EN LOTE (array JSON o NDJSON)
+# ===================================================================
+def _leer_cuerpos_lote(raw: bytes):
+    """Devuelve la lista de cuerpos: array JSON, o NDJSON (un objeto por línea)."""
+    texto = raw.decode("utf-8", errors="replace").strip()
+    if not texto:
+        return []
+    if texto.startswith("["):
+        datos = cargar_json(texto)
+        return datos if isinstance(datos, list) else [datos]
+    cuerpos = []
+    for linea in texto.splitlines():
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            cuerpos.append(cargar_json(linea))
+        except ValueError:
+            cuerpos.append(None)  # se reporta como error en su posición
+    return cuerpos
 
-        print("✅ PARSED:", salida)
 
-        # ───────────────────────────────────────────
-        # 5. Envío final a ThingsBoard
-        # ───────────────────────────────────────────
+def _handle_uplink_lote():
+    try:
+        cuerpos = _leer_cuerpos_lote(request.get_data())
+    except ValueError as e:
+        return jsonify({"ok": False, "error": f"JSON inválido: {e}"}), 400
+
+    items = [{"indice": i, "ok": False} for i in range(len(cuerpos))]
+    norms, tokens, posiciones = [], [], []
+    claves = {}  # posición → clave de deduplicación (se retira si el ítem no termina encolado)
+
+    # 1. Normalización + token por ítem
+    for i, body in enumerate(cuerpos):
+        if not isinstance(body, dict):
+            items[i]["error"] = "JSON inválido"
+            continue
         try:
-            enviar_a_thingsboard(tb_url, salida)
+            norm = normalizar(body)
         except Exception as e:
-            print("⚠️ Error enviando a ThingsBoard:", e)
-
-        return jsonify({"ok": True, "data": salida}), 200
-
+            items[i]["error"] = str(e)
+            continue
+        dev_key = clave_dispositivo(norm)
+        items[i]["dev"] = dev_key
+        clave_cupo = clave_admision(norm)
+        espera = admision.consumir(clave_cupo)
+        if espera > 0:
+            admision.registrar_limitado(clave_cupo)
+            items[i].update(error="limitado", reintentar_en_s=round(espera, 1))
+            continue
+        claves[i] = clave_uplink(norm)
+        if duplicados.visto(claves[i]):
+            items[i].update(ok=True, duplicado=True)
+            continue
+        tb_token = _token_tb(norm)
+        if not tb_token:
+            duplicados.olvidar(claves[i])
+            items[i]["error"] = f"No TB token for {dev_key}"
+            continue
+        norms.append(norm)
+        tokens.append(tb_token)
+        posiciones.append(i)
+
+    # 2. Procesamiento vectorizado
+    try:
+        with ETAPAS.medir("lote"):
+            salidas = procesar_lote(norms, estado_hato)
     except Exception as e:
-        print("❌ Error procesando uplink:", e)
-        print(traceback.format_exc())
+        log.exception("❌ Error procesando lote: %s", e)
+        for i in posiciones:
+            duplicados.olvidar(claves[i])
+        UPLINKS.inc("error", n=len(norms))
         return jsonify({"ok": False, "error": str(e)}), 200
 
+    # 3. Agrupar por token → un elemento de cola (una petición TB) por dispositivo
+    #    (en modo agregado cada salida va al resumen de su dispositivo)
+    grupos = {}
+    for salida, token, i in zip(salidas, tokens, posiciones):
+        grupos.setdefault(token, []).append((i, salida))
+    for token, miembros in grupos.items():
+        if agregador is not None:
+            encolados = [agregador.agregar(token, salida) for _, salida in miembros]
+        else:
+            puntos = [{"ts": ts_ms(s["ts"]), "values": s} for _, s in miembros]
+            encolados = [cola_tb.encolar_lote(token, puntos)] * len(miembros)
+        for (i, salida), encolado in zip(miembros, encolados):
+            if not encolado:
+                duplicados.olvidar(claves[i])
+            items[i].update(ok=True, encolado=encolado, estado_general=salida["estado_general"])
+
+    for salida, norm in zip(salidas, norms):
+        ESTADOS.inc(salida["estado_general"])
+        _log_evento_celo(salida)
+        _log_evento_cerca(salida)
+        if serie_tiempo is not None:
+            serie_tiempo.agregar(salida, clave_animal(norm))
+    repetidos = sum(1 for it in items if it.get("duplicado"))
+    limitados = sum(1 for it in items if it.get("error") == "limitado")
+    procesados = sum(1 for it in items if it["ok"]) - repetidos
+    UPLINKS.inc("ok", n=procesados)
+    UPLINKS.inc("duplicado", n=repetidos)
+    UPLINKS.inc("limitado_dispositivo", n=limitados)
+    UPLINKS.inc("rechazado_lote", n=len(items) - procesados - repetidos - limitados)
+    log.info("📦 Lote: %d/%d uplinks procesados, %d dispositivos", procesados, len(items), len(grupos))
+    return jsonify({
+        "ok": True,
+        "total": len(items),
+        "procesados": procesados,
+        "duplicados": repetidos,
+        "limitados": limitados,
+        "dispositivos": len(grupos),
+        "items": items,
+    }), 200
+
+
+# ===================================================================
+# ADMISIÓN (antes de parsear: un collar ruidoso no degrada al resto)
+# ===================================================================
+_CUERPOS_429 = {
+    motivo: ('{"ok": false, "error": "%s"}' % texto).encode()
+    for motivo, texto in (("dispositivo", "Límite de uplinks del dispositivo superado"),
+                          ("global", "Servidor saturado, reintenta más tarde"))
+}
+
+
+def _limitado(motivo, reintentar_s):
+    UPLINKS.inc("limitado_" + motivo)
+    return Response(_CUERPOS_429[motivo], 429, mimetype="application/json",
+                    headers={"Retry-After": str(max(1, ceil(reintentar_s)))})
+
+
+def _con_admision(manejar, dispositivo=None):
+    rechazo = admision.admitir(dispositivo)
+    if rechazo is not None:
+        return _limitado(*rechazo)
+    try:
+        return manejar()
+    finally:
+        admision.salir(dispositivo)
+
 
 # ===================================================================
 # RUTAS
@@ -240,14 +522,52 @@ def _handle_uplink():
 @app.post("/ttn-data/uplink")
 @app.post("/uplink")
 def uplink_root():
-    return _handle_uplink()
+    dispositivo = dispositivo_rapido(request.get_data()) if admision.por_dispositivo else None
+    return _con_admision(_handle_uplink, dispositivo)
+
+
+@app.post("/uplink/lote")
+@app.post("/ttn-data/lote")
+def uplink_lote():
+    # el lote ocupa un cupo global; el cupo por dispositivo se descuenta ítem a ítem
+    return _con_admision(_handle_uplink_lote)
+
+
+# ===================================================================
+# HISTORIAL LOCAL
+# ===================================================================
+def _rango_consulta():
+    """desde/hasta (epoch s) de la query string; por defecto las últimas 24 h."""
+    hasta = float(request.args.get("hasta", time.time()))
+    desde = float(request.args.get("desde", hasta - 86400))
+    return desde, hasta
+
+
+@app.get("/historial")
+@app.get("/historial/<clave>")
+def historial(clave=None):
+    """
+    Agregados por intervalo (`paso` en s, múltiplo de 3600) para un animal o todo el hato.
+    Con `clave` y `crudo=1` devuelve las lecturas del rango.
+    """
+    if serie_tiempo is None:
+        return jsonify({"ok": False, "error": "historial deshabilitado"}), 404
+    try:
+        desde, hasta = _rango_consulta()
+        if clave is not None and request.args.get("crudo") == "1":
+            return jsonify({"ok": True, "clave": clave, "lecturas": serie_tiempo.rango(clave, desde, hasta)})
+        paso = int(request.args.get("paso", 3600))
+        return jsonify({"ok": True, "agregados": serie_tiempo.agregados(desde, hasta, paso, clave)})
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
 
 
 # ===================================================================
 # MAIN
 # ===================================================================
+# Desarrollo: python app.py  ·  Producción: gunicorn -c gunicorn.conf.py wsgi:app
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
-    print(f"🔥 Servidor corriendo en: http://0.0.0.0:{port}/")
+    log.info("🔥 Servidor corriendo en: http://0.0.0.0:%d/", port)
     app.run(host="0.0.0.0", port=port)
 
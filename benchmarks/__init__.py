@@ -0,0 +1 @@
+# Benchmarks del servicio (se ejecutan con `python -m benchmarks.<modulo>`)
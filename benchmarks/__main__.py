@@ -0,0 +1,65 @@
+# Suite completa: corre todos los benchmarks con tamaños cortos y emite un solo reporte JSON
+#
+#   python -m benchmarks --salida historial_bench.ndjson
+#   python -m benchmarks --solo procesar app_cliente
+#
+# Cada benchmark corre en su propio proceso: app.py se importa una vez por proceso
+# (cola, deduplicación y estado por animal no se arrastran entre corridas) y la
+# memoria medida es la de ese benchmark.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.comun import contexto, emitir
+
+# nombre → (módulo, argumentos de la corrida corta)
+SUITE = {
+    "procesar": ("bench_procesar", ["--collares", "200", "--lecturas", "5000", "--lote", "500"]),
+    "app_cliente": ("bench_app", ["--modo", "cliente", "--collares", "100", "--uplinks", "2000"]),
+    "app_http": ("bench_app", ["--modo", "http", "--collares", "100", "--uplinks", "2000",
+                               "--tb-latencia-ms", "20", "--tb-errores", "0.01"]),
+    "app_lote": ("bench_app", ["--modo", "http", "--collares", "100", "--uplinks", "5000", "--lote", "100"]),
+    "parseo": ("bench_parseo", ["--mensajes", "5000", "--repeticiones", "3"]),
+    "gps": ("bench_gps", ["--puntos", "20000", "--repeticiones", "3"]),
+    "celo": ("bench_celo", ["--animales", "100", "--dias", "2"]),
+    "serie": ("bench_serie", ["--animales", "50", "--dias", "7"]),
+    "geocercas": ("bench_geocercas", ["--potreros", "1000", "--puntos", "20000"]),
+}
+
+_RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def correr(modulo, argumentos, timeout=900):
+    """Ejecuta `python -m benchmarks.<modulo>` y devuelve su reporte (sin los metadatos de contexto)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        salida = os.path.join(tmp, "reporte.ndjson")
+        proc = subprocess.run([sys.executable, "-m", f"benchmarks.{modulo}", *argumentos, "--salida", salida],
+                              cwd=_RAIZ_REPO, capture_output=True, text=True, timeout=timeout)
+        if proc.returncode != 0 or not os.path.exists(salida):
+            return {"error": (proc.stderr or proc.stdout).strip().splitlines()[-1:]}
+        with open(salida, encoding="utf-8") as f:
+            reporte = json.loads(f.read().splitlines()[-1])
+    for clave in contexto():
+        reporte.pop(clave, None)
+    return reporte
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--solo", nargs="+", choices=list(SUITE), help="subconjunto de benchmarks")
+    ap.add_argument("--salida", help="agrega el reporte a este NDJSON (historial de corridas)")
+    args = ap.parse_args(argv)
+
+    reporte = {}
+    for nombre in args.solo or SUITE:
+        print(f"… {nombre}", file=sys.stderr)
+        reporte[nombre] = correr(*SUITE[nombre])
+    return emitir(reporte, args.salida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# Benchmark de extremo a extremo: uplinks sintéticos → app Flask → cola → ThingsBoard simulado
+#
+#   python -m benchmarks.bench_app --modo cliente --collares 200 --uplinks 5000
+#   python -m benchmarks.bench_app --modo http --concurrencia 8 --tb-latencia-ms 50 --tb-errores 0.02
+#   python -m benchmarks.bench_app --modo http --lote 100 --salida historial.ndjson
+#   python -m benchmarks.bench_app --agregacion-ventana 900   (modo agregado: puntos enviados a TB)
+#   python -m benchmarks.bench_app --admision-tasa 1 --max-concurrentes 4   (respuestas 429 por motivo)
+#
+# En modo `cliente` se usa el test client de Flask (sin red); en modo `http` la app
+# corre en un servidor werkzeug con hilos. Ambos comparten proceso (y GIL) con el
+# generador de carga y el ThingsBoard simulado. Para medir un despliegue real usa
+# --url contra gunicorn, con el registro que escribe `benchmarks.generador --registro`.
+# app.py se importa una vez por proceso: cada corrida va en su propio proceso.
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.comun import emitir, resumen_latencias
+from benchmarks.generador import GeneradorUplinks, escribir_registro
+from benchmarks.tb_simulado import ThingsBoardSimulado
+from utils.logs import RAIZ
+from utils.metricas import rss_bytes
+
+_MB = 2 ** 20
+
+
+def _cargar_app(args, tmp, tb_url):
+    """Importa app.py apuntando a ThingsBoard simulado, con registro y archivos en `tmp`."""
+    registro = os.path.join(tmp, "dispositivos.json")
+    escribir_registro(registro, args.collares)
+    os.environ.update({
+        "THINGSBOARD_BASE": tb_url,
+        "DISPOSITIVOS_PATH": registro,
+        "OUTBOX_PATH": os.path.join(tmp, "outbox.sqlite3") if args.outbox else "",
+        "SERIE_TIEMPO_PATH": os.path.join(tmp, "serie.sqlite3") if args.historial else "",
+        "LINEA_BASE_PATH": "",
+        "AGREGACION_VENTANA_S": str(args.agregacion_ventana),
+        "ADMISION_TASA_S": str(args.admision_tasa),
+        "ADMISION_RAFAGA": str(args.admision_rafaga),
+        "ADMISION_MAX_CONCURRENTES": str(args.max_concurrentes),
+        "LOG_LEVEL": args.log_level,
+        "INICIO_DIFERIDO": "1",
+    })
+    import app as modulo
+    # los logs se configuran al primer import de utils, antes de fijar LOG_LEVEL
+    logging.getLogger(RAIZ).setLevel(args.log_level.upper())
+    modulo.iniciar_servicios()
+    return modulo
+
+
+def _particionar(cuerpos, n):
+    """Reparte los uplinks en `n` flujos; los de un mismo collar van al mismo flujo (en orden)."""
+    flujos = [[] for _ in range(n)]
+    for c in cuerpos:
+        dev = c["end_device_ids"]["device_id"].encode()
+        flujos[zlib.crc32(dev) % n].append(c)
+    return flujos
+
+
+def _peticiones(flujo, lote):
+    """Cuerpos HTTP (bytes) de un flujo: uno por uplink o arrays JSON de `lote` uplinks."""
+    if lote > 1:
+        return [(json.dumps(flujo[i:i + lote]).encode(), len(flujo[i:i + lote]))
+                for i in range(0, len(flujo), lote)]
+    return [(json.dumps(c).encode(), 1) for c in flujo]
+
+
+class _Resultado:
+    def __init__(self):
+        self.latencias = []
+        self.respuestas = {"ok": 0, "limitado": 0, "error_app": 0, "error_http": 0, "error_red": 0}
+        self.uplinks_ok = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, latencia, clave, uplinks_ok=0):
+        with self._lock:
+            self.latencias.append(latencia)
+            self.respuestas[clave] += 1
+            self.uplinks_ok += uplinks_ok
+
+
+def _clasificar(status, datos, n):
+    if status == 429:
+        return "limitado", 0
+    if status != 200:
+        return "error_http", 0
+    if not datos.get("ok"):
+        return "error_app", 0
+    return "ok", datos.get("procesados", n) if n > 1 else 1
+
+
+def _cliente_flask(modulo):
+    cliente = modulo.app.test_client()
+
+    def enviar(ruta, cuerpo):
+        r = cliente.post(ruta, data=cuerpo, content_type="application/json")
+        return r.status_code, r.get_json(silent=True) or {}
+    return enviar
+
+
+def _cliente_http(url):
+    local = threading.local()
+
+    def enviar(ruta, cuerpo):
+        sesion = getattr(local, "sesion", None)
+        if sesion is None:
+            sesion = local.sesion = requests.Session()
+        r = sesion.post(url + ruta, data=cuerpo, headers={"Content-Type": "application/json"}, timeout=30)
+        try:
+            return r.status_code, r.json()
+        except ValueError:
+            return r.status_code, {}
+    return enviar
+
+
+def _generar_carga(enviar, flujos, lote, concurrencia):
+    ruta = "/uplink/lote" if lote > 1 else "/uplink"
+    res = _Resultado()
+
+    def correr(peticiones):
+        for cuerpo, n in peticiones:
+            t0 = time.perf_counter()
+            try:
+                status, datos = enviar(ruta, cuerpo)
+            except requests.RequestException:
+                res.registrar(time.perf_counter() - t0, "error_red")
+                continue
+            res.registrar(time.perf_counter() - t0, *_clasificar(status, datos, n))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrencia) as pool:
+        list(pool.map(correr, flujos))
+    return res, time.perf_counter() - t0
+
+
+def _servidor_http(modulo):
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    servidor = make_server("127.0.0.1", 0, modulo.app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, name="app-http", daemon=True).start()
+    return servidor
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--modo", choices=("cliente", "http"), default="cliente")
+    ap.add_argument("--collares", type=int, default=200)
+    ap.add_argument("--uplinks", type=int, default=5000)
+    ap.add_argument("--concurrencia", type=int, default=4, help="hilos generadores de carga")
+    ap.add_argument("--lote", type=int, default=1, help=">1 usa /uplink/lote con arrays de ese tamaño")
+    ap.add_argument("--duplicados", type=float, default=0.0, help="fracción de uplinks repetidos")
+    ap.add_argument("--url", help="app ya desplegada (p. ej. gunicorn); no se importa app.py")
+    ap.add_argument("--tb-latencia-ms", type=float, default=0.0)
+    ap.add_argument("--tb-jitter-ms", type=float, default=0.0)
+    ap.add_argument("--tb-errores", type=float, default=0.0, help="fracción de POST a TB que fallan")
+    ap.add_argument("--outbox", action="store_true", help="habilita el outbox persistente (en un tmp)")
+    ap.add_argument("--historial", action="store_true", help="habilita la serie de tiempo local (en un tmp)")
+    ap.add_argument("--agregacion-ventana", type=float, default=0.0,
+                    help="segundos de ventana del modo agregado (0 = una escritura TB por uplink)")
+    ap.add_argument("--admision-tasa", type=float, default=0.0,
+                    help="uplinks/s por dispositivo antes de responder 429 (0 = sin límite)")
+    ap.add_argument("--admision-rafaga", type=float, default=10.0)
+    ap.add_argument("--max-concurrentes", type=int, default=0,
+                    help="peticiones simultáneas en la app antes de responder 429 (0 = sin límite)")
+    ap.add_argument("--drenado-timeout", type=float, default=60.0)
+    ap.add_argument("--log-level", default="ERROR")
+    ap.add_argument("--salida", help="agrega el reporte a este NDJSON (historial de corridas)")
+    args = ap.parse_args(argv)
+
+    cuerpos = GeneradorUplinks(args.collares, duplicados=args.duplicados).uplinks(args.uplinks)
+    flujos = [_peticiones(f, args.lote) for f in _particionar(cuerpos, max(1, args.concurrencia))]
+    reporte = {"benchmark": "app", "modo": "externo" if args.url else args.modo, "collares": args.collares,
+               "uplinks": len(cuerpos), "concurrencia": args.concurrencia, "lote": args.lote}
+
+    if args.url:
+        res, duracion = _generar_carga(_cliente_http(args.url.rstrip("/")), flujos, args.lote, args.concurrencia)
+        reporte.update(_resumen_carga(res, duracion))
+        return emitir(reporte, args.salida)
+
+    rss_inicio = rss_bytes()
+    with tempfile.TemporaryDirectory() as tmp, \
+            ThingsBoardSimulado(latencia_ms=args.tb_latencia_ms, jitter_ms=args.tb_jitter_ms,
+                                errores=args.tb_errores) as tb:
+        t0 = time.perf_counter()
+        modulo = _cargar_app(args, tmp, tb.url)
+        t_carga = time.perf_counter() - t0
+        rss_app = rss_bytes()
+
+        servidor = None
+        if args.modo == "http":
+            servidor = _servidor_http(modulo)
+            enviar = _cliente_http("http://127.0.0.1:%d" % servidor.server_port)
+        else:
+            enviar = _cliente_flask(modulo)
+        res, duracion = _generar_carga(enviar, flujos, args.lote, args.concurrencia)
+        rss_carga = rss_bytes()
+
+        # Tiempo hasta que la cola termina de entregar a ThingsBoard (lo fallido va al outbox)
+        t0 = time.perf_counter()
+        modulo.detener_servicios(args.drenado_timeout)
+        t_drenado = time.perf_counter() - t0
+        if servidor is not None:
+            servidor.shutdown()
+
+        reporte.update(_resumen_carga(res, duracion))
+        reporte.update({
+            "arranque_app_ms": round(t_carga * 1000, 1),
+            "drenado_tb_s": round(t_drenado, 3),
+            "thingsboard": tb.estadisticas(),
+            "cola_tb": modulo.cola_tb.estadisticas(),
+            "agregacion": modulo.agregador.estadisticas() if modulo.agregador is not None else None,
+            "admision": {**modulo.admision.estadisticas(), "limitados": modulo.admision.limitados(5)},
+            "memoria": {
+                "rss_inicio_mb": round(rss_inicio / _MB, 1),
+                "rss_app_mb": round(rss_app / _MB, 1),
+                "rss_tras_carga_mb": round(rss_carga / _MB, 1),
+            },
+        })
+    return emitir(reporte, args.salida)
+
+
+def _resumen_carga(res, duracion):
+    return {
+        "duracion_s": round(duracion, 3),
+        "uplinks_s": round(res.uplinks_ok / duracion, 1) if duracion else None,
+        "peticiones_s": round(len(res.latencias) / duracion, 1) if duracion else None,
+        "uplinks_ok": res.uplinks_ok,
+        "respuestas": res.respuestas,
+        "latencia": resumen_latencias(res.latencias),
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Benchmark: throughput del detector de celo (un núcleo) y aciertos sobre episodios sintéticos
+#
+#   python -m benchmarks.bench_celo --animales 1000 --dias 7 --intervalo 900
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.comun import emitir
+from utils.celo import DetectorCelo
+
+T0 = 1_700_000_000
+
+
+def generar_hato(animales, dias, intervalo_s, semilla=0):
+    """
+    Lecturas ordenadas por tiempo para todo el hato. Un animal de cada cuatro tiene un
+    episodio de celo de ~12 h (actividad x3, desplazamiento x2, +0.6 °C) a partir del día 3.
+    Devuelve (columnas, episodios) con episodios = {animal: (t_inicio, t_fin)}.
+    """
+    rng = np.random.default_rng(semilla)
+    pasos = int(dias * 86400 // intervalo_s)
+    t = T0 + np.arange(pasos) * intervalo_s
+    episodios = {}
+    cols = {k: [] for k in ("animal", "ts", "vedba", "lat", "lon", "delta")}
+    for a in range(animales):
+        act = rng.gamma(2.0, 0.25, pasos)
+        paso_gps = np.full(pasos, 3e-4)
+        delta = rng.normal(0.0, 0.15, pasos)
+        if a % 4 == 0:
+            ini = 2 * 86400 + rng.integers(0, 86400)
+            enc = (t - T0 >= ini) & (t - T0 < ini + 12 * 3600)
+            act[enc] *= 3.0
+            paso_gps[enc] *= 2.0
+            delta[enc] += 0.6
+            episodios[a] = (T0 + ini, T0 + ini + 12 * 3600)
+        ang = rng.uniform(0, 2 * np.pi, pasos)
+        cols["animal"].append(np.full(pasos, a))
+        cols["ts"].append(t)
+        cols["vedba"].append(act)
+        cols["lat"].append(4.6 + np.cumsum(paso_gps * np.sin(ang)))
+        cols["lon"].append(-74.1 + np.cumsum(paso_gps * np.cos(ang)))
+        cols["delta"].append(delta)
+    cols = {k: np.concatenate(v) for k, v in cols.items()}
+    orden = np.argsort(cols["ts"], kind="stable")
+    return {k: v[orden].tolist() for k, v in cols.items()}, episodios
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--animales", type=int, default=1000)
+    ap.add_argument("--dias", type=float, default=7)
+    ap.add_argument("--intervalo", type=int, default=900, help="segundos entre uplinks por animal")
+    ap.add_argument("--salida", help="agrega el reporte a este NDJSON (historial de corridas)")
+    args = ap.parse_args(argv)
+
+    cols, episodios = generar_hato(args.animales, args.dias, args.intervalo)
+    detector = DetectorCelo()
+    inicios = {}
+    falsos = 0
+    filas = zip(cols["animal"], cols["ts"], cols["vedba"], cols["lat"], cols["lon"], cols["delta"])
+
+    t0 = time.perf_counter()
+    for a, ts, vedba, lat, lon, delta in filas:
+        r = detector.evaluar(a, ts, vedba=vedba, lat=lat, lon=lon, delta_temp=delta)
+        if r["celo_evento"] == "inicio":
+            ep = episodios.get(a)
+            if ep and ep[0] <= ts <= ep[1] and a not in inicios:
+                inicios[a] = ts - ep[0]
+            else:
+                falsos += 1
+    duracion = time.perf_counter() - t0
+
+    n = len(cols["ts"])
+    tasa_hato = args.animales / args.intervalo
+    reporte = {
+        "lecturas": n,
+        "segundos": round(duracion, 2),
+        "lecturas_por_s": round(n / duracion),
+        "us_por_lectura": round(duracion / n * 1e6, 2),
+        "tasa_del_hato_por_s": round(tasa_hato, 2),
+        "margen": round(n / duracion / tasa_hato),
+        "episodios": len(episodios),
+        "detectados": len(inicios),
+        "retardo_medio_min": round(float(np.mean(list(inicios.values()))) / 60, 1) if inicios else None,
+        "falsos_inicios": falsos,
+    }
+    return emitir(reporte, args.salida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# Benchmark: potrero de cada fix con índice de grilla vs. recorrido lineal de todos los polígonos
+#
+#   python -m benchmarks.bench_geocercas --potreros 3000 --puntos 100000
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.comun import emitir
+from utils.geocercas import IndiceGeocercas
+
+
+def generar_potreros(n, semilla=0):
+    """Potreros irregulares (12 vértices) en una grilla; uno de cada diez con un hueco."""
+    rng = np.random.default_rng(semilla)
+    lado = int(np.ceil(np.sqrt(n)))
+    paso = 0.005  # ~550 m
+    ang = np.linspace(0, 2 * np.pi, 12, endpoint=False)
+    poligonos = []
+    for k in range(n):
+        cx = -74.1 + (k % lado) * paso
+        cy = 4.6 + (k // lado) * paso
+        r = paso * 0.5 * rng.uniform(0.7, 0.98, len(ang))
+        borde = np.c_[cx + r * np.cos(ang), cy + r * np.sin(ang)]
+        anillos = [borde]
+        if k % 10 == 0:
+            anillos.append(np.c_[cx + paso * 0.1 * np.cos(ang), cy + paso * 0.1 * np.sin(ang)])
+        poligonos.append((f"P{k}", anillos))
+    return poligonos, (-74.1 - paso, 4.6 - paso, -74.1 + lado * paso, 4.6 + lado * paso)
+
+
+def _lineal(indice, lat, lon):
+    """Referencia: prueba cada punto contra todos los polígonos (sin índice)."""
+    res = np.full(len(lat), -1, dtype=np.int64)
+    for i in range(len(indice)):
+        libres = np.flatnonzero(res < 0)
+        if not libres.size:
+            break
+        dentro = indice._dentro(i, lon[libres], lat[libres])
+        res[libres[dentro]] = i
+    return res
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--potreros", type=int, default=3000)
+    ap.add_argument("--puntos", type=int, default=100000)
+    ap.add_argument("--muestra-lineal", type=int, default=2000)
+    ap.add_argument("--salida", help="agrega el reporte a este NDJSON (historial de corridas)")
+    args = ap.parse_args(argv)
+
+    poligonos, (x0, y0, x1, y1) = generar_potreros(args.potreros)
+    rng = np.random.default_rng(1)
+    lon = rng.uniform(x0, x1, args.puntos)
+    lat = rng.uniform(y0, y1, args.puntos)
+
+    t0 = time.perf_counter()
+    indice = IndiceGeocercas(poligonos)
+    t_indice = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    res = indice.consultar(lat, lon)
+    t_lote = time.perf_counter() - t0
+
+    n_uno = min(2000, args.puntos)
+    t0 = time.perf_counter()
+    for i in range(n_uno):
+        indice.potrero(lat[i], lon[i])
+    t_uno = (time.perf_counter() - t0) / n_uno
+
+    m = min(args.muestra_lineal, args.puntos)
+    t0 = time.perf_counter()
+    ref = _lineal(indice, lat[:m], lon[:m])
+    t_lineal = (time.perf_counter() - t0) / m
+
+    reporte = {
+        "potreros": args.potreros,
+        "puntos": args.puntos,
+        "celdas": len(indice._grilla),
+        "construir_indice_ms": round(t_indice * 1000, 1),
+        "lote_us_por_punto": round(t_lote / args.puntos * 1e6, 2),
+        "un_fix_us": round(t_uno * 1e6, 1),
+        "lineal_us_por_punto": round(t_lineal * 1e6, 1),
+        "dentro_de_algun_potrero": round(float(np.mean(res >= 0)), 3),
+        "resultados_iguales": bool(np.array_equal(res[:m], ref)),
+    }
+    return emitir(reporte, args.salida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# Benchmark: trayectoria vectorizada de procesar_gps vs. implementación anterior con listas
+#
+#   python -m benchmarks.bench_gps --puntos 86400 --repeticiones 5
+
+import argparse
+import time
+from math import isfinite
+
+import numpy as np
+
+from benchmarks.comun import emitir
+from utils.procesamiento_gps import (
+    procesar_gps, _haversine, _parse_time_to_seconds, _to_float_or_none,
+)
+
+
+def _procesar_gps_listas(gps):
+    """Versión anterior (bucles de Python), conservada solo como referencia."""
+    lat, lon, tiempos = gps.get("lat"), gps.get("lon"), gps.get("timestamp", [])
+    lats = [_to_float_or_none(v) for v in lat]
+    lons = [_to_float_or_none(v) for v in lon]
+    valid_idx = [
+        i for i, (la, lo) in enumerate(zip(lats, lons))
+        if la is not None and lo is not None
+        and -90.0 <= la <= 90.0 and -180.0 <= lo <= 180.0
+        and not (abs(la) < 1e-9 and abs(lo) < 1e-9)
+    ]
+    if not valid_idx:
+        return {"lat": None, "lon": None, "distancia": 0, "velocidad": 0, "rectitud": 1}
+    lats = [lats[i] for i in valid_idx]
+    lons = [lons[i] for i in valid_idx]
+    if isinstance(tiempos, (list, tuple)) and len(tiempos) >= len(valid_idx):
+        t_secs = [_parse_time_to_seconds(tiempos[i]) for i in valid_idx]
+    else:
+        t_secs = list(map(float, range(len(lats))))
+    t_secs = np.array([(t if t is not None and isfinite(t) else np.nan) for t in t_secs], dtype=float)
+    if np.isnan(t_secs).all():
+        t_secs = np.arange(len(lats), dtype=float)
+    for i in range(len(t_secs)):
+        if np.isnan(t_secs[i]):
+            t_secs[i] = t_secs[i-1] if i > 0 else 0.0
+    for i in range(len(t_secs)-2, -1, -1):
+        if t_secs[i] > t_secs[i+1]:
+            t_secs[i] = t_secs[i+1]
+    dists = [_haversine(lats[i], lons[i], lats[i+1], lons[i+1]) for i in range(len(lats)-1)]
+    distancia_total = float(np.nansum(dists))
+    duracion = float(max(0.0, t_secs[-1] - t_secs[0]))
+    velocidad = (distancia_total / duracion) if duracion > 0 else 0.0
+    if velocidad > 20.0:
+        velocidad = 0.0
+    neto = _haversine(lats[0], lons[0], lats[-1], lons[-1])
+    rectitud = float(min(1.0, max(0.0, (neto / distancia_total) if distancia_total > 0 else 1.0)))
+    return {"lat": lats[-1], "lon": lons[-1], "distancia": round(distancia_total, 2),
+            "velocidad": round(velocidad, 2), "rectitud": round(rectitud, 2)}
+
+
+def generar_track(n, semilla=0):
+    """Caminata aleatoria a 1 Hz con ~1% de fixes inválidos (None / (0,0))."""
+    rng = np.random.default_rng(semilla)
+    lat = 4.6 + np.cumsum(rng.normal(0, 2e-6, n))
+    lon = -74.1 + np.cumsum(rng.normal(0, 2e-6, n))
+    ts = 1_700_000_000 + np.arange(n, dtype=float)
+    lat_l, lon_l = lat.tolist(), lon.tolist()
+    for i in rng.choice(n, size=max(1, n // 100), replace=False):
+        if i % 2:
+            lat_l[i] = None
+        else:
+            lat_l[i], lon_l[i] = 0.0, 0.0
+    return {"lat": lat_l, "lon": lon_l, "timestamp": ts.tolist()}
+
+
+def _medir(fn, gps, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        res = fn(gps)
+        tiempos.append(time.perf_counter() - t0)
+    return res, min(tiempos)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--puntos", type=int, default=86400)
+    ap.add_argument("--repeticiones", type=int, default=5)
+    ap.add_argument("--salida", help="agrega el reporte a este NDJSON (historial de corridas)")
+    args = ap.parse_args(argv)
+
+    gps = generar_track(args.puntos)
+    ref, t_ref = _medir(_procesar_gps_listas, gps, args.repeticiones)
+    nuevo, t_nuevo = _medir(procesar_gps, gps, args.repeticiones)
+
+    reporte = {
+        "puntos": args.puntos,
+        "listas_ms": round(t_ref * 1000, 2),
+        "vectorizado_ms": round(t_nuevo * 1000, 2),
+        "aceleracion": round(t_ref / t_nuevo, 1) if t_nuevo > 0 else None,
+        "resultados_iguales": ref == nuevo,
+    }
+    return emitir(reporte, args.salida)
+
+
+if __name__ == "__main__":
+    main()
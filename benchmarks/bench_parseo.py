@@ -0,0 +1,129 @@
+# Benchmark: decodificación + normalización de un uplink TTN v3 (anterior vs. extractor compilado)
+#
+#   python -m benchmarks.bench_parseo --mensajes 20000 --repeticiones 5
+
+import argparse
+import json
+import time
+from datetime import datetime
+
+from benchmarks.comun import emitir
+from utils import parseo
+from utils.parseo import TZ, cargar_json, normalizar
+
+
+def _parse_ttn_v3_anterior(body):
+    """Versión anterior (cadenas de .get + fromisoformat + pytz), conservada solo como referencia."""
+    end_ids = body.get("end_device_ids") or {}
+    uplink = body.get("uplink_message") or {}
+    dec = uplink.get("decoded_payload") or {}
+    received_at = body.get("received_at") or uplink.get("received_at")
+    local_iso = None
+    if received_at:
+        try:
+            dt_utc = datetime.fromisoformat(received_at.replace("Z", "+00:00"))
+            local_iso = dt_utc.astimezone(TZ).isoformat()
+        except Exception:
+            pass
+    lat = dec.get("latitude") or dec.get("lat")
+    lon = dec.get("longitude") or dec.get("lon")
+    if lat is None or lon is None:
+        rxm = uplink.get("rx_metadata") or []
+        if isinstance(rxm, list) and rxm:
+            loc = rxm[0].get("location") or {}
+            lat = loc.get("latitude", lat)
+            lon = loc.get("longitude", lon)
+    return {
+        "dev_id": end_ids.get("device_id"),
+        "dev_eui": end_ids.get("dev_eui"),
+        "cow_id": dec.get("cow_id"),
+        "temp_body_c": dec.get("To_c") or dec.get("temp_body_c"),
+        "temp_amb_c": dec.get("Ta_c") or dec.get("temp_amb_c"),
+        "humedad": dec.get("humedad", 65),
+        "v_max_ms": dec.get("v_max_ms"),
+        "v_mean_ms": dec.get("v_mean_ms"),
+        "ODBA_g": dec.get("ODBA_g"),
+        "VeDBA_g": dec.get("VeDBA_g"),
+        "lat": lat,
+        "lon": lon,
+        "ts_epoch": dec.get("epoch_s"),
+        "received_local_iso": local_iso,
+    }
+
+
+def generar_mensajes(n):
+    """Uplinks TTN v3 realistas (rx_metadata, settings, received_at con nanosegundos)."""
+    mensajes = []
+    for i in range(n):
+        cuerpo = {
+            "end_device_ids": {
+                "device_id": f"collar-{i % 500}",
+                "application_ids": {"application_id": "ganaderia"},
+                "dev_eui": f"AC1F09FFFE1D{i % 500:04X}",
+                "join_eui": "0000000000000000",
+            },
+            "received_at": f"2025-03-01T{(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:{i % 60:02d}.{i:09d}Z",
+            "uplink_message": {
+                "f_port": 2,
+                "f_cnt": i,
+                "decoded_payload": {
+                    "cow_id": i % 500, "To_c": 38.4, "Ta_c": 24.1, "humedad": 71,
+                    "ODBA_g": 0.41, "VeDBA_g": 0.37, "latitude": 4.61, "longitude": -74.08,
+                    "epoch_s": 1_740_800_000 + i,
+                },
+                "rx_metadata": [{
+                    "gateway_ids": {"gateway_id": "gw-finca"},
+                    "rssi": -97, "snr": 7.5,
+                    "location": {"latitude": 4.6, "longitude": -74.1, "altitude": 2600},
+                }],
+                "settings": {"data_rate": {"lora": {"bandwidth": 125000, "spreading_factor": 9}},
+                             "frequency": "904100000"},
+            },
+        }
+        mensajes.append(json.dumps(cuerpo).encode())
+    return mensajes
+
+
+def _medir(fn, mensajes, repeticiones):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        for m in mensajes:
+            fn(m)
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor / len(mensajes) * 1e6
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--mensajes", type=int, default=20000)
+    ap.add_argument("--repeticiones", type=int, default=5)
+    ap.add_argument("--salida", help="agrega el reporte a este NDJSON (historial de corridas)")
+    args = ap.parse_args(argv)
+
+    mensajes = generar_mensajes(args.mensajes)
+    cuerpos = [json.loads(m) for m in mensajes]
+    # f_cnt (deduplicación) y ts / ts_llegada (timestamp canónico) son campos nuevos; el resto debe coincidir
+    nuevos = ("f_cnt", "ts", "ts_llegada")
+    iguales = all({k: v for k, v in normalizar(c)._asdict().items() if k not in nuevos}
+                  == _parse_ttn_v3_anterior(c)
+                  for c in cuerpos[:1000])
+
+    reporte = {
+        "mensajes": args.mensajes,
+        "orjson": parseo.orjson is not None,
+        "decodificar_json_us": round(_medir(json.loads, mensajes, args.repeticiones), 2),
+        "decodificar_rapido_us": round(_medir(cargar_json, mensajes, args.repeticiones), 2),
+        "parseo_anterior_us": round(_medir(_parse_ttn_v3_anterior, cuerpos, args.repeticiones), 2),
+        "parseo_nuevo_us": round(_medir(normalizar, cuerpos, args.repeticiones), 2),
+        "total_anterior_us": round(_medir(lambda m: _parse_ttn_v3_anterior(json.loads(m)),
+                                          mensajes, args.repeticiones), 2),
+        "total_nuevo_us": round(_medir(lambda m: normalizar(cargar_json(m)), mensajes, args.repeticiones), 2),
+        "resultados_iguales": iguales,
+    }
+    reporte["aceleracion"] = round(reporte["total_anterior_us"] / reporte["total_nuevo_us"], 1)
+    return emitir(reporte, args.salida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Micro-benchmark de cada procesar_* (escalar y en lote) y del pipeline completo:
+# throughput, latencia p50/p99 por llamada y memoria
+#
+#   python -m benchmarks.bench_procesar --collares 500 --lecturas 20000 --lote 500 --salida historial.ndjson
+
+import argparse
+
+from benchmarks.comun import cronometrar, emitir, medir_memoria, resumen_latencias
+from benchmarks.generador import GeneradorUplinks
+from utils.celo import DetectorCelo
+from utils.linea_base import LineaBaseAnimal
+from utils.modelo_temp import gestor_modelo
+from utils.parseo import normalizar
+from utils.pipeline import EstadoHato, procesar, procesar_lote
+from utils.procesamiento_accel import procesar_acelerometro, procesar_acelerometro_lote
+from utils.procesamiento_gps import procesar_gps, procesar_gps_lote
+from utils.procesamiento_temp import procesar_temperatura, procesar_temperatura_lote
+from utils.trayectorias import AlmacenTrayectorias
+
+
+def _estado():
+    return EstadoHato(trayectorias=AlmacenTrayectorias(), linea_base=LineaBaseAnimal(None), celo=DetectorCelo())
+
+
+def _reiniciar_cache_modelo():
+    """Cada función arranca con la caché del modelo fría (si no, heredaría la de la anterior)."""
+    gestor_modelo._cache.clear()
+    gestor_modelo.aciertos = gestor_modelo.fallos = 0
+
+
+def _medir(fn, argumentos, lecturas=None):
+    """Pasada cronometrada + pasada aparte con tracemalloc (que distorsiona los tiempos)."""
+    _reiniciar_cache_modelo()
+    latencias, total = cronometrar(fn, argumentos)
+    consultas = gestor_modelo.aciertos + gestor_modelo.fallos
+    res = {
+        "lecturas_s": round((lecturas or len(argumentos)) / total, 1),
+        **resumen_latencias(latencias),
+    }
+    if consultas:
+        res["cache_modelo_aciertos"] = round(gestor_modelo.aciertos / consultas, 3)
+    _reiniciar_cache_modelo()
+    with medir_memoria() as memoria:
+        for a in argumentos:
+            fn(*a)
+    res.update(memoria)
+    return res
+
+
+def _columnas(norms, *campos):
+    return [[n.get(c) for n in norms] for c in campos]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--collares", type=int, default=500)
+    ap.add_argument("--lecturas", type=int, default=20000)
+    ap.add_argument("--lote", type=int, default=500, help="lecturas por llamada en las variantes _lote")
+    ap.add_argument("--salida", help="agrega el reporte a este NDJSON (historial de corridas)")
+    args = ap.parse_args(argv)
+
+    gestor_modelo.cargar()
+    norms = [normalizar(c) for c in GeneradorUplinks(args.collares).uplinks(args.lecturas)]
+    lotes = [norms[i:i + args.lote] for i in range(0, len(norms), args.lote)]
+
+    escalares = {
+        "procesar_temperatura": (procesar_temperatura, [
+            (n.get("temp_body_c"), n.get("temp_amb_c"), n.get("humedad")) for n in norms]),
+        "procesar_acelerometro": (procesar_acelerometro, [
+            ({"ODBA_g": n.get("ODBA_g"), "VeDBA_g": n.get("VeDBA_g")},) for n in norms]),
+        "procesar_gps": (procesar_gps, [({"lat": n.get("lat"), "lon": n.get("lon")},) for n in norms]),
+        "procesar": (procesar, [(n,) for n in norms]),
+    }
+    en_lote = {
+        "procesar_temperatura_lote": (procesar_temperatura_lote, [
+            tuple(_columnas(l, "temp_body_c", "temp_amb_c", "humedad")) for l in lotes]),
+        "procesar_acelerometro_lote": (procesar_acelerometro_lote, [
+            (dict(zip(("ODBA_g", "VeDBA_g"), _columnas(l, "ODBA_g", "VeDBA_g"))),) for l in lotes]),
+        "procesar_gps_lote": (procesar_gps_lote, [
+            (dict(zip(("lat", "lon"), _columnas(l, "lat", "lon"))),) for l in lotes]),
+        "procesar_lote": (procesar_lote, [(l,) for l in lotes]),
+    }
+
+    reporte = {"benchmark": "procesar", "collares": args.collares, "lecturas": len(norms),
+               "lote": args.lote, "modelo": gestor_modelo.disponible}
+    for nombre, (fn, argumentos) in escalares.items():
+        reporte[nombre] = _medir(fn, argumentos)
+    for nombre, (fn, argumentos) in en_lote.items():
+        reporte[nombre] = _medir(fn, argumentos, len(norms))
+
+    # Pipeline con estado por animal (trayectorias, línea base, celo): cada variante con estado nuevo
+    estado = _estado()
+    reporte["procesar_con_estado"] = _medir(lambda n: procesar(n, estado), escalares["procesar"][1])
+    estado = _estado()
+    reporte["procesar_lote_con_estado"] = _medir(lambda l: procesar_lote(l, estado),
+                                                 en_lote["procesar_lote"][1], len(norms))
+    return emitir(reporte, args.salida)
+
+
+if __name__ == "__main__":
+    main()
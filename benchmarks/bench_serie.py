@@ -0,0 +1,86 @@
+# Benchmark: escritura de la serie de tiempo y agregados de un mes para todo el hato
+#
+#   python -m benchmarks.bench_serie --animales 200 --dias 30 --intervalo 600
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.comun import emitir
+from utils.serie_tiempo import SerieTiempo
+
+T0 = 1_700_000_000 - 1_700_000_000 % 86400
+
+
+def generar_salidas(animales, dias, intervalo_s, semilla=0):
+    """Una salida por animal cada `intervalo_s`, con temperatura, actividad y GPS."""
+    rng = np.random.default_rng(semilla)
+    ts = T0 + np.arange(0, dias * 86400, intervalo_s)
+    for a in range(animales):
+        lat = 4.6 + np.cumsum(rng.normal(0, 2e-4, len(ts)))
+        lon = -74.1 + np.cumsum(rng.normal(0, 2e-4, len(ts)))
+        temp = 38.5 + rng.normal(0, 0.3, len(ts))
+        vedba = rng.gamma(1.2, 0.4, len(ts))
+        for i, t in enumerate(ts.tolist()):
+            yield f"vaca-{a}", {
+                "ts_epoch": t,
+                "temp_dorsal": round(float(temp[i]), 2),
+                "VeDBA": round(float(vedba[i]), 3),
+                "actividad": "alta" if vedba[i] > 1.5 else "media" if vedba[i] > 0.3 else "baja",
+                "lat": float(lat[i]),
+                "lon": float(lon[i]),
+                "estado_general": "normal",
+            }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--animales", type=int, default=200)
+    ap.add_argument("--dias", type=int, default=30)
+    ap.add_argument("--intervalo", type=int, default=600, help="segundos entre uplinks")
+    ap.add_argument("--salida", help="agrega el reporte a este NDJSON (historial de corridas)")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        serie = SerieTiempo(os.path.join(tmp, "serie.sqlite3"))
+        t0 = time.perf_counter()
+        n = 0
+        for clave, salida in generar_salidas(args.animales, args.dias, args.intervalo):
+            serie.agregar(salida, clave)
+            n += 1
+        serie.vaciar(timeout=600)
+        t_escritura = time.perf_counter() - t0
+
+        hasta = T0 + args.dias * 86400
+        t0 = time.perf_counter()
+        por_hora = serie.agregados(T0, hasta, 3600)
+        t_hato_hora = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        por_dia = serie.agregados(T0, hasta, 86400)
+        t_hato_dia = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        crudo = serie.rango("vaca-0", T0, hasta)
+        t_rango = time.perf_counter() - t0
+        serie.detener()
+
+    reporte = {
+        "lecturas": n,
+        "escritura_s": round(t_escritura, 2),
+        "lecturas_por_s": round(n / t_escritura) if t_escritura > 0 else None,
+        "agregados_hora_hato_ms": round(t_hato_hora * 1000, 1),
+        "filas_hora": len(por_hora),
+        "agregados_dia_hato_ms": round(t_hato_dia * 1000, 1),
+        "filas_dia": len(por_dia),
+        "rango_un_animal_ms": round(t_rango * 1000, 1),
+        "filas_rango": len(crudo),
+    }
+    return emitir(reporte, args.salida)
+
+
+if __name__ == "__main__":
+    main()
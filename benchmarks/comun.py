@@ -0,0 +1,88 @@
+# Utilidades compartidas por los benchmarks: percentiles, memoria y reporte JSON
+
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+
+from utils.metricas import rss_bytes
+
+
+def resumen_latencias(segundos):
+    """Lista de latencias (s) → {n, media, p50, p90, p99, max} en milisegundos."""
+    lat = np.asarray(segundos, dtype=float) * 1000
+    if not lat.size:
+        return {"n": 0}
+    p50, p90, p99 = np.percentile(lat, [50, 90, 99])
+    return {
+        "n": int(lat.size),
+        "media_ms": round(float(lat.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p90_ms": round(float(p90), 4),
+        "p99_ms": round(float(p99), 4),
+        "max_ms": round(float(lat.max()), 4),
+    }
+
+
+def cronometrar(fn, argumentos):
+    """Llama fn(*a) para cada `a` y devuelve (latencias en s, tiempo total en s)."""
+    latencias = []
+    reloj = time.perf_counter
+    t_inicio = reloj()
+    for a in argumentos:
+        t0 = reloj()
+        fn(*a)
+        latencias.append(reloj() - t0)
+    return latencias, reloj() - t_inicio
+
+
+@contextmanager
+def medir_memoria():
+    """
+    Pico de memoria Python asignada dentro del bloque (tracemalloc) y variación del RSS.
+    El resultado queda en el dict que entrega el `with` al salir.
+    """
+    res = {}
+    rss0 = rss_bytes()
+    tracemalloc.start()
+    try:
+        yield res
+    finally:
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        res["pico_python_kb"] = round(pico / 1024, 1)
+        res["rss_delta_kb"] = round((rss_bytes() - rss0) / 1024, 1)
+
+
+def _commit_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def contexto():
+    """Metadatos para comparar corridas en el tiempo (fecha, commit, máquina)."""
+    return {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": _commit_git(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpus": os.cpu_count(),
+        "maquina": platform.node(),
+    }
+
+
+def emitir(reporte, salida=None):
+    """Imprime el reporte y, con `salida`, lo agrega como una línea a un NDJSON de historial."""
+    print(json.dumps(reporte, indent=2, ensure_ascii=False))
+    if salida:
+        with open(salida, "a", encoding="utf-8") as f:
+            f.write(json.dumps({**contexto(), **reporte}, ensure_ascii=False) + "\n")
+    return reporte
@@ -0,0 +1,142 @@
+# Generador de uplinks TTN v3 sintéticos para N collares (temperatura, acelerómetro y GPS)
+#
+#   python -m benchmarks.generador --collares 500 --mensajes 100000 > uplinks.ndjson
+#   python -m benchmarks.generador --collares 50 --mensajes 5000 --registro dispositivos.json
+
+import argparse
+import json
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+T0 = 1_740_800_000  # 2025-03-01 03:20 UTC
+
+
+def dev_eui(i):
+    return f"AC1F09FFFE{i:06X}"
+
+
+def token(i):
+    return f"tok-bench-{i:06d}"
+
+
+class GeneradorUplinks:
+    """
+    Uplinks con la forma que lee `normalizar` (decoded_payload + rx_metadata), uno por
+    collar cada `intervalo_s` (con jitter), recorriendo los collares en ronda.
+    - Temperatura dorsal con ciclo diario y episodios de fiebre/celo; ambiente y humedad diarios.
+    - ODBA/VeDBA con distribución gamma (más actividad de día).
+    - GPS como caminata aleatoria alrededor del potrero de cada collar; una fracción sin fix (0, 0).
+    - `duplicados`: fracción de uplinks que se repiten (reintento de TTN / otro gateway).
+    """
+
+    def __init__(self, collares, intervalo_s=600, semilla=0, sin_fix=0.02, duplicados=0.0):
+        self.collares = int(collares)
+        self.intervalo_s = float(intervalo_s)
+        self.sin_fix = float(sin_fix)
+        self.duplicados = float(duplicados)
+        self._rng = np.random.default_rng(semilla)
+        n = self.collares
+        self._lat = 4.6 + self._rng.uniform(-0.02, 0.02, n)
+        self._lon = -74.1 + self._rng.uniform(-0.02, 0.02, n)
+        self._base = self._rng.normal(38.6, 0.2, n)
+        self._fcnt = np.zeros(n, dtype=np.int64)
+        self._k = 0
+
+    def _cuerpo(self, i, ts):
+        rng = self._rng
+        hora = (ts / 3600 - 5) % 24  # hora local (UTC-5)
+        dia = np.sin((hora - 9) / 24 * 2 * np.pi)
+        evento = rng.random() < 0.01
+        temp_amb = 24 + 6 * dia + rng.normal(0, 0.8)
+        temp = self._base[i] + 0.3 * dia + rng.normal(0, 0.15) + (1.6 if evento else 0.0)
+        vedba = rng.gamma(1.3, 0.25 + 0.2 * max(dia, 0)) * (3 if evento else 1)
+        self._lat[i] += rng.normal(0, 1e-4)
+        self._lon[i] += rng.normal(0, 1e-4)
+        lat, lon = (0.0, 0.0) if rng.random() < self.sin_fix else (round(self._lat[i], 6), round(self._lon[i], 6))
+        self._fcnt[i] += 1
+        recibido = datetime.fromtimestamp(ts + rng.uniform(0.5, 3), timezone.utc)
+        return {
+            "end_device_ids": {
+                "device_id": f"collar-{i}",
+                "application_ids": {"application_id": "ganaderia"},
+                "dev_eui": dev_eui(i),
+                "join_eui": "0000000000000000",
+            },
+            "received_at": recibido.strftime("%Y-%m-%dT%H:%M:%S.%f") + f"{i % 1000:03d}Z",
+            "uplink_message": {
+                "f_port": 2,
+                "f_cnt": int(self._fcnt[i]),
+                "decoded_payload": {
+                    "cow_id": f"vaca-{i}",
+                    "To_c": round(float(temp), 2),
+                    "Ta_c": round(float(temp_amb), 2),
+                    "humedad": int(np.clip(75 - 15 * dia + rng.normal(0, 4), 30, 100)),
+                    "ODBA_g": round(float(vedba * 1.15), 3),
+                    "VeDBA_g": round(float(vedba), 3),
+                    "latitude": lat,
+                    "longitude": lon,
+                    "epoch_s": int(ts),
+                },
+                "rx_metadata": [{
+                    "gateway_ids": {"gateway_id": "gw-finca"},
+                    "rssi": int(rng.integers(-118, -80)),
+                    "snr": round(float(rng.uniform(-5, 10)), 1),
+                    "location": {"latitude": 4.6, "longitude": -74.1, "altitude": 2600},
+                }],
+                "settings": {"data_rate": {"lora": {"bandwidth": 125000, "spreading_factor": 9}},
+                             "frequency": "904100000"},
+            },
+        }
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        i = self._k % self.collares
+        ronda = self._k // self.collares
+        self._k += 1
+        ts = T0 + ronda * self.intervalo_s + self._rng.uniform(0, min(self.intervalo_s, 60))
+        return self._cuerpo(i, ts)
+
+    def uplinks(self, n):
+        """Lista de `n` cuerpos (dicts), con las copias duplicadas intercaladas."""
+        res = []
+        while len(res) < n:
+            cuerpo = next(self)
+            res.append(cuerpo)
+            if self.duplicados and len(res) < n and self._rng.random() < self.duplicados:
+                res.append(cuerpo)
+        return res
+
+    def registro(self):
+        """Filas del registro de dispositivos (formato JSON de DISPOSITIVOS_PATH)."""
+        return [{"dev_eui": dev_eui(i), "device_id": f"collar-{i}", "cow_id": f"vaca-{i}", "token": token(i)}
+                for i in range(self.collares)]
+
+
+def escribir_registro(ruta, collares):
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump({"dispositivos": GeneradorUplinks(collares).registro()}, f)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--collares", type=int, default=100)
+    ap.add_argument("--mensajes", type=int, default=10000)
+    ap.add_argument("--intervalo", type=float, default=600, help="segundos entre uplinks de un collar")
+    ap.add_argument("--duplicados", type=float, default=0.0, help="fracción de uplinks repetidos")
+    ap.add_argument("--semilla", type=int, default=0)
+    ap.add_argument("--registro", help="además escribe el registro de dispositivos (JSON) en esta ruta")
+    args = ap.parse_args(argv)
+
+    gen = GeneradorUplinks(args.collares, args.intervalo, args.semilla, duplicados=args.duplicados)
+    for cuerpo in gen.uplinks(args.mensajes):
+        sys.stdout.write(json.dumps(cuerpo) + "\n")
+    if args.registro:
+        escribir_registro(args.registro, args.collares)
+
+
+if __name__ == "__main__":
+    main()
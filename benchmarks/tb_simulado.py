@@ -0,0 +1,148 @@
+# ThingsBoard simulado: recibe POST /api/v1/<token>/telemetry con latencia y errores inyectables
+#
+#   python -m benchmarks.tb_simulado --puerto 8088 --latencia-ms 40 --errores 0.05
+#   THINGSBOARD_BASE=http://127.0.0.1:8088 python app.py
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_RE_TELEMETRIA = re.compile(r"^/api/v1/([^/]+)/telemetry/?$")
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como ThingsBoard real
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, cuerpo=b""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_GET(self):
+        self._responder(200, json.dumps(self.server.simulado.estadisticas()).encode())
+
+    def do_POST(self):
+        sim = self.server.simulado
+        datos = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        m = _RE_TELEMETRIA.match(self.path)
+        if not m:
+            self._responder(404)
+            return
+        espera = sim.latencia_s + (random.uniform(0, sim.jitter_s) if sim.jitter_s else 0)
+        if espera > 0:
+            time.sleep(espera)
+        if sim.errores and random.random() < sim.errores:
+            sim._sumar(m.group(1), errores=1)
+            self._responder(sim.status_error)
+            return
+        try:
+            cuerpo = json.loads(datos)
+        except ValueError:
+            self._responder(400)
+            return
+        puntos = len(cuerpo) if isinstance(cuerpo, list) else 1
+        sim._sumar(m.group(1), peticiones=1, puntos=puntos)
+        self._responder(200)
+
+
+class ThingsBoardSimulado:
+    """
+    Servidor HTTP local con la API de telemetría de dispositivo de ThingsBoard.
+    - latencia_ms (+ jitter_ms aleatorio) por petición; `errores` es la fracción
+      de peticiones que responden `status_error` (500 por defecto).
+    - Cuenta peticiones, puntos y errores, en total y por token.
+    - `with ThingsBoardSimulado() as tb:` lo arranca en un hilo en un puerto libre.
+    """
+
+    def __init__(self, puerto=0, latencia_ms=0.0, jitter_ms=0.0, errores=0.0, status_error=500,
+                 host="127.0.0.1"):
+        self.latencia_s = latencia_ms / 1000
+        self.jitter_s = jitter_ms / 1000
+        self.errores = float(errores)
+        self.status_error = int(status_error)
+        self._lock = threading.Lock()
+        self._por_token = {}
+        self._totales = {"peticiones": 0, "puntos": 0, "errores": 0}
+        self._servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+        self._servidor.daemon_threads = True
+        self._servidor.simulado = self
+        self._hilo = None
+
+    @property
+    def url(self):
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, name="tb-simulado", daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
+
+    def _sumar(self, token, **n):
+        with self._lock:
+            por_token = self._por_token.setdefault(token, {"peticiones": 0, "puntos": 0, "errores": 0})
+            for k, v in n.items():
+                self._totales[k] += v
+                por_token[k] += v
+
+    def estadisticas(self):
+        with self._lock:
+            return {**self._totales, "tokens": len(self._por_token)}
+
+    def puntos_por_token(self):
+        with self._lock:
+            return {t: c["puntos"] for t, c in self._por_token.items()}
+
+    def esperar_puntos(self, n, timeout=30.0):
+        """Espera hasta recibir `n` puntos (o vencer el timeout); devuelve los recibidos."""
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            recibidos = self.estadisticas()["puntos"]
+            if recibidos >= n:
+                return recibidos
+            time.sleep(0.01)
+        return self.estadisticas()["puntos"]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--puerto", type=int, default=8088)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--latencia-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--errores", type=float, default=0.0, help="fracción de peticiones que fallan")
+    ap.add_argument("--status-error", type=int, default=500)
+    args = ap.parse_args(argv)
+
+    tb = ThingsBoardSimulado(args.puerto, args.latencia_ms, args.jitter_ms, args.errores,
+                             args.status_error, args.host)
+    print(f"ThingsBoard simulado en {tb.url} (GET / para estadísticas)")
+    try:
+        tb._servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tb._servidor.server_close()
+        print(json.dumps(tb.estadisticas()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# gunicorn.conf.py — servidor de producción
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Variables de entorno:
+#   PORT                 puerto (5000)
+#   GUNICORN_WORKERS     procesos (1)
+#   GUNICORN_THREADS     hilos por proceso (8)
+#   GUNICORN_TIMEOUT     timeout de petición en s (30)
+#   APAGADO_TIMEOUT_S    tiempo para vaciar la cola TB al apagar (10)
+#
+# El estado por animal (trayectorias, línea base, celo) vive en la memoria de cada
+# worker: con más de un proceso los uplinks de un animal se reparten entre workers.
+# Para conservarlo coherente usa 1 worker con varios hilos (por defecto) y escala con
+# GUNICORN_THREADS; el modelo y numpy ya liberan el GIL en las partes pesadas.
+
+import os
+import time
+
+from utils.metricas import rss_bytes
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv("GUNICORN_WORKERS", 1))
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+worker_class = "gthread"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(float(os.getenv("APAGADO_TIMEOUT_S", 10))) + 5
+keepalive = 5
+
+# Import del app en el master: modelo, registro de dispositivos y librerías
+# quedan compartidos copy-on-write entre workers.
+preload_app = True
+
+_t_inicio = time.perf_counter()
+
+
+def _mb(n):
+    return n / 2**20
+
+
+def when_ready(server):
+    server.log.info("🚀 Master listo en %.0f ms (RSS %.1f MB, %d workers x %d hilos)",
+                    (time.perf_counter() - _t_inicio) * 1000, _mb(rss_bytes()), workers, threads)
+    if workers > 1:
+        server.log.warning("⚠️ %d workers: el estado por animal no se comparte entre procesos", workers)
+
+
+def post_fork(server, worker):
+    # Los hilos no sobreviven al fork: cada worker arranca los suyos
+    t0 = time.perf_counter()
+    from wsgi import iniciar_servicios
+    iniciar_servicios()
+    server.log.info("👷 Worker %s listo en %.0f ms (RSS %.1f MB)",
+                    worker.pid, (time.perf_counter() - t0) * 1000, _mb(rss_bytes()))
+
+
+def worker_exit(server, worker):
+    # Vacía la cola TB (lo no entregado va al outbox) y persiste el estado
+    from wsgi import detener_servicios
+    detener_servicios()
+    server.log.info("👋 Worker %s detenido (RSS %.1f MB)", worker.pid, _mb(rss_bytes()))
@@ -0,0 +1,56 @@
+import threading
+
+from utils.admision import ControlAdmision, dispositivo_rapido
+
+
+def test_dispositivo_rapido():
+    assert dispositivo_rapido(b'{"end_device_ids": {"dev_eui": "ac1f09"}}') == "AC1F09"
+    assert dispositivo_rapido(b'{"dev_id": "collar-1"}') == "collar-1"
+    assert dispositivo_rapido(b'{"temp": 38}') is None
+
+
+def test_deshabilitada_no_cuenta_nada():
+    adm = ControlAdmision()
+    assert adm.admitir("x") is None
+    adm.salir("x")
+    stats = adm.estadisticas()
+    assert stats["admitidos"] == stats["en_curso"] == 0
+
+
+def test_cupo_por_dispositivo():
+    adm = ControlAdmision(tasa_s=1.0, rafaga=2)
+    assert adm.admitir("x") is None
+    assert adm.admitir("x") is None
+    motivo, espera = adm.admitir("x")
+    assert motivo == "dispositivo" and 0 < espera <= 1.0
+    assert adm.admitir("y") is None
+    stats = adm.estadisticas()
+    assert stats["admitidos"] == 3 and stats["en_curso"] == 3 and stats["limitados_dispositivo"] == 1
+    assert adm.limitados() == {"x": 1}
+
+
+def test_cupo_global_devuelve_las_fichas():
+    adm = ControlAdmision(tasa_s=1.0, rafaga=1, max_concurrentes=1)
+    assert adm.admitir("a") is None
+    assert adm.admitir("b") == ("global", 1.0)
+    adm.salir("a")
+    assert adm.admitir("b") is None  # la ficha de "b" se había devuelto
+    assert adm.estadisticas()["limitados_global"] == 1
+
+
+def test_contadores_por_fragmento_con_varios_hilos():
+    adm = ControlAdmision(max_concurrentes=64)
+
+    def trabajar():
+        for _ in range(500):
+            if adm.admitir() is None:
+                adm.salir()
+
+    hilos = [threading.Thread(target=trabajar) for _ in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    stats = adm.estadisticas()
+    assert stats["admitidos"] == 4000
+    assert stats["en_curso"] == 0
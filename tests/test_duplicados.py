@@ -0,0 +1,70 @@
+import time
+
+from utils.duplicados import CacheDuplicados, clave_uplink
+from utils.parseo import normalizar
+
+
+def _uplink(f_cnt=7, epoch_s=1_700_000_000, **extra):
+    dec = {"To_c": 38.6, **extra}
+    if epoch_s is not None:
+        dec["epoch_s"] = epoch_s
+    return normalizar({
+        "end_device_ids": {"device_id": "collar-1", "dev_eui": "ac1f09fffe000001"},
+        "uplink_message": {"f_cnt": f_cnt, "decoded_payload": dec},
+    })
+
+
+def test_clave_uplink():
+    assert clave_uplink(_uplink()) == ("AC1F09FFFE000001", 7, 1_700_000_000.0)
+    # sin tiempo propio, el ts es la hora de llegada y no entra en la clave
+    assert clave_uplink(_uplink(epoch_s=None)) == ("AC1F09FFFE000001", 7, None)
+    assert clave_uplink(_uplink(f_cnt=None, epoch_s=None)) is None
+    assert clave_uplink({"f_cnt": 3}) is None
+
+
+def test_reintento_sin_tiempo_es_duplicado():
+    cache = CacheDuplicados()
+    assert not cache.visto(clave_uplink(_uplink(epoch_s=None)))
+    time.sleep(0.01)
+    assert cache.visto(clave_uplink(_uplink(epoch_s=None)))
+
+
+def test_reinicio_de_f_cnt_no_es_duplicado():
+    cache = CacheDuplicados()
+    assert not cache.visto(clave_uplink(_uplink(f_cnt=1, epoch_s=1_700_000_000)))
+    assert not cache.visto(clave_uplink(_uplink(f_cnt=1, epoch_s=1_700_086_400)))
+
+
+def test_visto_registra_y_cuenta():
+    cache = CacheDuplicados()
+    assert not cache.visto("a")
+    assert cache.visto("a")
+    assert cache.visto("a")
+    assert not cache.visto(None)
+    assert cache.estadisticas() == {"entradas": 1, "duplicados": 2}
+
+
+def test_olvidar_deja_pasar_el_reintento():
+    cache = CacheDuplicados()
+    assert not cache.visto("a")
+    cache.olvidar("a")
+    cache.olvidar("no-estaba")
+    cache.olvidar(None)
+    assert not cache.visto("a")
+
+
+def test_expira_por_ttl():
+    cache = CacheDuplicados(ttl_s=0.05)
+    cache.visto("a")
+    time.sleep(0.1)
+    assert not cache.visto("a")
+    assert len(cache) == 1
+
+
+def test_tope_de_entradas_expulsa_las_mas_viejas():
+    cache = CacheDuplicados(max_items=3)
+    for clave in "abcd":
+        cache.visto(clave)
+    assert len(cache) == 3
+    assert cache.visto("d")
+    assert not cache.visto("a")
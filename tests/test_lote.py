@@ -0,0 +1,119 @@
+# Equivalencia escalar / lote: cada procesar_*_lote y procesar_lote deben dar
+# exactamente lo mismo que llamar a la versión escalar lectura por lectura.
+
+import math
+
+import numpy as np
+import pytest
+
+from benchmarks.generador import GeneradorUplinks
+from utils.celo import DetectorCelo
+from utils.linea_base import LineaBaseAnimal
+from utils.parseo import normalizar
+from utils.pipeline import EstadoHato, procesar, procesar_lote
+from utils.procesamiento_accel import procesar_acelerometro, procesar_acelerometro_lote
+from utils.procesamiento_gps import procesar_gps, procesar_gps_lote
+from utils.procesamiento_temp import procesar_temperatura, procesar_temperatura_lote
+from utils.tiempo import horas_locales
+from utils.trayectorias import AlmacenTrayectorias
+from utils.vectorizado import a_registros
+
+
+def _iguales(a, b):
+    if isinstance(a, float) and isinstance(b, float):
+        return math.isclose(a, b, rel_tol=0, abs_tol=1e-9) or (math.isnan(a) and math.isnan(b))
+    return a == b
+
+
+def _diferencias(escalares, lote):
+    assert len(escalares) == len(lote)
+    return [
+        (i, k, x.get(k), y.get(k))
+        for i, (x, y) in enumerate(zip(escalares, lote))
+        for k in x.keys() | y.keys()
+        if not _iguales(x.get(k), y.get(k))
+    ]
+
+
+def _sucios(n, semilla=0):
+    """Valores como llegan de collares reales: None, texto, NaN, ceros y fuera de rango."""
+    rng = np.random.default_rng(semilla)
+    raros = [None, "", "abc", float("nan"), 0, 0.0, -1, 1e6]
+
+    def columna(lo, hi):
+        return [raros[rng.integers(len(raros))] if rng.random() < 0.2 else round(float(rng.uniform(lo, hi)), 3)
+                for _ in range(n)]
+    return columna
+
+
+@pytest.fixture(scope="module")
+def norms():
+    return [normalizar(c) for c in GeneradorUplinks(30, semilla=1).uplinks(900)]
+
+
+def test_temperatura(norms):
+    # cada combinación nueva es una predicción del modelo: pocas filas alcanzan
+    columna = _sucios(400)
+    temp, amb, hum = columna(30, 45), columna(0, 40), columna(10, 110)
+    ts = np.array([n.ts for n in norms[:400]])
+    horas = horas_locales(ts)
+    escalares = [procesar_temperatura(t, a, h, int(hr)) for t, a, h, hr in zip(temp, amb, hum, horas)]
+    lote = a_registros(procesar_temperatura_lote(temp, amb, hum, horas))
+    assert _diferencias(escalares, lote) == []
+
+
+def test_acelerometro_esquemas_mezclados():
+    columna = _sucios(2000, semilla=2)
+    odba, vedba, odba_g, vedba_g = columna(0, 4), columna(0, 4), columna(0, 4), columna(0, 4)
+    escalares = [procesar_acelerometro({"ODBA": a, "VeDBA": b, "ODBA_g": c, "VeDBA_g": d})
+                 for a, b, c, d in zip(odba, vedba, odba_g, vedba_g)]
+    lote = a_registros(procesar_acelerometro_lote({"ODBA": odba, "VeDBA": vedba,
+                                                   "ODBA_g": odba_g, "VeDBA_g": vedba_g}))
+    assert _diferencias(escalares, lote) == []
+
+
+def test_gps_puntos_sueltos():
+    columna = _sucios(2000, semilla=3)
+    lat, lon = columna(-90, 90), columna(-180, 180)
+    escalares = [procesar_gps({"lat": a, "lon": b}) for a, b in zip(lat, lon)]
+    lote = a_registros(procesar_gps_lote({"lat": lat, "lon": lon}))
+    assert _diferencias(escalares, lote) == []
+
+
+def test_gps_pasos_por_animal_igual_a_trayectoria_de_dos_fixes():
+    rng = np.random.default_rng(4)
+    n = 300
+    animal = rng.choice(["a", "b", "c"], n).tolist()
+    ts = (1_700_000_000 + np.arange(n) * 60.0).tolist()
+    lat = (4.6 + rng.normal(0, 1e-3, n)).tolist()
+    lon = (-74.1 + rng.normal(0, 1e-3, n)).tolist()
+    pasos = a_registros(procesar_gps_lote({"lat": lat, "lon": lon, "animal": animal, "timestamp": ts}))
+
+    previo = {}
+    for i, a in enumerate(animal):
+        if a in previo:
+            j = previo[a]
+            esperado = procesar_gps({"lat": [lat[j], lat[i]], "lon": [lon[j], lon[i]], "timestamp": [ts[j], ts[i]]})
+            assert pasos[i]["distancia"] == pytest.approx(esperado["distancia"])
+            assert pasos[i]["velocidad"] == pytest.approx(esperado["velocidad"])
+        else:
+            assert pasos[i]["distancia"] == 0 and pasos[i]["velocidad"] == 0
+        previo[a] = i
+
+
+def _estado():
+    return EstadoHato(trayectorias=AlmacenTrayectorias(), linea_base=LineaBaseAnimal(None), celo=DetectorCelo())
+
+
+@pytest.mark.parametrize("con_estado", [False, True])
+def test_pipeline(norms, con_estado):
+    e1, e2 = (_estado(), _estado()) if con_estado else (None, None)
+    escalares = [procesar(n, e1) for n in norms]
+    lote = []
+    for i in range(0, len(norms), 128):
+        lote += procesar_lote(norms[i:i + 128], e2)
+    assert _diferencias(escalares, lote) == []
+
+
+def test_pipeline_lote_vacio():
+    assert procesar_lote([]) == []
@@ -0,0 +1,138 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from utils.outbox import Outbox
+
+
+def _puntos(n, desde=0):
+    return [{"ts": 1_700_000_000_000 + i, "values": {"i": i}} for i in range(desde, desde + n)]
+
+
+def _filas(ruta):
+    con = sqlite3.connect(ruta)
+    try:
+        return con.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+    finally:
+        con.close()
+
+
+def _esperar(condicion, timeout=5.0):
+    limite = time.monotonic() + timeout
+    while not condicion():
+        if time.monotonic() > limite:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+class _ThingsBoard:
+    """`enviar` de prueba: registra cada POST y falla mientras `caido` esté activo."""
+
+    def __init__(self, caido=False):
+        self.caido = caido
+        self.envios = []
+        self._lock = threading.Lock()
+
+    def __call__(self, token, puntos):
+        with self._lock:
+            if self.caido:
+                return False
+            self.envios.append((token, [p["values"]["i"] for p in puntos]))
+            return True
+
+    def recibidos(self):
+        with self._lock:
+            return sorted(i for _, ids in self.envios for i in ids)
+
+
+@pytest.fixture
+def ruta(tmp_path):
+    return str(tmp_path / "outbox.sqlite3")
+
+
+def test_guardado_persiste_al_detener(ruta):
+    box = Outbox(ruta, enviar=None, commit_cada_s=0.01)
+    box.guardar("tok", _puntos(25))
+    box.detener()
+    assert _filas(ruta) == 25
+    assert box.estadisticas()["guardados"] == 25
+
+
+def test_drenado_en_partes_de_lote_max_por_token(ruta):
+    tb = _ThingsBoard()
+    box = Outbox(ruta, enviar=tb, commit_cada_s=0.01, lote_drenado=500, lote_max=100)
+    box.guardar("a", _puntos(230))
+    box.guardar("b", _puntos(30, desde=1000))
+    assert _esperar(lambda: len(tb.recibidos()) == 260)
+    box.detener()
+
+    por_token = {}
+    for token, ids in tb.envios:
+        por_token.setdefault(token, []).append(len(ids))
+    assert por_token == {"a": [100, 100, 30], "b": [30]}
+    assert _filas(ruta) == 0
+    assert box.estadisticas()["reenviados"] == 260
+
+
+def test_reanuda_lo_pendiente_de_una_ejecucion_anterior(ruta):
+    previo = Outbox(ruta, enviar=None, commit_cada_s=0.01)
+    previo.guardar("tok", _puntos(40))
+    previo.detener()
+
+    tb = _ThingsBoard()
+    box = Outbox(ruta, enviar=tb, commit_cada_s=0.01)
+    box.iniciar()
+    assert _esperar(lambda: tb.recibidos() == list(range(40)))
+    box.detener()
+    assert _filas(ruta) == 0
+
+
+def test_backoff_exponencial_y_recuperacion(ruta):
+    tb = _ThingsBoard(caido=True)
+    box = Outbox(ruta, enviar=tb, commit_cada_s=0.01, backoff_min_s=0.1, backoff_max_s=0.4)
+    box.guardar("tok", _puntos(10))
+    assert _esperar(lambda: box.estadisticas()["fallos_envio"] >= 3)
+    assert box.estadisticas()["backoff_s"] == pytest.approx(0.4)  # 0.1 → 0.2 → 0.4, tope
+    assert _filas(ruta) == 10  # nada se pierde mientras TB está caído
+
+    tb.caido = False
+    assert _esperar(lambda: tb.recibidos() == list(range(10)))
+    box.detener()
+    assert box.estadisticas()["backoff_s"] == 0.0
+    assert not box.en_falla
+    assert _filas(ruta) == 0
+
+
+def test_programar_backoff_duplica_hasta_el_maximo(ruta):
+    box = Outbox(ruta, backoff_min_s=1.0, backoff_max_s=5.0)
+    esperas = []
+    for _ in range(5):
+        box._programar_backoff()
+        esperas.append(box._backoff_s)
+    assert esperas == [1.0, 2.0, 4.0, 5.0, 5.0]
+    assert box.en_falla
+
+
+def test_tope_de_filas_descarta_las_mas_viejas(ruta):
+    box = Outbox(ruta, enviar=None, max_filas=50, commit_cada_s=0.01)
+    box.guardar("tok", _puntos(80))
+    box.detener()
+    con = sqlite3.connect(ruta)
+    restantes = [int(v.split(":")[1].rstrip("}")) for (v,) in con.execute("SELECT valores FROM outbox ORDER BY id")]
+    con.close()
+    assert restantes == list(range(30, 80))
+    assert box.estadisticas()["descartados"] == 30
+
+
+def test_tope_de_filas_cuenta_lo_de_otros_procesos(ruta):
+    # dos instancias sobre el mismo archivo, como dos workers de gunicorn
+    a = Outbox(ruta, enviar=None, max_filas=50, commit_cada_s=0.01)
+    b = Outbox(ruta, enviar=None, max_filas=50, commit_cada_s=0.01)
+    a.guardar("tok", _puntos(40))
+    a.detener()
+    b.guardar("tok", _puntos(40, desde=40))
+    b.detener()
+    assert _filas(ruta) == 50
@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from utils.reorden import BufferOrden
+
+
+class _Salida:
+    def __init__(self):
+        self.items = []
+        self._lock = threading.Lock()
+
+    def __call__(self, item):
+        with self._lock:
+            self.items.append(item)
+
+    def esperar(self, n, timeout=5.0):
+        limite = time.monotonic() + timeout
+        while len(self.items) < n and time.monotonic() < limite:
+            time.sleep(0.01)
+        return list(self.items)
+
+
+@pytest.fixture
+def salida():
+    return _Salida()
+
+
+def test_libera_en_orden_de_ts_por_animal(salida):
+    buf = BufferOrden(salida, retardo_s=0.05)
+    for ts in (5, 3, 4, 6):
+        assert buf.agregar("a", ts, ("a", ts))
+    assert salida.esperar(4) == [("a", 3), ("a", 4), ("a", 5), ("a", 6)]
+    buf.detener()
+    stats = buf.estadisticas()
+    assert stats["reordenados"] == 2
+    assert stats["liberados"] == 4
+    assert stats["en_espera"] == 0
+
+
+def test_tardios_y_sin_ts_se_entregan_de_inmediato(salida):
+    buf = BufferOrden(salida, retardo_s=0.05)
+    buf.agregar("a", 10, "a10")
+    salida.esperar(1)
+    assert not buf.agregar("a", 9, "a9")   # anterior al último liberado
+    assert not buf.agregar("a", None, "sin-ts")
+    assert buf.agregar("b", 1, "b1")       # otro animal: su propio orden
+    assert salida.esperar(4) == ["a10", "a9", "sin-ts", "b1"]
+    buf.detener()
+    assert buf.estadisticas()["tardios"] == 2
+
+
+def test_max_items_libera_sin_esperar(salida):
+    buf = BufferOrden(salida, retardo_s=60, max_items=2)
+    for ts in (1, 2, 3):
+        buf.agregar("a", ts, ts)
+    assert salida.esperar(1, timeout=2.0) == [1]
+    assert len(buf) == 2
+    buf.detener()
+
+
+def test_detener_libera_lo_retenido_en_orden(salida):
+    buf = BufferOrden(salida, retardo_s=60)
+    for ts in (3, 1, 2):
+        buf.agregar("a", ts, ts)
+    buf.detener()
+    assert salida.items == [1, 2, 3]
+
+
+def test_ultimo_ts_expira_con_ttl(salida):
+    buf = BufferOrden(salida, retardo_s=0.01, ttl_s=0.1)
+    buf.agregar("a", 10, "a10")
+    salida.esperar(1)
+    assert not buf.agregar("a", 5, "a5")   # dentro del TTL: tardío
+    time.sleep(0.15)
+    buf.agregar("b", 1, "b1")              # una liberación posterior expira lo vencido
+    salida.esperar(3)
+    assert buf.agregar("a", 5, "a5-otra")  # ya olvidado: vuelve a retenerse
+    buf.detener()
+
+
+def test_ultimo_ts_acotado_a_max_claves(salida):
+    buf = BufferOrden(salida, retardo_s=0.01, max_claves=2)
+    for clave in "abc":
+        buf.agregar(clave, 10, clave)
+        salida.esperar(len(salida.items) + 1)
+    assert list(buf._ultimo_ts) == ["b", "c"]
+    buf.detener()
+
+
+def test_error_en_al_liberar_no_detiene_el_hilo():
+    entregados = []
+
+    def al_liberar(item):
+        if item == "malo":
+            raise RuntimeError("falla de prueba")
+        entregados.append(item)
+
+    buf = BufferOrden(al_liberar, retardo_s=0.01)
+    buf.agregar("a", 1, "malo")
+    buf.agregar("a", 2, "bueno")
+    buf.detener()
+    assert entregados == ["bueno"]
@@ -0,0 +1,34 @@
+from utils.tiempo import EPOCH_MIN, epoch_a_local_iso, hora_local, ts_canonico, ts_lectura
+
+
+def test_ts_canonico_prefiere_epoch_del_nodo():
+    assert ts_canonico(1_700_000_000, "2020-01-01T00:00:00Z", ahora=1.0) == 1_700_000_000.0
+
+
+def test_ts_canonico_epoch_sin_sincronizar_cae_a_received_at():
+    # reloj del nodo recién encendido (segundos desde el arranque)
+    assert ts_canonico(12_345, "2023-11-14T22:13:20Z", ahora=1.0) == 1_700_000_000.0
+    assert ts_canonico(EPOCH_MIN - 1, "2023-11-14T22:13:20.5Z") == 1_700_000_000.5
+
+
+def test_ts_canonico_valores_invalidos():
+    for epoch in (None, "abc", float("nan"), float("inf"), [1]):
+        assert ts_canonico(epoch, None, ahora=42.0) == 42.0
+    assert ts_canonico(None, "no es una fecha", ahora=42.0) == 42.0
+    assert ts_canonico() is None
+
+
+def test_ts_canonico_acepta_texto_numerico():
+    assert ts_canonico("1700000000.25") == 1_700_000_000.25
+
+
+def test_ts_lectura():
+    assert ts_lectura({"ts": 5.0, "ts_epoch": 1_700_000_000}) == 5.0
+    assert ts_lectura({"ts_epoch": 1_700_000_000}) == 1_700_000_000.0
+    assert ts_lectura({"ts_epoch": 10}) is None
+
+
+def test_hora_local_bogota():
+    # 2023-11-14 22:13:20 UTC = 17:13:20 en Bogotá (UTC-5)
+    assert hora_local(1_700_000_000) == 17
+    assert epoch_a_local_iso(1_700_000_000) == "2023-11-14T17:13:20-05:00"
@@ -0,0 +1,178 @@
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Identificador del collar sin decodificar el JSON: dev_eui (TTN v3 y plano) o, si
+# no viene, device_id (TTN v3) / dev_id (plano). Misma clave que `clave_admision`
+# sobre el uplink normalizado; el parseo completo va después.
+_RE_DEV_EUI = re.compile(rb'"dev_eui"\s*:\s*"([^"]{1,64})"')
+_RE_DEV_ID = re.compile(rb'"(?:device_id|dev_id)"\s*:\s*"([^"]{1,128})"')
+
+
+def dispositivo_rapido(raw: bytes):
+    """dev_eui (en mayúsculas) o device_id / dev_id del cuerpo crudo, sin parsear el JSON; None si no aparece."""
+    m = _RE_DEV_EUI.search(raw)
+    if m:
+        return m.group(1).decode("utf-8", errors="replace").upper()
+    m = _RE_DEV_ID.search(raw)
+    return m.group(1).decode("utf-8", errors="replace") if m else None
+
+
+def clave_admision(norm):
+    """Misma clave que `dispositivo_rapido`, a partir de un uplink ya normalizado (ítems de lote)."""
+    dev = norm.get("dev_eui")
+    return str(dev).upper() if dev else norm.get("dev_id")
+
+
+class _Fragmento:
+    """Cubetas y contadores de una parte de los dispositivos, con su propio candado."""
+    __slots__ = ("cubetas", "lock", "admitidos", "limitados_global", "en_curso")
+
+    def __init__(self):
+        self.cubetas = OrderedDict()  # dispositivo → [fichas, t_ultima], orden LRU
+        self.lock = threading.Lock()
+        self.admitidos = self.limitados_global = self.en_curso = 0
+
+
+class ControlAdmision:
+    """
+    Control de admisión de las rutas de uplink, antes de cualquier procesamiento.
+    - Por dispositivo: cubeta de fichas (`tasa_s` uplinks/s sostenidos, ráfagas de
+      hasta `rafaga`). Las cubetas se reparten en `fragmentos` diccionarios con candado
+      propio: dos hilos solo compiten si sus collares caen en el mismo fragmento, y la
+      sección crítica es una suma y una resta. Una cubeta expulsada (LRU, más de
+      `max_dispositivos`) equivale a una llena, así que expulsar no abre un hueco real.
+    - Global: como mucho `max_concurrentes` peticiones en proceso a la vez; la que no
+      consigue lugar en `espera_s` segundos se rechaza.
+    - `admitir` devuelve None o (motivo, reintentar_en_s) para responder 429 al instante.
+      Los contadores de admitidos y en curso viven en el fragmento del dispositivo
+      (o del hilo, sin dispositivo); con la admisión deshabilitada no se cuenta nada.
+    Los límites son por proceso (con varios workers de gunicorn, por worker).
+    """
+
+    def __init__(self, tasa_s=0.0, rafaga=10.0, max_concurrentes=0, espera_s=0.0,
+                 max_dispositivos=100_000, fragmentos=16, top=20):
+        self.tasa_s = float(tasa_s)
+        self.rafaga = max(float(rafaga), 1.0)
+        self.max_concurrentes = int(max_concurrentes)
+        self.espera_s = float(espera_s)
+        self._fragmentos = [_Fragmento() for _ in range(max(1, int(fragmentos)))]
+        self._max_por_fragmento = max(1, int(max_dispositivos) // len(self._fragmentos))
+        self._cupos = threading.BoundedSemaphore(self.max_concurrentes) if self.max_concurrentes > 0 else None
+        self._lock = threading.Lock()  # solo rechazos por dispositivo (camino poco frecuente)
+        self._limitados_dispositivo = 0
+        self._limitados = Counter()  # dispositivo → rechazos (acotado a los más frecuentes)
+        self.top = int(top)
+
+    @property
+    def por_dispositivo(self):
+        return self.tasa_s > 0
+
+    @property
+    def activa(self):
+        return self.por_dispositivo or self._cupos is not None
+
+    def _fragmento(self, dispositivo):
+        clave = dispositivo if dispositivo is not None else (threading.get_ident(),)
+        return self._fragmentos[hash(clave) % len(self._fragmentos)]
+
+    # ───────── cubetas por dispositivo ─────────
+    def consumir(self, dispositivo, costo=1.0):
+        """
+        Descuenta `costo` fichas de la cubeta de `dispositivo`. Devuelve 0.0 si alcanzó,
+        o los segundos hasta que alcance. Sin tasa configurada o sin dispositivo, siempre 0.0.
+        """
+        if not self.por_dispositivo or dispositivo is None:
+            return 0.0
+        frag = self._fragmento(dispositivo)
+        ahora = time.monotonic()
+        with frag.lock:
+            cubeta = frag.cubetas.get(dispositivo)
+            if cubeta is None:
+                cubeta = frag.cubetas[dispositivo] = [self.rafaga, ahora]
+                if len(frag.cubetas) > self._max_por_fragmento:
+                    frag.cubetas.popitem(last=False)
+            else:
+                frag.cubetas.move_to_end(dispositivo)
+                cubeta[0] = min(self.rafaga, cubeta[0] + (ahora - cubeta[1]) * self.tasa_s)
+                cubeta[1] = ahora
+            if cubeta[0] >= costo:
+                cubeta[0] -= costo
+                return 0.0
+            faltan = min(costo, self.rafaga) - cubeta[0]
+        return faltan / self.tasa_s
+
+    def devolver(self, dispositivo, costo=1.0):
+        """Reintegra fichas consumidas por una petición que al final no se procesó."""
+        if not self.por_dispositivo or dispositivo is None:
+            return
+        frag = self._fragmento(dispositivo)
+        with frag.lock:
+            cubeta = frag.cubetas.get(dispositivo)
+            if cubeta is not None:
+                cubeta[0] = min(self.rafaga, cubeta[0] + costo)
+
+    # ───────── admisión de una petición ─────────
+    def admitir(self, dispositivo=None, costo=1.0):
+        """
+        None si la petición entra (hay que llamar a `salir(dispositivo)` al terminar);
+        si no, (motivo, reintentar_en_s) con motivo "dispositivo" o "global".
+        """
+        if not self.activa:
+            return None
+        espera = self.consumir(dispositivo, costo)
+        if espera > 0:
+            self.registrar_limitado(dispositivo)
+            return "dispositivo", espera
+        frag = self._fragmento(dispositivo)
+        if self._cupos is not None and not self._tomar_cupo():
+            self.devolver(dispositivo, costo)
+            with frag.lock:
+                frag.limitados_global += 1
+            return "global", 1.0
+        with frag.lock:
+            frag.admitidos += 1
+            frag.en_curso += 1
+        return None
+
+    def _tomar_cupo(self):
+        if self.espera_s > 0:
+            return self._cupos.acquire(timeout=self.espera_s)
+        return self._cupos.acquire(blocking=False)
+
+    def salir(self, dispositivo=None):
+        """Libera lo tomado por `admitir(dispositivo)` (mismo dispositivo y, sin él, mismo hilo)."""
+        if not self.activa:
+            return
+        frag = self._fragmento(dispositivo)
+        with frag.lock:
+            frag.en_curso -= 1
+        if self._cupos is not None:
+            self._cupos.release()
+
+    def registrar_limitado(self, dispositivo, n=1):
+        """Cuenta `n` rechazos por cupo de `dispositivo` (también los de ítems de un lote)."""
+        with self._lock:
+            self._limitados_dispositivo += n
+            self._limitados[dispositivo] += n
+            if len(self._limitados) > 4 * self.top:
+                self._limitados = Counter(dict(self._limitados.most_common(self.top)))
+
+    # ───────── observabilidad ─────────
+    def estadisticas(self):
+        stats = {"admitidos": 0, "limitados_dispositivo": self._limitados_dispositivo,
+                 "limitados_global": 0, "en_curso": 0, "dispositivos": 0}
+        for frag in self._fragmentos:
+            with frag.lock:
+                stats["admitidos"] += frag.admitidos
+                stats["limitados_global"] += frag.limitados_global
+                stats["en_curso"] += frag.en_curso
+                stats["dispositivos"] += len(frag.cubetas)
+        stats["max_concurrentes"] = self.max_concurrentes
+        return stats
+
+    def limitados(self, n=None):
+        """Dispositivos con más rechazos por cupo (dispositivo → rechazos)."""
+        with self._lock:
+            return {str(d): c for d, c in self._limitados.most_common(n or self.top)}
@@ -0,0 +1,227 @@
+import threading
+import time
+from collections import OrderedDict
+from math import isfinite
+
+from utils.cola_thingsboard import ts_ms
+from utils.logs import obtener_logger
+from utils.procesamiento_gps import _haversine
+from utils.tiempo import ts_lectura
+
+log = obtener_logger("agregacion")
+
+# Gravedad de estado_general (mayor = peor). Sin lectura y lo desconocido quedan por
+# debajo de normal: solo son el peor estado de una ventana sin ninguna lectura válida
+GRAVEDAD = {"sin_lectura": -1, "desconocido": -1, "normal": 0, "enfriamiento": 2, "posible_celo": 3, "alerta_celo": 4}
+ACTIVIDADES = ("baja", "media", "alta")
+
+
+def _num(v):
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return None
+    return v if isfinite(v) else None
+
+
+class _Acumulador:
+    """Estadísticas de un dispositivo dentro de la ventana en curso."""
+    __slots__ = ("vence", "n", "ts_ini", "ts_fin", "ident", "temps", "actividad",
+                 "distancia", "peor", "ultimo", "fuera")
+
+    def __init__(self, vence):
+        self.vence = vence
+        self.n = 0
+        self.ts_ini = self.ts_fin = None
+        self.ident = {}
+        self.temps = {}  # campo → [min, suma, max, n]
+        self.actividad = dict.fromkeys(ACTIVIDADES, 0)
+        self.distancia = 0.0
+        self.peor = None
+        self.ultimo = {}
+        self.fuera = None
+
+
+class AgregadorTelemetria:
+    """
+    Modo agregado: en vez de una escritura a ThingsBoard por uplink, un resumen
+    compacto por dispositivo cada `ventana_s` segundos (reloj del servidor).
+    - Resumen: n_lecturas, min/media/max de temperaturas, fracción de lecturas por
+      clase de actividad, distancia GPS recorrida (fix a fix) y peor estado_general.
+    - Lecturas urgentes (estado en `urgentes` o con evento de celo / cerca) se
+      envían completas de inmediato, y además cuentan para el resumen.
+    - `al_emitir(token, puntos)` recibe puntos en formato TB [{ts, values}, ...];
+      se llama fuera del candado (desde el hilo de vaciado o el que llamó a `agregar`).
+      Si devuelve False (cola TB llena y sin outbox; con outbox la cola ya los
+      desvió) los puntos se descartan y se cuentan.
+    """
+
+    CAMPOS_TEMP = ("temp_dorsal", "temp_amb", "delta_temp")
+    EVENTOS = ("celo_evento", "cerca_evento")
+
+    def __init__(self, al_emitir, ventana_s=900.0, urgentes=("alerta_celo",), vel_max=20.0,
+                 max_dispositivos=50000):
+        self.al_emitir = al_emitir
+        self.ventana_s = float(ventana_s)
+        self.urgentes = frozenset(urgentes)
+        self.vel_max = float(vel_max)
+        self.max_dispositivos = int(max_dispositivos)
+        self._acumuladores = {}              # token → _Acumulador
+        self._ultimo_fix = OrderedDict()     # token → (lat, lon, ts): la distancia cruza ventanas
+        self._cond = threading.Condition()
+        self._hilo = None
+        self._parar = False
+        self._contadores = {"lecturas": 0, "resumenes": 0, "urgentes": 0, "descartados": 0}
+
+    # ───────── ciclo de vida ─────────
+    def iniciar(self):
+        with self._cond:
+            if self._hilo is not None:
+                return
+            self._parar = False
+            self._hilo = threading.Thread(target=self._vaciar_vencidos, name="agregacion", daemon=True)
+            self._hilo.start()
+
+    def detener(self, timeout=5.0):
+        """Emite los resúmenes de las ventanas abiertas y detiene el hilo."""
+        with self._cond:
+            self._parar = True
+            self._cond.notify()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+            self._hilo = None
+        self.vaciar()
+
+    # ───────── API ─────────
+    def agregar(self, token, salida):
+        """
+        Acumula una salida del pipeline (las urgentes además se envían de inmediato).
+        Devuelve False solo si la lectura era urgente y no se pudo entregar ni guardar.
+        """
+        if self._hilo is None:
+            self.iniciar()
+        urgente = salida.get("estado_general") in self.urgentes or any(salida.get(e) for e in self.EVENTOS)
+        with self._cond:
+            acc = self._acumuladores.get(token)
+            if acc is None:
+                acc = self._acumuladores[token] = _Acumulador(time.monotonic() + self.ventana_s)
+                self._cond.notify()
+            self._sumar(token, acc, salida)
+            self._contadores["lecturas"] += 1
+            if urgente:
+                self._contadores["urgentes"] += 1
+        if urgente:
+            return self._emitir(token, [{"ts": ts_ms(ts_lectura(salida)), "values": salida}],
+                                "lectura urgente", salida.get("dev_eui") or salida.get("dev_id"))
+        return True
+
+    def vaciar(self, solo_vencidos=False):
+        """Emite (y descarta) los acumuladores vencidos, o todos. Devuelve cuántos resúmenes salieron."""
+        ahora = time.monotonic()
+        with self._cond:
+            tokens = [t for t, a in self._acumuladores.items() if not solo_vencidos or a.vence <= ahora]
+            listos = [(t, self._acumuladores.pop(t)) for t in tokens]
+            self._contadores["resumenes"] += len(listos)
+        for token, acc in listos:
+            try:
+                self._emitir(token, [{"ts": ts_ms(acc.ts_fin), "values": resumen(acc)}],
+                             "resumen", acc.ident.get("dev_eui") or acc.ident.get("dev_id"))
+            except Exception as e:
+                log.exception("❌ Error emitiendo resumen agregado: %s", e)
+        return len(listos)
+
+    def _emitir(self, token, puntos, que, dispositivo):
+        """Entrega `puntos`; si la cola los rechaza se descartan (con log y contador)."""
+        if self.al_emitir(token, puntos) is not False:
+            return True
+        log.warning("⚠️ Cola TB llena, %s descartado para %s", que, dispositivo)
+        with self._cond:
+            self._contadores["descartados"] += len(puntos)
+        return False
+
+    def estadisticas(self):
+        with self._cond:
+            stats = dict(self._contadores)
+            stats["abiertos"] = len(self._acumuladores)
+        emitidos = stats["resumenes"] + stats["urgentes"]
+        stats["escrituras_por_lectura"] = round(emitidos / stats["lecturas"], 4) if stats["lecturas"] else None
+        return stats
+
+    # ───────── acumulación ─────────
+    def _sumar(self, token, acc, s):
+        acc.n += 1
+        ts = _num(ts_lectura(s))
+        if ts is not None:
+            acc.ts_ini = ts if acc.ts_ini is None else min(acc.ts_ini, ts)
+            acc.ts_fin = ts if acc.ts_fin is None else max(acc.ts_fin, ts)
+        for campo in ("dev_id", "dev_eui", "cow_id"):
+            if s.get(campo) is not None:
+                acc.ident[campo] = s[campo]
+
+        for campo in self.CAMPOS_TEMP:
+            v = _num(s.get(campo))
+            if v is None:
+                continue
+            t = acc.temps.get(campo)
+            if t is None:
+                acc.temps[campo] = [v, v, v, 1]
+            else:
+                t[0], t[1], t[2], t[3] = min(t[0], v), t[1] + v, max(t[2], v), t[3] + 1
+
+        if s.get("actividad") in acc.actividad:
+            acc.actividad[s["actividad"]] += 1
+
+        estado = s.get("estado_general") or "desconocido"
+        if acc.peor is None or GRAVEDAD.get(estado, -1) > GRAVEDAD.get(acc.peor, -1):
+            acc.peor = estado
+        if s.get("fuera_de_cerca") is not None:
+            acc.fuera = bool(acc.fuera) or bool(s["fuera_de_cerca"])
+        for campo in ("potrero", "celo_activo", "estado_z"):
+            if campo in s:
+                acc.ultimo[campo] = s[campo]
+
+        lat, lon = _num(s.get("lat")), _num(s.get("lon"))
+        if lat is not None and lon is not None:
+            acc.ultimo["lat"], acc.ultimo["lon"] = lat, lon
+            previo = self._ultimo_fix.pop(token, None)
+            if previo is not None:
+                d = _haversine(previo[0], previo[1], lat, lon)
+                dt = ts - previo[2] if ts is not None and previo[2] is not None else None
+                # saltos imposibles (> vel_max) se toman como ruido del GPS
+                if dt is None or dt <= 0 or d / dt <= self.vel_max:
+                    acc.distancia += d
+            self._ultimo_fix[token] = (lat, lon, ts)
+            while len(self._ultimo_fix) > self.max_dispositivos:
+                self._ultimo_fix.popitem(last=False)
+
+    # ───────── hilo de vaciado ─────────
+    def _vaciar_vencidos(self):
+        while True:
+            with self._cond:
+                if self._parar:
+                    return
+                proximo = min((a.vence for a in self._acumuladores.values()), default=None)
+                espera = None if proximo is None else proximo - time.monotonic()
+                if espera is None or espera > 0:
+                    self._cond.wait(espera)
+                    continue
+            self.vaciar(solo_vencidos=True)
+
+
+def resumen(acc):
+    """Valores TB del resumen de una ventana (claves compactas, sin los campos por lectura)."""
+    valores = {**acc.ident, "n_lecturas": acc.n, "ts_inicio": acc.ts_ini, "ts_fin": acc.ts_fin}
+    for campo, (lo, suma, hi, n) in acc.temps.items():
+        valores[f"{campo}_min"] = round(lo, 2)
+        valores[f"{campo}_media"] = round(suma / n, 2)
+        valores[f"{campo}_max"] = round(hi, 2)
+    con_actividad = sum(acc.actividad.values())
+    if con_actividad:
+        for clase, n in acc.actividad.items():
+            valores[f"actividad_{clase}_frac"] = round(n / con_actividad, 3)
+    valores["distancia_total"] = round(acc.distancia, 2)
+    valores["estado_general"] = acc.peor
+    if acc.fuera is not None:
+        valores["fuera_de_cerca"] = acc.fuera
+    valores.update(acc.ultimo)
+    return valores
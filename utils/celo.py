@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from math import isfinite
+
+from utils.procesamiento_gps import _haversine
+
+_SIN_DATOS = {"celo_evento": None, "celo_confianza": None, "celo_activo": False}
+
+
+def _num(x):
+    try:
+        x = float(x)
+        return x if isfinite(x) else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _escala(valor, alto):
+    """0 en la línea base (ratio 1), 1 al llegar a `alto`."""
+    return min(1.0, max(0.0, (valor - 1.0) / (alto - 1.0)))
+
+
+class _Animal:
+    """
+    Ventana deslizante de un animal con sumas acumuladas (altas/bajas O(1))
+    y línea base EWMA de actividad y desplazamiento.
+    """
+    __slots__ = ("lecturas", "suma_act", "suma_dist", "suma_dt", "suma_delta", "n_delta",
+                 "base_act", "base_tasa", "n_base", "t_ult", "lat_ult", "lon_ult",
+                 "activo", "racha", "inicio_t", "ultimo_uso")
+
+    def __init__(self):
+        self.lecturas = deque()  # (t, act, dist, dt, delta)
+        self.suma_act = self.suma_dist = self.suma_dt = self.suma_delta = 0.0
+        self.n_delta = 0
+        self.base_act = self.base_tasa = 0.0
+        self.n_base = 0
+        self.t_ult = self.lat_ult = self.lon_ult = None
+        self.activo = False
+        self.racha = 0
+        self.inicio_t = None
+        self.ultimo_uso = 0.0
+
+    def agregar(self, t, act, dist, dt, delta, ventana_s):
+        self.lecturas.append((t, act, dist, dt, delta))
+        self.suma_act += act
+        self.suma_dist += dist
+        self.suma_dt += dt
+        if delta is not None:
+            self.suma_delta += delta
+            self.n_delta += 1
+        while self.lecturas and t - self.lecturas[0][0] > ventana_s:
+            _, a, d, s, dl = self.lecturas.popleft()
+            self.suma_act -= a
+            self.suma_dist -= d
+            self.suma_dt -= s
+            if dl is not None:
+                self.suma_delta -= dl
+                self.n_delta -= 1
+
+
+class DetectorCelo:
+    """
+    Detector incremental de celo por animal combinando varias señales en una ventana deslizante:
+    - actividad (VeDBA, u ODBA si no hay) de la ventana vs. la línea base del propio animal,
+    - desplazamiento (m/h entre fixes GPS) vs. su línea base,
+    - delta de temperatura dorsal media de la ventana.
+    La confianza (0–1) es el promedio ponderado de las señales disponibles. Los eventos
+    'inicio' / 'fin' tienen histéresis (umbral_inicio > umbral_fin) y exigen
+    `confirmaciones` uplinks seguidos para no oscilar con lecturas LoRa esporádicas.
+    La línea base solo aprende fuera del celo. Todo es O(1) amortizado por uplink.
+    """
+
+    def __init__(self, ventana_s=2 * 3600.0, alpha=0.02, min_muestras=24, min_ventana=3,
+                 umbral_inicio=0.6, umbral_fin=0.3, confirmaciones=2, duracion_max_s=48 * 3600.0,
+                 ratio_act_alto=2.0, ratio_dist_alto=2.0, delta_alto=0.6, hueco_max_s=3600.0,
+                 pesos=(0.5, 0.25, 0.25), inactividad_s=7 * 86400.0, max_animales=50000):
+        self.ventana_s = float(ventana_s)
+        self.alpha = alpha
+        self.min_muestras = min_muestras
+        self.min_ventana = min_ventana
+        self.umbral_inicio = umbral_inicio
+        self.umbral_fin = umbral_fin
+        self.confirmaciones = max(1, int(confirmaciones))
+        self.duracion_max_s = duracion_max_s
+        self.ratio_act_alto = ratio_act_alto
+        self.ratio_dist_alto = ratio_dist_alto
+        self.delta_alto = delta_alto
+        self.hueco_max_s = hueco_max_s
+        self.pesos = pesos
+        self.inactividad_s = float(inactividad_s)
+        self.max_animales = int(max_animales)
+        self._animales = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._animales)
+
+    def evaluar(self, clave, ts, vedba=None, odba=None, lat=None, lon=None, delta_temp=None):
+        """
+        Agrega la lectura del animal y devuelve {celo_evento, celo_confianza, celo_activo}.
+        celo_evento es 'inicio', 'fin' o None.
+        """
+        act = _num(vedba)
+        if act is None:
+            act = _num(odba)
+        t = _num(ts)
+        if clave is None or act is None or t is None:
+            return dict(_SIN_DATOS)
+        lat, lon, delta = _num(lat), _num(lon), _num(delta_temp)
+        ahora = time.time()
+
+        with self._lock:
+            a = self._animales.get(clave)
+            if a is None:
+                a = self._animales[clave] = _Animal()
+            else:
+                self._animales.move_to_end(clave)
+            a.ultimo_uso = ahora
+            resultado = self._actualizar(a, t, act, lat, lon, delta)
+            self._expulsar_inactivos(ahora)
+        return resultado
+
+    def _actualizar(self, a, t, act, lat, lon, delta):
+        if a.t_ult is not None and t <= a.t_ult:
+            # fuera de orden o repetida: no entra en la ventana
+            return {"celo_evento": None, "celo_confianza": None, "celo_activo": a.activo}
+        dt = min(t - a.t_ult, self.hueco_max_s) if a.t_ult is not None else 0.0
+        dist = 0.0
+        if lat is not None and lon is not None:
+            if a.lat_ult is not None and dt > 0:
+                dist = _haversine(a.lat_ult, a.lon_ult, lat, lon)
+            a.lat_ult, a.lon_ult = lat, lon
+        a.t_ult = t
+        a.agregar(t, act, dist, dt, delta, self.ventana_s)
+
+        confianza = self._confianza(a)
+        evento = self._transicion(a, t, confianza)
+
+        # la línea base aprende solo fuera del celo
+        if not a.activo and evento is None:
+            w = max(self.alpha, 1.0 / (a.n_base + 1))
+            a.base_act += w * (act - a.base_act)
+            if dt > 0:
+                a.base_tasa += w * (dist / dt * 3600.0 - a.base_tasa)
+            a.n_base += 1
+
+        return {
+            "celo_evento": evento,
+            "celo_confianza": round(confianza, 2) if confianza is not None else None,
+            "celo_activo": a.activo,
+        }
+
+    def _confianza(self, a):
+        n = len(a.lecturas)
+        if a.n_base < self.min_muestras or n < self.min_ventana:
+            return None
+        senales = []
+        if a.base_act > 0:
+            senales.append((self.pesos[0], _escala(a.suma_act / n / a.base_act, self.ratio_act_alto)))
+        if a.base_tasa > 0 and a.suma_dt > 0:
+            tasa = a.suma_dist / a.suma_dt * 3600.0
+            senales.append((self.pesos[1], _escala(tasa / a.base_tasa, self.ratio_dist_alto)))
+        if a.n_delta:
+            delta_media = a.suma_delta / a.n_delta
+            senales.append((self.pesos[2], min(1.0, max(0.0, delta_media / self.delta_alto))))
+        peso = sum(p for p, _ in senales)
+        if peso <= 0:
+            return None
+        return sum(p * s for p, s in senales) / peso
+
+    def _transicion(self, a, t, confianza):
+        """Debounce con histéresis; devuelve 'inicio', 'fin' o None."""
+        if a.activo and t - a.inicio_t > self.duracion_max_s:
+            a.activo, a.racha, a.inicio_t = False, 0, None
+            return "fin"
+        if confianza is None:
+            a.racha = 0
+            return None
+        cambia = confianza < self.umbral_fin if a.activo else confianza >= self.umbral_inicio
+        a.racha = a.racha + 1 if cambia else 0
+        if a.racha < self.confirmaciones:
+            return None
+        a.racha = 0
+        a.activo = not a.activo
+        a.inicio_t = t if a.activo else None
+        return "inicio" if a.activo else "fin"
+
+    def _expulsar_inactivos(self, ahora):
+        while self._animales:
+            clave, a = next(iter(self._animales.items()))
+            if len(self._animales) <= self.max_animales and ahora - a.ultimo_uso <= self.inactividad_s:
+                break
+            self._animales.popitem(last=False)
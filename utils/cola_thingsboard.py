@@ -0,0 +1,218 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from utils.envio_thingsboard import enviar_lote_thingsboard
+from utils.logs import obtener_logger
+from utils.metricas import TB_LATENCIA, TB_PETICIONES
+from utils.tiempo import EPOCH_MIN
+
+log = obtener_logger("thingsboard")
+
+
+def ts_ms(ts):
+    """
+    Epoch (s) → milisegundos para TB. Recibe el ts canónico de la lectura; si no es
+    plausible (reloj del nodo sin sincronizar) usa la hora actual, como hacía TB al
+    estampar la telemetría sin ts.
+    """
+    try:
+        ts = float(ts)
+        if ts >= EPOCH_MIN:
+            return int(ts * 1000)
+    except (TypeError, ValueError, OverflowError):
+        pass
+    return int(time.time() * 1000)
+
+
+class ColaThingsBoard:
+    """
+    Cola acotada + hilos de envío hacia ThingsBoard.
+    - El webhook solo encola (no espera la respuesta de TB).
+    - Cada hilo agrupa los puntos del mismo token en un único POST
+      con formato array [{ts, values}, ...].
+    - Sesiones HTTP keep-alive por token (una por hilo, LRU acotado).
+    - Contrapresión: si la cola está llena se descarta y se cuenta.
+    - Con `outbox`, lo que no se pudo enviar (o no cupo) se guarda en disco y se
+      reenvía después; mientras TB está caído se escribe directo al outbox.
+    """
+
+    def __init__(self, base_url, max_items=10000, workers=2, lote_max=100,
+                 espera_encolar_s=0.0, timeout=5, sesiones_max=256, outbox=None):
+        self.base_url = base_url.rstrip("/")
+        self.lote_max = max(1, int(lote_max))
+        self.espera_encolar_s = espera_encolar_s
+        self.timeout = timeout
+        self.sesiones_max = sesiones_max
+        self.n_workers = max(1, int(workers))
+        self.outbox = outbox
+
+        self._cola = queue.Queue(maxsize=max_items)
+        self._hilos = []
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self._contadores = {
+            "encolados": 0,
+            "descartados": 0,
+            "enviados": 0,
+            "peticiones": 0,
+            "errores_http": 0,
+            "errores_conexion": 0,
+            "a_outbox": 0,
+        }
+
+    # ───────── ciclo de vida ─────────
+    def iniciar(self):
+        with self._lock:
+            if self._hilos:
+                return
+            self._parar.clear()
+            for i in range(self.n_workers):
+                h = threading.Thread(target=self._trabajar, name=f"tb-envio-{i}", daemon=True)
+                h.start()
+                self._hilos.append(h)
+
+    def detener(self, timeout=5.0):
+        """
+        Espera hasta `timeout` a que se vacíe la cola y detiene los hilos. Lo que siga
+        encolado al vencer el plazo va al outbox (sin outbox se descarta y se cuenta).
+        """
+        limite = time.monotonic() + timeout
+        while not self._cola.empty() and time.monotonic() < limite:
+            time.sleep(0.02)
+        self._parar.set()
+        for h in self._hilos:
+            h.join(max(0.0, limite - time.monotonic()))
+        self._hilos = []
+        self._volcar_pendientes()
+
+    def _volcar_pendientes(self):
+        grupos = {}
+        while True:
+            try:
+                token, puntos = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            grupos.setdefault(token, []).extend(puntos)
+        total = sum(len(p) for p in grupos.values())
+        if not total:
+            return
+        if self.outbox is not None:
+            for token, puntos in grupos.items():
+                self._a_outbox(token, puntos)
+            log.warning("⏱️ Apagado: %d puntos sin enviar pasan al outbox", total)
+        else:
+            self._sumar("descartados", total)
+            log.warning("⚠️ Apagado: %d puntos sin enviar descartados (sin outbox)", total)
+
+    # ───────── productor ─────────
+    def encolar(self, token, valores, ts=None):
+        """Encola un punto de telemetría (`ts`: timestamp canónico de la lectura). False si se descartó."""
+        return self.encolar_lote(token, [{"ts": ts_ms(ts), "values": valores}])
+
+    def encolar_lote(self, token, puntos):
+        """Encola varios puntos del mismo token como un solo elemento."""
+        if not puntos:
+            return True
+        if not self._hilos:
+            self.iniciar()
+        try:
+            if self.espera_encolar_s > 0:
+                self._cola.put((token, list(puntos)), timeout=self.espera_encolar_s)
+            else:
+                self._cola.put_nowait((token, list(puntos)))
+        except queue.Full:
+            if self.outbox is not None:
+                self._a_outbox(token, puntos)
+                return True
+            self._sumar("descartados", len(puntos))
+            return False
+        self._sumar("encolados", len(puntos))
+        return True
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._contadores)
+        stats["pendientes"] = self._cola.qsize()
+        stats["capacidad"] = self._cola.maxsize
+        return stats
+
+    # ───────── consumidores ─────────
+    def _sumar(self, clave, n=1):
+        with self._lock:
+            self._contadores[clave] += n
+
+    def _sesion(self, token):
+        sesiones = getattr(self._local, "sesiones", None)
+        if sesiones is None:
+            sesiones = self._local.sesiones = OrderedDict()
+        s = sesiones.get(token)
+        if s is not None:
+            sesiones.move_to_end(token)
+            return s
+        s = requests.Session()
+        sesiones[token] = s
+        if len(sesiones) > self.sesiones_max:
+            _, vieja = sesiones.popitem(last=False)
+            vieja.close()
+        return s
+
+    def _tomar_lote(self):
+        """Bloquea por el primer elemento y luego drena sin bloquear hasta lote_max puntos."""
+        try:
+            token, puntos = self._cola.get(timeout=0.2)
+        except queue.Empty:
+            return None
+        grupos = {token: list(puntos)}
+        total = len(puntos)
+        while total < self.lote_max:
+            try:
+                token, puntos = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            grupos.setdefault(token, []).extend(puntos)
+            total += len(puntos)
+        return grupos
+
+    def _trabajar(self):
+        while not (self._parar.is_set() and self._cola.empty()):
+            grupos = self._tomar_lote()
+            if not grupos:
+                continue
+            for token, puntos in grupos.items():
+                for i in range(0, len(puntos), self.lote_max):
+                    parte = puntos[i:i + self.lote_max]
+                    if self.outbox is not None and self.outbox.en_falla:
+                        self._a_outbox(token, parte)
+                    elif not self.enviar(token, parte) and self.outbox is not None:
+                        self._a_outbox(token, parte)
+
+    def _a_outbox(self, token, puntos):
+        self.outbox.guardar(token, puntos)
+        self._sumar("a_outbox", len(puntos))
+
+    def enviar(self, token, puntos):
+        """POST síncrono de un lote a TB (lo usan los hilos y el drenador del outbox)."""
+        url = f"{self.base_url}/api/v1/{token}/telemetry"
+        self._sumar("peticiones")
+        try:
+            with TB_LATENCIA.medir():
+                status = enviar_lote_thingsboard(self._sesion(token), url, puntos, self.timeout)
+        except Exception as e:
+            self._sumar("errores_conexion")
+            TB_PETICIONES.inc("conexion")
+            log.error("❌ Error de conexión con ThingsBoard: %s", e)
+            return False
+        if status != 200:
+            self._sumar("errores_http")
+            TB_PETICIONES.inc("no_200")
+            log.warning("⚠️ Error al enviar a ThingsBoard (%s)", status)
+            return False
+        self._sumar("enviados", len(puntos))
+        TB_PETICIONES.inc("ok")
+        return True
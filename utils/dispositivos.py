@@ -0,0 +1,199 @@
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+from utils.logs import obtener_logger
+
+log = obtener_logger("dispositivos")
+
+# Columnas reconocidas; cualquier otra columna/campo va a `ajustes`
+_CAMPOS = {"dev_eui", "device_id", "dev_id", "cow_id", "token"}
+
+
+class Dispositivo(NamedTuple):
+    token: str
+    dev_eui: str = None
+    dev_id: str = None
+    cow_id: str = None
+    ajustes: Mapping = MappingProxyType({})  # solo lectura: el default es compartido
+
+
+def normalizar_eui(v):
+    if v is None:
+        return None
+    v = str(v).strip().upper().replace(":", "").replace("-", "").replace(" ", "")
+    return v or None
+
+
+def normalizar_id(v):
+    if v is None:
+        return None
+    v = str(v).strip().lower()
+    return v or None
+
+
+class _Indice:
+    """Índices inmutables por DevEUI / device_id / cow_id (se reemplazan completos al recargar)."""
+    __slots__ = ("por_eui", "por_id", "por_cow", "n")
+
+    def __init__(self, dispositivos):
+        self.por_eui, self.por_id, self.por_cow = {}, {}, {}
+        for d in dispositivos:
+            if d.dev_eui:
+                self.por_eui[normalizar_eui(d.dev_eui)] = d
+            if d.dev_id:
+                self.por_id[normalizar_id(d.dev_id)] = d
+            if d.cow_id:
+                self.por_cow[normalizar_id(d.cow_id)] = d
+        self.n = len(dispositivos)
+
+
+def _desde_fila(fila):
+    fila = {k.strip(): v for k, v in fila.items() if k}
+    token = (fila.get("token") or "").strip()
+    if not token:
+        return None
+    ajustes = {k: v for k, v in fila.items() if k not in _CAMPOS and v not in (None, "")}
+    return Dispositivo(
+        token=token,
+        dev_eui=fila.get("dev_eui") or None,
+        dev_id=fila.get("device_id") or fila.get("dev_id") or None,
+        cow_id=str(fila["cow_id"]) if fila.get("cow_id") not in (None, "") else None,
+        ajustes=ajustes,
+    )
+
+
+def desde_dict_tokens(tokens):
+    """{clave: token} estilo DEVICE_TOKENS: la clave se indexa como DevEUI y como device_id."""
+    return [Dispositivo(token=t, dev_eui=k, dev_id=k) for k, t in tokens.items() if t]
+
+
+def cargar_archivo(ruta):
+    """Lee dispositivos desde .json, .csv o .sqlite/.db (tabla `dispositivos`)."""
+    ext = os.path.splitext(ruta)[1].lower()
+    if ext == ".json":
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+        if isinstance(datos, dict) and "dispositivos" in datos:
+            datos = datos["dispositivos"]
+        if isinstance(datos, dict):
+            filas = [({"dev_eui": k, "token": v} if isinstance(v, str) else {"dev_eui": k, **v})
+                     for k, v in datos.items()]
+        else:
+            filas = datos
+    elif ext == ".csv":
+        with open(ruta, encoding="utf-8", newline="") as f:
+            filas = list(csv.DictReader(f))
+    elif ext in (".sqlite", ".sqlite3", ".db"):
+        con = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True)
+        try:
+            con.row_factory = sqlite3.Row
+            filas = [dict(r) for r in con.execute("SELECT * FROM dispositivos")]
+        finally:
+            con.close()
+    else:
+        raise ValueError(f"formato de registro no soportado: {ext}")
+    return [d for d in map(_desde_fila, filas) if d is not None]
+
+
+class RegistroDispositivos:
+    """
+    Registro DevEUI / device_id / cow_id → token TB + ajustes por dispositivo.
+    - Búsquedas O(1) sobre índices con mayúsculas/minúsculas normalizadas.
+    - Si hay archivo, se revisa su mtime como máximo cada `intervalo_s` y se recarga
+      construyendo un índice nuevo que se intercambia de forma atómica; las
+      peticiones en curso siguen usando el índice anterior.
+    - Si el archivo no existe o falla al cargar, se conserva lo último válido
+      (o `base`, p. ej. DEVICE_TOKENS).
+    - La búsqueda es exacta por DevEUI o device_id. Con `por_cow_id=True` se acepta
+      además el cow_id como último recurso (un cow_id que coincida con la clave de otro
+      collar mandaría la telemetría a su token), y cada uso queda en el log.
+    """
+
+    def __init__(self, ruta=None, base=None, intervalo_s=2.0, al_recargar=None, por_cow_id=False):
+        self.ruta = ruta
+        self.por_cow_id = por_cow_id
+        self.intervalo_s = intervalo_s
+        self.al_recargar = al_recargar
+        self._base = list(base or [])
+        self._firma = None
+        self._proxima_revision = 0.0
+        self._lock_recarga = threading.Lock()
+        self._indice = _Indice(self._base)
+        if self.ruta:
+            self.recargar()
+        elif self.al_recargar:
+            self.al_recargar(self)
+
+    def __len__(self):
+        return self._indice.n
+
+    # ───────── recarga ─────────
+    def _firma_archivo(self):
+        st = os.stat(self.ruta)
+        return (st.st_mtime_ns, st.st_size)
+
+    def recargar(self):
+        """Carga el archivo y reemplaza el índice. Devuelve True si cambió."""
+        try:
+            firma = self._firma_archivo()
+            dispositivos = cargar_archivo(self.ruta)
+        except Exception as e:
+            log.error("❌ No se pudo cargar el registro de dispositivos %s: %s", self.ruta, e)
+            return False
+        self._indice = _Indice(self._base + dispositivos)
+        self._firma = firma
+        log.info("📒 Registro de dispositivos cargado: %d dispositivos", self._indice.n)
+        if self.al_recargar:
+            self.al_recargar(self)
+        return True
+
+    def _revisar(self):
+        ahora = time.monotonic()
+        if not self.ruta or ahora < self._proxima_revision:
+            return
+        # Solo un hilo revisa; los demás siguen con el índice actual sin esperar
+        if not self._lock_recarga.acquire(blocking=False):
+            return
+        try:
+            self._proxima_revision = ahora + self.intervalo_s
+            try:
+                firma = self._firma_archivo()
+            except OSError:
+                return
+            if firma != self._firma:
+                self.recargar()
+        finally:
+            self._lock_recarga.release()
+
+    # ───────── consultas ─────────
+    def resolver(self, dev_eui=None, dev_id=None, cow_id=None):
+        """Dispositivo por DevEUI, luego device_id (y cow_id si `por_cow_id`); None si no está registrado."""
+        self._revisar()
+        idx = self._indice
+        d = None
+        if dev_eui:
+            d = idx.por_eui.get(normalizar_eui(dev_eui))
+        if d is None and dev_id:
+            d = idx.por_id.get(normalizar_id(dev_id))
+        if d is None and self.por_cow_id and cow_id is not None:
+            d = idx.por_cow.get(normalizar_id(cow_id))
+            if d is not None:
+                log.info("🐄 Dispositivo %s resuelto por cow_id %s", dev_eui or dev_id, cow_id)
+        return d
+
+    def resolver_norm(self, norm):
+        return self.resolver(norm.get("dev_eui"), norm.get("dev_id"), norm.get("cow_id"))
+
+    def token(self, dev_eui=None, dev_id=None, cow_id=None):
+        d = self.resolver(dev_eui, dev_id, cow_id)
+        return d.token if d else None
+
+    def tokens(self):
+        idx = self._indice
+        return {d.token for m in (idx.por_eui, idx.por_id, idx.por_cow) for d in m.values()}
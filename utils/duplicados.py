@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+from utils.tiempo import ts_lectura
+
+
+def clave_uplink(norm):
+    """
+    (dispositivo, f_cnt, ts canónico) de un uplink; None si no hay con qué identificarlo.
+    Incluir el ts evita confundir uplinks reales tras un reinicio del contador f_cnt; si
+    el uplink no traía tiempo (`ts` es la hora de llegada) no entra en la clave, porque
+    cada reintento tendría uno distinto.
+    """
+    dev = norm.get("dev_eui") or norm.get("dev_id")
+    f_cnt = norm.get("f_cnt")
+    ts = None if norm.get("ts_llegada") else ts_lectura(norm)
+    if dev is None or (f_cnt is None and ts is None):
+        return None
+    return (str(dev).upper(), f_cnt, ts)
+
+
+class CacheDuplicados:
+    """
+    Uplinks vistos recientemente (reintentos del webhook de TTN, copias por varios gateways).
+    - `visto` es O(1): consulta y registra en un OrderedDict ordenado por llegada.
+    - Las entradas expiran a los `ttl_s` segundos y nunca hay más de `max_items`.
+    - Si el uplink no llega a procesarse y encolarse, `olvidar` retira la clave para
+      que el reintento de TTN no se tome por duplicado.
+    """
+
+    def __init__(self, ttl_s=600.0, max_items=200_000):
+        self.ttl_s = float(ttl_s)
+        self.max_items = int(max_items)
+        self._vistos = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicados = 0
+
+    def __len__(self):
+        return len(self._vistos)
+
+    def visto(self, clave):
+        """True si `clave` ya llegó dentro del TTL (es un duplicado); si no, la registra."""
+        if clave is None:
+            return False
+        ahora = time.monotonic()
+        with self._lock:
+            self._expirar(ahora)
+            if clave in self._vistos:
+                self.duplicados += 1
+                return True
+            self._vistos[clave] = ahora
+            return False
+
+    def olvidar(self, clave):
+        """Retira `clave` (el uplink falló): la próxima copia se procesa."""
+        if clave is None:
+            return
+        with self._lock:
+            self._vistos.pop(clave, None)
+
+    def _expirar(self, ahora):
+        limite = ahora - self.ttl_s
+        while self._vistos:
+            clave, t = next(iter(self._vistos.items()))
+            if t > limite and len(self._vistos) < self.max_items:
+                break
+            self._vistos.popitem(last=False)
+
+    def estadisticas(self):
+        return {"entradas": len(self._vistos), "duplicados": self.duplicados}
@@ -1,12 +1,27 @@
 import requests
 
+from utils.logs import obtener_logger
+
+log = obtener_logger("thingsboard")
+
 def enviar_a_thingsboard(url, payload):
     """7️⃣ Envía los datos procesados al dashboard de ThingsBoard"""
     try:
         r = requests.post(url, json=payload, timeout=5)
         if r.status_code == 200:
-            print(f"✅ Enviado a ThingsBoard → {payload}")
+            log.debug("✅ Enviado a ThingsBoard → %s", payload, extra={"muestreo": True})
         else:
-            print(f"⚠️ Error al enviar a ThingsBoard ({r.status_code})")
+            log.warning("⚠️ Error al enviar a ThingsBoard (%s)", r.status_code)
     except Exception as e:
-        print(f"❌ Error de conexión: {e}")
+        log.error("❌ Error de conexión: %s", e)
+
+def enviar_lote_thingsboard(sesion, url, puntos, timeout=5):
+    """
+    Envía varios puntos de telemetría en una sola petición.
+    - `puntos` es una lista de {"ts": <ms>, "values": {...}} (formato array de TB).
+    - Usa la sesión recibida para reutilizar conexiones keep-alive.
+    - Devuelve el status HTTP; las excepciones de red se propagan al llamador.
+    """
+    cuerpo = puntos[0] if len(puntos) == 1 else puntos
+    r = sesion.post(url, json=cuerpo, timeout=timeout)
+    return r.status_code
@@ -0,0 +1,218 @@
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.logs import obtener_logger
+from utils.vectorizado import a_flotantes
+
+log = obtener_logger("geocercas")
+
+# Propiedades GeoJSON que se usan como nombre del potrero (en este orden)
+_PROPIEDADES_NOMBRE = ("potrero", "nombre", "name", "id")
+
+
+def _nombre(feature, i):
+    props = feature.get("properties") or {}
+    for p in _PROPIEDADES_NOMBRE:
+        if props.get(p) not in (None, ""):
+            return str(props[p])
+    return str(feature.get("id", f"potrero-{i}"))
+
+
+def cargar_geojson(ruta):
+    """
+    Lee un FeatureCollection de Polygon / MultiPolygon → [(nombre, [anillo, ...]), ...].
+    Cada anillo es un array (n, 2) de [lon, lat]; el primero es el borde y el resto, huecos.
+    """
+    with open(ruta, encoding="utf-8") as f:
+        datos = json.load(f)
+    features = datos.get("features", [datos]) if isinstance(datos, dict) else datos
+    poligonos = []
+    for i, feat in enumerate(features):
+        geom = feat.get("geometry") or {}
+        tipo, coords = geom.get("type"), geom.get("coordinates") or []
+        if tipo == "Polygon":
+            partes = [coords]
+        elif tipo == "MultiPolygon":
+            partes = coords
+        else:
+            continue
+        nombre = _nombre(feat, i)
+        for anillos in partes:
+            anillos = [np.asarray(a, dtype=float)[:, :2] for a in anillos if len(a) >= 3]
+            if anillos:
+                poligonos.append((nombre, anillos))
+    return poligonos
+
+
+class IndiceGeocercas:
+    """
+    Índice espacial de potreros para consultas punto-en-polígono.
+    - Grilla uniforme sobre las cajas envolventes: cada celda guarda los polígonos
+      que la tocan, así cada fix solo se prueba contra unos pocos candidatos.
+    - Prueba par-impar (ray casting) vectorizada con numpy sobre todas las aristas
+      del candidato; los huecos se resuelven solos por la regla par-impar.
+    - Si hay solapes gana el polígono de menor área (el más específico).
+    """
+
+    def __init__(self, poligonos, celda=None):
+        poligonos = sorted(poligonos, key=lambda p: _area(p[1][0]))
+        self.nombres = [n for n, _ in poligonos]
+        n = len(poligonos)
+        self.cajas = np.zeros((n, 4))  # min_lon, min_lat, max_lon, max_lat
+        aristas, limites = [], [0]
+        for i, (_, anillos) in enumerate(poligonos):
+            borde = anillos[0]
+            self.cajas[i] = (*borde.min(axis=0), *borde.max(axis=0))
+            for a in anillos:
+                aristas.append(np.hstack([a, np.roll(a, -1, axis=0)]))
+            limites.append(limites[-1] + sum(len(a) for a in anillos))
+        self._aristas = np.vstack(aristas) if aristas else np.zeros((0, 4))  # x1, y1, x2, y2
+        self._limites = np.asarray(limites)
+        self._construir_grilla(celda)
+
+    def __len__(self):
+        return len(self.nombres)
+
+    @classmethod
+    def desde_geojson(cls, ruta, celda=None):
+        return cls(cargar_geojson(ruta), celda)
+
+    def _construir_grilla(self, celda):
+        self._grilla = {}
+        if not len(self.nombres):
+            self.origen, self.celda, self.ny = (0.0, 0.0), 1.0, 1
+            return
+        tamanos = np.maximum(self.cajas[:, 2] - self.cajas[:, 0], self.cajas[:, 3] - self.cajas[:, 1])
+        self.celda = float(celda or max(np.median(tamanos), 1e-6))
+        self.origen = (self.cajas[:, 0].min(), self.cajas[:, 1].min())
+        self.ny = int((self.cajas[:, 3].max() - self.origen[1]) // self.celda) + 1
+        celdas = {}
+        for i, (x0, y0, x1, y1) in enumerate(self.cajas):
+            ix0, iy0 = self._celda_de(x0, y0)
+            ix1, iy1 = self._celda_de(x1, y1)
+            for ix in range(ix0, ix1 + 1):
+                for iy in range(iy0, iy1 + 1):
+                    celdas.setdefault(ix * self.ny + iy, []).append(i)
+        # índices ya ordenados por área → el primero que contiene al punto gana
+        self._grilla = {c: np.asarray(v) for c, v in celdas.items()}
+
+    def _celda_de(self, lon, lat):
+        return (int((lon - self.origen[0]) // self.celda), int((lat - self.origen[1]) // self.celda))
+
+    # ───────── consultas ─────────
+    def _dentro(self, i, lon, lat):
+        """Máscara de los puntos (lon, lat) dentro del polígono i (par-impar)."""
+        x1, y1, x2, y2 = self._aristas[self._limites[i]:self._limites[i + 1]].T
+        x, y = lon[:, None], lat[:, None]
+        cruza = (y1 > y) != (y2 > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_corte = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        return np.count_nonzero(cruza & (x < x_corte), axis=1) % 2 == 1
+
+    def consultar(self, lat, lon):
+        """Vectorizado: índice del polígono de cada punto (-1 si no cae en ninguno)."""
+        lat, lon = (a.copy() for a in np.broadcast_arrays(a_flotantes(lat), a_flotantes(lon)))
+        res = np.full(len(lat), -1, dtype=np.int64)
+        if not self._grilla:
+            return res
+        validos = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        if not validos.size:
+            return res
+        ix = np.floor((lon[validos] - self.origen[0]) / self.celda).astype(np.int64)
+        iy = np.floor((lat[validos] - self.origen[1]) / self.celda).astype(np.int64)
+        en_grilla = (ix >= 0) & (iy >= 0) & (iy < self.ny)
+        validos, celdas = validos[en_grilla], (ix * self.ny + iy)[en_grilla]
+        if not validos.size:
+            return res
+
+        # agrupa los puntos por celda: un paso por celda ocupada, no por fix
+        orden = np.argsort(celdas, kind="stable")
+        celdas, validos = celdas[orden], validos[orden]
+        cortes = np.flatnonzero(np.diff(celdas)) + 1
+        for grupo, celda in zip(np.split(validos, cortes), celdas[np.r_[0, cortes]]):
+            candidatos = self._grilla.get(int(celda))
+            if candidatos is None:
+                continue
+            pendientes = grupo
+            for i in candidatos:
+                x0, y0, x1, y1 = self.cajas[i]
+                la, lo = lat[pendientes], lon[pendientes]
+                en_caja = (lo >= x0) & (lo <= x1) & (la >= y0) & (la <= y1)
+                if not en_caja.any():
+                    continue
+                sub = pendientes[en_caja]
+                res[sub[self._dentro(i, lon[sub], lat[sub])]] = i
+                pendientes = pendientes[res[pendientes] < 0]
+                if not pendientes.size:
+                    break
+        return res
+
+    def potreros(self, lat, lon):
+        """Vectorizado: nombre del potrero de cada punto (None si está fuera de todos)."""
+        return [self.nombres[i] if i >= 0 else None for i in self.consultar(lat, lon).tolist()]
+
+    def potrero(self, lat, lon):
+        return self.potreros([lat], [lon])[0]
+
+
+def _area(anillo):
+    x, y = anillo[:, 0], anillo[:, 1]
+    return 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+def _mismo_potrero(a, b):
+    return str(a).strip().lower() == str(b).strip().lower()
+
+
+class Geocercas:
+    """
+    Potrero de cada fix + alertas de salida/entrada por animal.
+    - `asignado(norm)` devuelve el potrero asignado al animal (p. ej. el ajuste
+      `potrero` del registro de dispositivos) o None.
+    - fuera_de_cerca: fuera del potrero asignado o, sin asignación, fuera de todos.
+    - cerca_evento: 'salida' / 'entrada' cuando cambia fuera_de_cerca del animal.
+    """
+
+    def __init__(self, indice, asignado=None, max_animales=50000):
+        self.indice = indice
+        self.asignado = asignado
+        self.max_animales = int(max_animales)
+        self._fuera = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_geojson(cls, ruta, asignado=None):
+        indice = IndiceGeocercas.desde_geojson(ruta)
+        log.info("🗺️ Geocercas cargadas: %d polígonos", len(indice))
+        return cls(indice, asignado)
+
+    def evaluar(self, clave, norm, resultados_gps):
+        """
+        Devuelve {potrero, fuera_de_cerca, cerca_evento}. Si `resultados_gps` ya trae
+        `potrero` (calculado en lote) no se vuelve a consultar el índice.
+        """
+        lat, lon = resultados_gps.get("lat"), resultados_gps.get("lon")
+        if lat is None or lon is None:
+            return {"potrero": None, "fuera_de_cerca": None, "cerca_evento": None}
+        if "potrero" in resultados_gps:
+            potrero = resultados_gps["potrero"]
+        else:
+            potrero = self.indice.potrero(lat, lon)
+        asignado = self.asignado(norm) if self.asignado else None
+        if asignado:
+            fuera = potrero is None or not _mismo_potrero(potrero, asignado)
+        else:
+            fuera = potrero is None
+
+        with self._lock:
+            antes = self._fuera.pop(clave, False)
+            self._fuera[clave] = fuera
+            while len(self._fuera) > self.max_animales:
+                self._fuera.popitem(last=False)
+        evento = None
+        if fuera != antes:
+            evento = "salida" if fuera else "entrada"
+        return {"potrero": potrero, "fuera_de_cerca": fuera, "cerca_evento": evento}
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from utils.logs import obtener_logger
+
+log = obtener_logger("linea_base")
+
+_MEDIA, _VAR, _N = 0, 1, 2
+
+
+class LineaBaseAnimal:
+    """
+    Línea base de temperatura dorsal por animal y por hora del día (24 buckets).
+    - Por animal: array (3, 24) con media EWMA, varianza EWMA y nº de muestras → memoria O(1).
+    - z = (temp - media[h]) / desvío[h]; `estado_z` se calcula ANTES de actualizar,
+      y las lecturas anómalas (|z| sobre el umbral) no contaminan la base.
+    - Snapshot periódico a disco (.npz) para no arrancar en frío tras un reinicio.
+    """
+
+    def __init__(self, ruta=None, alpha=0.05, min_muestras=10, umbral_z=2.5,
+                 desvio_min=0.15, guardar_cada_s=300.0):
+        self.ruta = ruta
+        self.alpha = alpha
+        self.min_muestras = min_muestras
+        self.umbral_z = umbral_z
+        self.var_min = desvio_min ** 2
+        self.guardar_cada_s = guardar_cada_s
+        self._animales = {}
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._parar = threading.Event()
+        if ruta:
+            self.cargar()
+
+    def __len__(self):
+        return len(self._animales)
+
+    # ───────── evaluación + actualización ─────────
+    def evaluar(self, clave, temp, hora):
+        """
+        Devuelve {temp_base_animal, z_temp, estado_z} para la lectura y actualiza la base.
+        temp=None → 'sin_lectura' (no actualiza).
+        """
+        if temp is None or clave is None:
+            return {"temp_base_animal": None, "z_temp": None, "estado_z": "sin_lectura"}
+        h = int(hora) % 24
+        with self._lock:
+            datos = self._animales.get(clave)
+            if datos is None:
+                datos = self._animales[clave] = np.zeros((3, 24), dtype=float)
+            media, var, n = datos[_MEDIA, h], datos[_VAR, h], datos[_N, h]
+
+            if n >= self.min_muestras:
+                z = (temp - media) / np.sqrt(max(var, self.var_min))
+                if z >= self.umbral_z:
+                    estado = "posible_celo"
+                elif z <= -self.umbral_z:
+                    estado = "enfriamiento"
+                else:
+                    estado = "normal"
+            else:
+                z, estado = None, "aprendiendo"
+
+            if estado in ("normal", "aprendiendo"):
+                self._actualizar(datos, h, temp)
+
+        return {
+            "temp_base_animal": round(float(media), 2) if n > 0 else None,
+            "z_temp": round(float(z), 2) if z is not None else None,
+            "estado_z": estado,
+        }
+
+    def _actualizar(self, datos, h, x):
+        n = datos[_N, h]
+        if n == 0:
+            datos[_MEDIA, h], datos[_VAR, h], datos[_N, h] = x, 0.0, 1
+            return
+        # al principio promedio simple; luego EWMA con `alpha`
+        a = max(self.alpha, 1.0 / (n + 1))
+        diff = x - datos[_MEDIA, h]
+        inc = a * diff
+        datos[_MEDIA, h] += inc
+        datos[_VAR, h] = (1 - a) * (datos[_VAR, h] + diff * inc)
+        datos[_N, h] = n + 1
+
+    # ───────── persistencia ─────────
+    def cargar(self):
+        if not self.ruta or not os.path.exists(self.ruta):
+            return
+        try:
+            with np.load(self.ruta, allow_pickle=False) as npz:
+                claves, datos = npz["claves"].tolist(), npz["datos"]
+            with self._lock:
+                self._animales = {c: datos[i].copy() for i, c in enumerate(claves)}
+            log.info("📈 Línea base cargada: %d animales", len(claves))
+        except Exception as e:
+            log.error("❌ No se pudo cargar la línea base %s: %s", self.ruta, e)
+
+    def guardar(self):
+        """Escribe el snapshot de forma atómica (archivo temporal + os.replace)."""
+        if not self.ruta:
+            return
+        with self._lock:
+            claves = list(self._animales)
+            datos = np.stack([self._animales[c] for c in claves]) if claves else np.zeros((0, 3, 24))
+        tmp = f"{self.ruta}.tmp.npz"
+        np.savez(tmp, claves=np.array(claves, dtype=str), datos=datos)
+        os.replace(tmp, self.ruta)
+
+    def iniciar(self):
+        """Hilo que guarda el snapshot cada `guardar_cada_s` segundos."""
+        if not self.ruta or self._hilo is not None:
+            return
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._guardar_periodico, name="linea-base", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join(5)
+            self._hilo = None
+        try:
+            self.guardar()
+        except Exception as e:
+            log.error("❌ No se pudo guardar la línea base: %s", e)
+
+    def _guardar_periodico(self):
+        while not self._parar.wait(self.guardar_cada_s):
+            t0 = time.perf_counter()
+            try:
+                self.guardar()
+                log.debug("💾 Línea base guardada (%d animales, %.1f ms)",
+                          len(self._animales), (time.perf_counter() - t0) * 1000)
+            except Exception as e:
+                log.error("❌ No se pudo guardar la línea base: %s", e)
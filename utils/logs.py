@@ -0,0 +1,151 @@
+import atexit
+import itertools
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+from collections import defaultdict
+
+RAIZ = "iot_ganaderia"
+
+# /api/v1/<token>/telemetry → /api/v1/***/telemetry
+_RE_URL_TOKEN = re.compile(r"(/api/v1/)[^/\s'\"]+")
+
+
+class _QueueHandlerDiferido(logging.handlers.QueueHandler):
+    """
+    QueueHandler que NO formatea en el hilo que registra: solo encola el record.
+    El formateo (y la redacción) ocurre en el hilo del QueueListener.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class FiltroMuestreo(logging.Filter):
+    """
+    Deja pasar solo 1 de cada N records marcados con extra={"muestreo": True}
+    (volcados de payload), contando por separado cada mensaje. Los demás pasan siempre.
+    """
+
+    def __init__(self, fraccion):
+        super().__init__()
+        self.cada = max(1, round(1 / fraccion)) if fraccion > 0 else 0
+        self._contadores = defaultdict(itertools.count)
+
+    def filter(self, record):
+        if not getattr(record, "muestreo", False):
+            return True
+        if self.cada == 0:
+            return False
+        return next(self._contadores[(record.name, record.msg)]) % self.cada == 0
+
+
+class FormatoRedactado(logging.Formatter):
+    """Formatter que oculta tokens de ThingsBoard (en URLs y los registrados explícitamente)."""
+
+    def __init__(self, fmt=None, datefmt=None):
+        super().__init__(fmt, datefmt)
+        self._secretos = None
+
+    def registrar_secretos(self, secretos):
+        secretos = sorted({s for s in secretos if s}, key=len, reverse=True)
+        self._secretos = re.compile("|".join(map(re.escape, secretos))) if secretos else None
+
+    def format(self, record):
+        texto = super().format(record)
+        texto = _RE_URL_TOKEN.sub(r"\1***", texto)
+        if self._secretos is not None:
+            texto = self._secretos.sub("***", texto)
+        return texto
+
+
+_lock = threading.Lock()
+_estado = {"listener": None, "formato": None, "pid": None, "provisional": False}
+_FORMATO = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def _formato():
+    if _estado["formato"] is None:
+        _estado["formato"] = FormatoRedactado(_FORMATO)
+    return _estado["formato"]
+
+
+def _provisional():
+    """
+    Antes de `configurar` (import del app, master de gunicorn, CLIs): handler síncrono,
+    con el mismo formato, redacción y muestreo, sin arrancar ningún hilo.
+    """
+    with _lock:
+        if _estado["pid"] == os.getpid() or _estado["provisional"]:
+            return
+        destino = logging.StreamHandler(sys.stdout)
+        destino.setFormatter(_formato())
+        destino.addFilter(FiltroMuestreo(float(os.getenv("LOG_MUESTREO", 0.01))))
+        raiz = logging.getLogger(RAIZ)
+        for h in list(raiz.handlers):
+            raiz.removeHandler(h)
+        raiz.addHandler(destino)
+        raiz.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        raiz.propagate = False
+        _estado["provisional"] = True
+
+
+def configurar(nivel=None, muestreo=None, stream=None):
+    """
+    Configura (una vez por proceso) el logger raíz del servicio:
+    - nivel desde LOG_LEVEL (INFO por defecto)
+    - muestreo de volcados de payload desde LOG_MUESTREO (fracción 0..1, 0.01 por defecto)
+    - QueueHandler en el camino caliente y un hilo de fondo que formatea y escribe.
+    """
+    with _lock:
+        if _estado["pid"] == os.getpid():
+            return
+        nivel = nivel or os.getenv("LOG_LEVEL", "INFO")
+        muestreo = float(os.getenv("LOG_MUESTREO", 0.01) if muestreo is None else muestreo)
+
+        formato = _formato()
+        destino = logging.StreamHandler(stream or sys.stdout)
+        destino.setFormatter(formato)
+
+        cola = queue.SimpleQueue()
+        handler = _QueueHandlerDiferido(cola)
+        handler.addFilter(FiltroMuestreo(muestreo))
+
+        raiz = logging.getLogger(RAIZ)
+        for h in list(raiz.handlers):
+            raiz.removeHandler(h)
+        raiz.addHandler(handler)
+        raiz.setLevel(nivel.upper() if isinstance(nivel, str) else nivel)
+        raiz.propagate = False
+
+        listener = logging.handlers.QueueListener(cola, destino, respect_handler_level=False)
+        listener.start()
+        _estado.update(listener=listener, formato=formato, pid=os.getpid())
+        atexit.register(detener)
+
+
+def detener():
+    """Vacía la cola de logs y detiene el hilo escritor (idempotente)."""
+    with _lock:
+        listener = _estado["listener"]
+        if listener is not None and _estado["pid"] == os.getpid():
+            listener.stop()
+        _estado.update(listener=None, pid=None, provisional=False)
+    _provisional()  # lo que se registre después (atexit de otros módulos) sigue saliendo
+
+
+def registrar_secretos(secretos):
+    """Tokens a ocultar en cualquier mensaje (p. ej. los de DEVICE_TOKENS)."""
+    _provisional()
+    _formato().registrar_secretos(secretos)
+
+
+def obtener_logger(nombre):
+    # Solo el handler síncrono: el hilo escritor lo arranca `configurar`
+    # (iniciar_servicios, en cada worker después del fork)
+    _provisional()
+    return logging.getLogger(f"{RAIZ}.{nombre}")
@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Buckets (segundos) pensados para etapas de µs a varios segundos
+BUCKETS_LATENCIA = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _fmt_etiquetas(nombres, valores, extra=None):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _escapar(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_num(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Contador:
+    """Contador monotónico con etiquetas opcionales (formato Prometheus)."""
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *valores, n=1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + n
+
+    def valor(self, *valores):
+        return self._valores.get(valores, 0)
+
+    def exponer(self):
+        with self._lock:
+            items = list(self._valores.items())
+        return [f"{self.nombre}{_fmt_etiquetas(self.etiquetas, k)} {_fmt_num(v)}" for k, v in items]
+
+
+class Medidor:
+    """Gauge cuyo valor se lee al exponer mediante una función (p. ej. tamaño de cola)."""
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, funcion, etiquetas=()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self.funcion = funcion
+
+    def exponer(self):
+        try:
+            valor = self.funcion()
+        except Exception:
+            return []
+        if isinstance(valor, dict):
+            return [f"{self.nombre}{_fmt_etiquetas(self.etiquetas, (k,))} {_fmt_num(v)}"
+                    for k, v in valor.items() if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        return [f"{self.nombre} {_fmt_num(valor)}"]
+
+
+class Histograma:
+    """Histograma de buckets fijos; observe() es una búsqueda binaria y tres sumas."""
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, valor, *valores):
+        i = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    @contextmanager
+    def medir(self, *valores):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *valores)
+
+    def exponer(self):
+        with self._lock:
+            series = [(k, list(c), s, n) for k, (c, s, n) in self._series.items()]
+        lineas = []
+        for k, conteos, suma, n in series:
+            acumulado = 0
+            for limite, c in zip(self.buckets + (float("inf"),), conteos):
+                acumulado += c
+                le = f'le="{_fmt_num(limite)}"'
+                lineas.append(f"{self.nombre}_bucket{_fmt_etiquetas(self.etiquetas, k, le)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_fmt_etiquetas(self.etiquetas, k)} {_fmt_num(suma)}")
+            lineas.append(f"{self.nombre}_count{_fmt_etiquetas(self.etiquetas, k)} {n}")
+        return lineas
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        with self._lock:
+            self._metricas[metrica.nombre] = metrica
+        return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def medidor(self, nombre, ayuda, funcion, etiquetas=()):
+        return self._registrar(Medidor(nombre, ayuda, funcion, etiquetas))
+
+    def exponer(self):
+        """Texto en formato de exposición de Prometheus (text/plain; version=0.0.4)."""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        lineas = []
+        for m in metricas:
+            lineas.append(f"# HELP {m.nombre} {m.ayuda}")
+            lineas.append(f"# TYPE {m.nombre} {m.tipo}")
+            lineas.extend(m.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+def rss_bytes():
+    """Memoria residente actual del proceso (Linux: /proc; otros: pico vía resource, o 0)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+# ───────────────────────────────────────────────────────────────
+# Métricas del servicio
+# ───────────────────────────────────────────────────────────────
+REGISTRO = Registro()
+
+ETAPAS = REGISTRO.histograma(
+    "uplink_etapa_segundos", "Latencia por etapa del pipeline de uplink", ("etapa",))
+UPLINKS = REGISTRO.contador(
+    "uplinks_total", "Uplinks recibidos por resultado", ("resultado",))
+ESTADOS = REGISTRO.contador(
+    "uplink_estado_total", "Lecturas procesadas por estado_general", ("estado_general",))
+TB_PETICIONES = REGISTRO.contador(
+    "thingsboard_peticiones_total", "Peticiones a ThingsBoard por resultado", ("resultado",))
+TB_LATENCIA = REGISTRO.histograma(
+    "thingsboard_post_segundos", "Latencia de cada POST de telemetría a ThingsBoard")
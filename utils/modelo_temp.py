@@ -0,0 +1,157 @@
+import os
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.logs import obtener_logger
+
+log = obtener_logger("modelo_temp")
+
+# Orden de variables con el que se entrenó modelo_temp.pkl
+FEATURES = ("t_amb", "humedad", "hora")
+
+RUTA_POR_DEFECTO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modelo_temp.pkl")
+
+# Paso de cuantización de la llave de caché (t_amb °C, humedad %, hora h)
+PASO_T_AMB = 0.1
+PASO_HUM = 1.0
+
+
+def _cuantizar(t_amb, hum, hora):
+    return (round(t_amb / PASO_T_AMB) * PASO_T_AMB,
+            round(hum / PASO_HUM) * PASO_HUM,
+            int(hora) % 24)
+
+
+def _cuantizar_lote(t_amb, hum, hora):
+    # np.rint redondea a par igual que round(), así las llaves coinciden con _cuantizar
+    return np.column_stack([
+        np.rint(t_amb / PASO_T_AMB) * PASO_T_AMB,
+        np.rint(hum / PASO_HUM) * PASO_HUM,
+        np.asarray(hora, dtype=np.int64) % 24,
+    ]).astype(float)
+
+
+class GestorModelo:
+    """
+    Carga perezosa (una sola vez) de modelo_temp.pkl y predicción con caché LRU.
+    - La ruta se toma de MODELO_TEMP_PATH o del pkl en la raíz del repo.
+    - Valida que el modelo espere (t_amb, humedad, hora) en ese orden.
+    - Si el modelo no carga, `predecir` devuelve None y el llamador usa su fallback.
+    """
+
+    def __init__(self, ruta=None, cache_max=4096):
+        self.ruta = ruta or os.getenv("MODELO_TEMP_PATH", RUTA_POR_DEFECTO)
+        self.cache_max = cache_max
+        self._modelo = None
+        self._cargado = False
+        self._error = None
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+
+    # ───────── carga ─────────
+    def cargar(self):
+        """Carga el modelo si aún no se intentó. Devuelve True si quedó disponible."""
+        if self._cargado:
+            return self._modelo is not None
+        with self._lock:
+            if self._cargado:
+                return self._modelo is not None
+            try:
+                import joblib
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    modelo = joblib.load(self.ruta)
+                self._validar(modelo)
+                self._modelo = modelo
+            except Exception as e:
+                self._error = str(e)
+                log.warning("⚠️ Modelo de temperatura no disponible (%s): %s", self.ruta, e)
+            self._cargado = True
+        return self._modelo is not None
+
+    @staticmethod
+    def _validar(modelo):
+        if not hasattr(modelo, "predict"):
+            raise TypeError("el objeto cargado no tiene predict()")
+        n = getattr(modelo, "n_features_in_", len(FEATURES))
+        if n != len(FEATURES):
+            raise ValueError(f"el modelo espera {n} variables, se esperaban {len(FEATURES)}")
+        nombres = getattr(modelo, "feature_names_in_", None)
+        if nombres is not None and tuple(nombres) != FEATURES:
+            raise ValueError(f"orden de variables {tuple(nombres)} != {FEATURES}")
+
+    @property
+    def disponible(self):
+        return self.cargar()
+
+    def estado(self):
+        return {
+            "ruta": self.ruta,
+            "disponible": self._modelo is not None,
+            "error": self._error,
+            "cache": len(self._cache),
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+        }
+
+    # ───────── predicción ─────────
+    def predecir(self, t_amb, hum, hora):
+        """temp_base del modelo para (t_amb, hum, hora) cuantizados, o None si no hay modelo."""
+        if not self.cargar():
+            return None
+        llave = _cuantizar(t_amb, hum, hora)
+        with self._lock:
+            valor = self._cache.get(llave)
+            if valor is not None:
+                self._cache.move_to_end(llave)
+                self.aciertos += 1
+                return valor
+        valor = float(self._modelo.predict(np.array([llave], dtype=float))[0])
+        with self._lock:
+            self.fallos += 1
+            self._cache[llave] = valor
+            if len(self._cache) > self.cache_max:
+                self._cache.popitem(last=False)
+        return valor
+
+    def predecir_lote(self, t_amb, hum, hora):
+        """
+        Versión vectorizada de `predecir`: arrays → array de temp_base (o None sin modelo).
+        Solo las llaves distintas que no están en caché pasan por un único model.predict.
+        """
+        if not self.cargar():
+            return None
+        X = _cuantizar_lote(np.asarray(t_amb, dtype=float), np.asarray(hum, dtype=float), hora)
+        if len(X) == 0:
+            return np.empty(0, dtype=float)
+        unicos, inversa = np.unique(X, axis=0, return_inverse=True)
+        llaves = [(t, h, int(hr)) for t, h, hr in unicos.tolist()]
+        valores = np.empty(len(llaves), dtype=float)
+        faltantes = []
+        with self._lock:
+            for i, llave in enumerate(llaves):
+                v = self._cache.get(llave)
+                if v is None:
+                    faltantes.append(i)
+                else:
+                    valores[i] = v
+            self.aciertos += len(llaves) - len(faltantes)
+        if faltantes:
+            pred = self._modelo.predict(unicos[faltantes])
+            valores[faltantes] = pred
+            with self._lock:
+                self.fallos += len(faltantes)
+                for i in faltantes:
+                    self._cache[llaves[i]] = float(valores[i])
+                while len(self._cache) > self.cache_max:
+                    self._cache.popitem(last=False)
+        return valores[np.ravel(inversa)]
+
+
+# Instancia compartida por todo el proceso
+gestor_modelo = GestorModelo()
@@ -0,0 +1,273 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso (servidor de desarrollo)
+    fcntl = None
+
+from utils.logs import obtener_logger
+
+log = obtener_logger("outbox")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    token   TEXT    NOT NULL,
+    ts      INTEGER NOT NULL,
+    valores TEXT    NOT NULL
+)
+"""
+
+
+class Outbox:
+    """
+    Buzón local persistente (SQLite en modo WAL) para telemetría que no llegó a ThingsBoard.
+    - `guardar` solo agrega a una lista en memoria; un hilo escritor hace group-commit
+      (una transacción con fsync cada `commit_cada_s`).
+    - Un hilo drenador reenvía en lotes agrupados por token con backoff exponencial:
+      lee `lote_drenado` filas y las envía en POST de como mucho `lote_max` puntos
+      (el mismo TB_LOTE_MAX que la cola en vivo).
+    - Tamaño máximo `max_filas` para el archivo (contando lo de todos los procesos):
+      si se supera se descartan las filas más viejas.
+    - Compactación: checkpoint del WAL + incremental_vacuum cuando el buzón se vacía.
+    - Con varios procesos (workers de gunicorn) sobre el mismo archivo todos escriben,
+      pero solo drena el que tiene el candado `<ruta>.drenado.lock`.
+    """
+
+    def __init__(self, ruta, enviar=None, max_filas=1_000_000, commit_cada_s=0.05,
+                 lote_drenado=500, lote_max=100, backoff_min_s=1.0, backoff_max_s=300.0):
+        self.ruta = ruta
+        self.enviar = enviar  # enviar(token, puntos) -> bool
+        self.max_filas = int(max_filas)
+        self.commit_cada_s = commit_cada_s
+        self.lote_drenado = int(lote_drenado)
+        self.lote_max = max(1, int(lote_max))
+        self.backoff_min_s = backoff_min_s
+        self.backoff_max_s = backoff_max_s
+
+        self._pendientes = []
+        self._lock = threading.Lock()
+        self._hay_pendientes = threading.Event()
+        self._parar = threading.Event()
+        self._hilos = []
+
+        self._backoff_s = 0.0
+        self._reintentar_en = 0.0
+        self._filas = 0
+        self._candado = None
+        self._contadores = {"guardados": 0, "reenviados": 0, "descartados": 0, "fallos_envio": 0}
+
+    # ───────── conexión ─────────
+    def _conectar(self):
+        con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None, check_same_thread=False)
+        con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=FULL")
+        con.execute(_ESQUEMA)
+        return con
+
+    # ───────── ciclo de vida ─────────
+    def iniciar(self):
+        with self._lock:
+            if self._hilos:
+                return
+            con = self._conectar()
+            self._filas = con.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+            con.close()
+            if self._filas:
+                log.info("📮 Outbox con %d puntos pendientes de reenvío", self._filas)
+            self._parar.clear()
+            for nombre, fn in (("outbox-escritor", self._escribir), ("outbox-drenador", self._drenar)):
+                h = threading.Thread(target=fn, name=nombre, daemon=True)
+                h.start()
+                self._hilos.append(h)
+
+    def detener(self, timeout=5.0):
+        """Persiste lo pendiente en memoria y detiene los hilos (lo no reenviado queda en disco)."""
+        self._parar.set()
+        self._hay_pendientes.set()
+        for h in self._hilos:
+            h.join(timeout)
+        self._hilos = []
+        # lo guardado después de la última pasada del escritor (p. ej. el volcado de la cola TB)
+        with self._lock:
+            lote, self._pendientes = self._pendientes, []
+        if lote:
+            con = self._conectar()
+            try:
+                self._persistir(con, lote)
+            finally:
+                con.close()
+
+    # ───────── API ─────────
+    def guardar(self, token, puntos):
+        """Agrega puntos [{ts, values}] al buzón. Barato: el disco lo toca el hilo escritor."""
+        if not self._hilos:
+            self.iniciar()
+        with self._lock:
+            self._pendientes.extend((token, p["ts"], p["values"]) for p in puntos)
+        self._hay_pendientes.set()
+
+    @property
+    def en_falla(self):
+        """True mientras ThingsBoard está en backoff: conviene escribir directo al buzón."""
+        return time.monotonic() < self._reintentar_en
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._contadores)
+            stats["en_memoria"] = len(self._pendientes)
+        stats["filas"] = self._filas
+        stats["backoff_s"] = round(self._backoff_s, 1)
+        return stats
+
+    def _sumar(self, clave, n=1):
+        with self._lock:
+            self._contadores[clave] += n
+
+    # ───────── escritor (group commit) ─────────
+    def _escribir(self):
+        con = self._conectar()
+        try:
+            while True:
+                self._hay_pendientes.wait(1.0)
+                parar = self._parar.is_set()
+                if not parar:
+                    # ventana de group-commit: lo que llegue mientras tanto va en la misma transacción
+                    time.sleep(self.commit_cada_s)
+                self._hay_pendientes.clear()
+                with self._lock:
+                    lote, self._pendientes = self._pendientes, []
+                if lote:
+                    self._persistir(con, lote)
+                if parar:
+                    return
+        finally:
+            con.close()
+
+    def _persistir(self, con, lote):
+        filas = [(token, int(ts), json.dumps(valores, ensure_ascii=False, separators=(",", ":")))
+                 for token, ts, valores in lote]
+        con.execute("BEGIN IMMEDIATE")
+        con.executemany("INSERT INTO outbox (token, ts, valores) VALUES (?, ?, ?)", filas)
+        # conteo real dentro de la transacción: otros procesos escriben en el mismo archivo
+        total = con.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        exceso = total - self.max_filas
+        if exceso > 0:
+            con.execute("DELETE FROM outbox WHERE id IN (SELECT id FROM outbox ORDER BY id LIMIT ?)", (exceso,))
+        con.execute("COMMIT")
+        with self._lock:
+            self._filas = total - max(0, exceso)
+            self._contadores["guardados"] += len(filas)
+            if exceso > 0:
+                self._contadores["descartados"] += exceso
+        if exceso > 0:
+            log.warning("⚠️ Outbox lleno: %d puntos más viejos descartados", exceso)
+
+    # ───────── drenador ─────────
+    def _tomar_turno(self):
+        """True si este proceso es el drenador (candado de archivo no bloqueante)."""
+        if fcntl is None or self._candado is not None:
+            return True
+        f = open(f"{self.ruta}.drenado.lock", "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._candado = f  # se libera al cerrar el archivo (o al morir el proceso)
+        return True
+
+    def _drenar(self):
+        con = self._conectar()
+        proximo_conteo = 0.0
+        try:
+            while not self._parar.is_set():
+                if not self._tomar_turno():
+                    self._parar.wait(5.0)
+                    continue
+                if self._filas <= 0 and time.monotonic() >= proximo_conteo:
+                    # otros procesos pueden haber escrito en el mismo archivo
+                    proximo_conteo = time.monotonic() + 5.0
+                    with self._lock:
+                        self._filas = con.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+                espera = self._reintentar_en - time.monotonic()
+                if espera > 0 or self._filas <= 0 or self.enviar is None:
+                    self._parar.wait(min(max(espera, 0.2), 1.0))
+                    continue
+                if not self._drenar_lote(con):
+                    self._programar_backoff()
+        finally:
+            con.close()
+            if self._candado is not None:
+                self._candado.close()
+                self._candado = None
+
+    def _drenar_lote(self, con):
+        filas = con.execute(
+            "SELECT id, token, ts, valores FROM outbox ORDER BY id LIMIT ?", (self.lote_drenado,)
+        ).fetchall()
+        if not filas:
+            with self._lock:
+                self._filas = 0
+            self._compactar(con)
+            return True
+        grupos = {}
+        for id_, token, ts, valores in filas:
+            ids, puntos = grupos.setdefault(token, ([], []))
+            ids.append(id_)
+            puntos.append({"ts": ts, "values": json.loads(valores)})
+        for token, (ids, puntos) in grupos.items():
+            for i in range(0, len(puntos), self.lote_max):
+                parte_ids = ids[i:i + self.lote_max]
+                try:
+                    ok = self.enviar(token, puntos[i:i + self.lote_max])
+                except Exception as e:
+                    log.error("❌ Error reenviando desde outbox: %s", e)
+                    ok = False
+                if not ok:
+                    self._sumar("fallos_envio")
+                    return False
+                con.execute("BEGIN IMMEDIATE")
+                con.executemany("DELETE FROM outbox WHERE id = ?", ((j,) for j in parte_ids))
+                con.execute("COMMIT")
+                with self._lock:
+                    self._filas -= len(parte_ids)
+                    self._contadores["reenviados"] += len(parte_ids)
+        self._backoff_s = 0.0
+        self._reintentar_en = 0.0
+        if self._filas <= 0:
+            self._compactar(con)
+        return True
+
+    def _programar_backoff(self):
+        self._backoff_s = min(self.backoff_max_s, max(self.backoff_min_s, self._backoff_s * 2))
+        self._reintentar_en = time.monotonic() + self._backoff_s * random.uniform(0.8, 1.2)
+        log.warning("⏳ ThingsBoard no disponible; reintento del outbox en %.1f s", self._backoff_s)
+
+    def _compactar(self, con):
+        try:
+            con.execute("PRAGMA incremental_vacuum")
+            con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error as e:
+            log.warning("⚠️ No se pudo compactar el outbox: %s", e)
+
+
+def crear_desde_entorno(enviar, lote_max=None):
+    """Outbox según OUTBOX_PATH (vacío = deshabilitado); `lote_max` por defecto TB_LOTE_MAX."""
+    ruta = os.getenv("OUTBOX_PATH", "outbox_tb.sqlite3")
+    if not ruta:
+        return None
+    return Outbox(
+        ruta,
+        enviar=enviar,
+        max_filas=int(os.getenv("OUTBOX_MAX_FILAS", 1_000_000)),
+        lote_drenado=int(os.getenv("OUTBOX_LOTE", 500)),
+        lote_max=int(os.getenv("TB_LOTE_MAX", 100) if lote_max is None else lote_max),
+        backoff_max_s=float(os.getenv("OUTBOX_BACKOFF_MAX_S", 300)),
+    )
@@ -0,0 +1,163 @@
+# parseo.py — decodificación y normalización rápida de uplinks (TTN v3 o plano)
+
+import json
+import time
+from typing import NamedTuple
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa json de la librería estándar
+    orjson = None
+
+from utils.tiempo import TZ, epoch_a_local_iso, iso_a_local, ts_canonico  # noqa: F401 (TZ se re-exporta)
+
+
+def cargar_json(datos):
+    """bytes/str → objeto Python (orjson si está instalado). Lanza ValueError si no es JSON."""
+    if orjson is not None:
+        return orjson.loads(datos)
+    return json.loads(datos)
+
+
+def leer_json(datos):
+    """Como `cargar_json` pero devuelve None si el cuerpo no es JSON válido."""
+    try:
+        return cargar_json(datos)
+    except (ValueError, TypeError):
+        return None
+
+
+# ===================================================================
+# REGISTRO NORMALIZADO
+# ===================================================================
+class Uplink(NamedTuple):
+    """Uplink normalizado. `get` permite usarlo donde antes había un dict."""
+    dev_id: object = None
+    dev_eui: object = None
+    cow_id: object = None
+    temp_body_c: object = None
+    temp_amb_c: object = None
+    humedad: object = None
+    v_max_ms: object = None
+    v_mean_ms: object = None
+    ODBA_g: object = None
+    VeDBA_g: object = None
+    lat: object = None
+    lon: object = None
+    ts_epoch: object = None
+    f_cnt: object = None
+    received_local_iso: object = None
+    ts: object = None  # timestamp canónico (epoch s): epoch_s, received_at o llegada
+    ts_llegada: bool = False  # True si `ts` es la hora de llegada (el uplink no traía tiempo)
+
+    def get(self, campo, defecto=None):
+        return getattr(self, campo, defecto)
+
+
+# ===================================================================
+# TABLAS DE ALIAS  (campo → fuente, claves alternativas, valor por defecto)
+# ===================================================================
+# Fuentes TTN v3: cuerpo, ids (end_device_ids), uplink (uplink_message),
+# dec (decoded_payload). Con varias claves se toma la primera con valor
+# (mismo criterio que `a or b`). Campos ausentes de la tabla llegan como
+# argumento del extractor (p. ej. received_local_iso, ts).
+ALIAS_TTN = {
+    "dev_id":      ("ids", ("device_id",)),
+    "dev_eui":     ("ids", ("dev_eui",)),
+    "cow_id":      ("dec", ("cow_id",)),
+    "temp_body_c": ("dec", ("To_c", "temp_body_c")),
+    "temp_amb_c":  ("dec", ("Ta_c", "temp_amb_c")),
+    "humedad":     ("dec", ("humedad",), 65),
+    "v_max_ms":    ("dec", ("v_max_ms",)),
+    "v_mean_ms":   ("dec", ("v_mean_ms",)),
+    "ODBA_g":      ("dec", ("ODBA_g",)),
+    "VeDBA_g":     ("dec", ("VeDBA_g",)),
+    "lat":         ("dec", ("latitude", "lat")),
+    "lon":         ("dec", ("longitude", "lon")),
+    "ts_epoch":    ("dec", ("epoch_s",)),
+    "f_cnt":       ("uplink", ("f_cnt",)),
+}
+
+ALIAS_PLANO = {campo: ("cuerpo", (campo,)) for campo in Uplink._fields if campo not in ("received_local_iso", "ts", "ts_llegada")}
+ALIAS_PLANO["humedad"] = ("cuerpo", ("humedad",), 65)
+
+
+def compilar_extractor(alias, fuentes=("cuerpo", "ids", "uplink", "dec")):
+    """
+    Compila la tabla de alias una sola vez en una función plana
+    `extraer(cuerpo, ids, uplink, dec, **resto) -> Uplink` sin bucles ni búsquedas en la tabla.
+    """
+    args = [c for c in Uplink._fields if c not in alias]
+    exprs = []
+    for campo in Uplink._fields:
+        if campo not in alias:
+            exprs.append(f"{campo}={campo}")
+            continue
+        fuente, claves, *defecto = alias[campo]
+        if fuente not in fuentes:
+            raise ValueError(f"fuente desconocida para {campo}: {fuente}")
+        if defecto:
+            get = [f"{fuente}.get({c!r}, {defecto[0]!r})" for c in claves]
+        else:
+            get = [f"{fuente}.get({c!r})" for c in claves]
+        exprs.append(f"{campo}={' or '.join(get)}")
+    firma = ", ".join(list(fuentes) + [f"{a}={Uplink._field_defaults.get(a)!r}" for a in args])
+    codigo = f"def extraer({firma}):\n    return Uplink({', '.join(exprs)})\n"
+    espacio = {"Uplink": Uplink}
+    exec(compile(codigo, f"<extractor {sorted(alias)[0]}…>", "exec"), espacio)
+    return espacio["extraer"]
+
+
+_extraer_ttn = compilar_extractor(ALIAS_TTN)
+_extraer_plano = compilar_extractor(ALIAS_PLANO)
+_VACIO = {}
+
+
+# ===================================================================
+# PARSEO TTN V3 / PLANO
+# ===================================================================
+def parse_ttn_v3(body: dict):
+    ids = body.get("end_device_ids") or _VACIO
+    uplink = body.get("uplink_message") or _VACIO
+    dec = uplink.get("decoded_payload") or _VACIO
+
+    received_at = body.get("received_at") or uplink.get("received_at")
+    norm = _extraer_ttn(body, ids, uplink, dec,
+                        received_local_iso=iso_a_local(received_at) if received_at else None)
+    ts = ts_canonico(norm.ts_epoch, received_at)
+
+    # fallback usando gateway metadata
+    if norm.lat is None or norm.lon is None:
+        rxm = uplink.get("rx_metadata") or []
+        if isinstance(rxm, list) and rxm:
+            loc = rxm[0].get("location") or _VACIO
+            return norm._replace(lat=loc.get("latitude", norm.lat), lon=loc.get("longitude", norm.lon), ts=ts)
+    return norm._replace(ts=ts)
+
+
+def parse_flat(body: dict):
+    return _extraer_plano(body, _VACIO, _VACIO, _VACIO)
+
+
+def es_ttn_v3(body: dict):
+    return "uplink_message" in body or "end_device_ids" in body
+
+
+def normalizar(body: dict):
+    """
+    TTN v3 o plano → Uplink con su timestamp canónico `ts`. received_local_iso, si
+    falta, sale de ese `ts` (un reenvío atrasado conserva su hora); sin epoch_s ni
+    received_at, ambos toman la hora de llegada.
+    """
+    norm = parse_ttn_v3(body) if es_ttn_v3(body) else parse_flat(body)
+    if norm.ts is not None and norm.received_local_iso:
+        return norm
+    ts = norm.ts if norm.ts is not None else ts_canonico(norm.ts_epoch)
+    llegada = ts is None
+    if llegada:
+        ts = time.time()
+    return norm._replace(
+        ts=ts,
+        ts_llegada=llegada,
+        received_local_iso=norm.received_local_iso or epoch_a_local_iso(ts),
+    )
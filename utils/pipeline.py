@@ -0,0 +1,182 @@
+# pipeline.py — normalización y procesamiento de uplinks (compartido por app.py y el modo lote)
+
+from math import isfinite
+
+from utils.procesamiento_temp import procesar_temperatura, procesar_temperatura_lote
+from utils.procesamiento_accel import procesar_acelerometro, procesar_acelerometro_lote
+from utils.procesamiento_gps import procesar_gps, procesar_gps_lote
+from utils.metricas import ETAPAS
+from utils.tiempo import hora_local, horas_locales, ts_lectura  # noqa: F401
+from utils.vectorizado import a_flotantes, a_registros
+
+
+# ===================================================================
+# IDENTIFICACIÓN  (el parseo vive en utils/parseo.py)
+# ===================================================================
+def clave_dispositivo(norm):
+    # Preferimos DevEUI (más estable)
+    return norm.get("dev_eui") or norm.get("dev_id")
+
+
+# ===================================================================
+# ESTADO POR ANIMAL (componentes con memoria entre uplinks)
+# ===================================================================
+class EstadoHato:
+    """Agrupa los componentes con memoria por animal que usa el pipeline (todos opcionales)."""
+
+    def __init__(self, trayectorias=None, linea_base=None, celo=None, geocercas=None):
+        self.trayectorias = trayectorias
+        self.linea_base = linea_base
+        self.celo = celo
+        self.geocercas = geocercas
+
+
+def clave_animal(norm):
+    clave = norm.get("cow_id") or clave_dispositivo(norm)
+    return str(clave) if clave is not None else None
+
+
+# ===================================================================
+# PROCESAMIENTO DE UNA LECTURA
+# ===================================================================
+def procesar(norm, estado=None):
+    """Ejecuta procesar_* sobre una lectura normalizada y arma la telemetría final."""
+    # Un instante y una hora local por uplink para todas las etapas
+    ts = ts_lectura(norm)
+    hora = hora_local(ts)
+
+    with ETAPAS.medir("temperatura"):
+        resultados_temp = procesar_temperatura(
+            norm.get("temp_body_c"),
+            norm.get("temp_amb_c"),
+            norm.get("humedad"),
+            hora,
+        )
+
+    with ETAPAS.medir("acelerometro"):
+        resultados_accel = procesar_acelerometro({
+            "v_max_ms":  norm.get("v_max_ms"),
+            "v_mean_ms": norm.get("v_mean_ms"),
+            "ODBA_g":    norm.get("ODBA_g"),
+            "VeDBA_g":   norm.get("VeDBA_g"),
+        })
+
+    with ETAPAS.medir("gps"):
+        resultados_gps = procesar_gps({
+            "lat": norm.get("lat"),
+            "lon": norm.get("lon")
+        })
+
+    resultados_estado = _aplicar_estado(norm, resultados_temp, resultados_accel, resultados_gps, estado, ts, hora)
+    return _armar_salida(norm, resultados_temp, resultados_accel, resultados_gps, resultados_estado)
+
+
+def _aplicar_estado(norm, resultados_temp, resultados_accel, resultados_gps, estado, ts, hora):
+    """
+    Etapas con memoria por animal; se llaman en orden temporal (`ts` canónico, `hora` local).
+    Completa los resultados recibidos y devuelve los campos propios del estado (celo).
+    """
+    if estado is None:
+        return {}
+    clave = clave_animal(norm)
+
+    # Trayectoria acumulada del animal (un punto por uplink)
+    if estado.trayectorias is not None and resultados_gps.get("lat") is not None:
+        with ETAPAS.medir("trayectoria"):
+            resultados_gps.update(estado.trayectorias.agregar(
+                clave, resultados_gps["lat"], resultados_gps["lon"], ts
+            ))
+
+    # Potrero del fix y alertas de salida/entrada de la cerca asignada
+    if estado.geocercas is not None:
+        with ETAPAS.medir("geocercas"):
+            resultados_gps.update(estado.geocercas.evaluar(clave, norm, resultados_gps))
+
+    # Línea base propia del animal por hora del día
+    if estado.linea_base is not None:
+        with ETAPAS.medir("linea_base"):
+            resultados_temp.update(estado.linea_base.evaluar(
+                clave, resultados_temp.get("temp_dorsal"), hora
+            ))
+
+    # Detector de celo sobre ventanas deslizantes (actividad, desplazamiento, temperatura)
+    resultados_estado = {}
+    if estado.celo is not None:
+        with ETAPAS.medir("celo"):
+            resultados_estado = estado.celo.evaluar(
+                clave, ts,
+                vedba=resultados_accel.get("VeDBA"), odba=resultados_accel.get("ODBA"),
+                lat=resultados_gps.get("lat"), lon=resultados_gps.get("lon"),
+                delta_temp=resultados_temp.get("delta_temp"),
+            )
+    return resultados_estado
+
+
+def _armar_salida(norm, resultados_temp, resultados_accel, resultados_gps, resultados_estado=None):
+    salida = {
+        "ts": ts_lectura(norm),
+        "ts_epoch": norm.get("ts_epoch"),
+        "timestamp_local": norm.get("received_local_iso"),
+
+        "dev_id": norm.get("dev_id"),
+        "dev_eui": norm.get("dev_eui"),
+        "cow_id": norm.get("cow_id"),
+
+        **(resultados_temp or {}),
+        **(resultados_accel or {}),
+        **(resultados_gps or {}),
+        **(resultados_estado or {})
+    }
+    salida["estado_general"] = estado_general(salida)
+    return salida
+
+
+def estado_general(salida):
+    # Regla instantánea (temperatura + actividad alta en la misma lectura) o episodio del detector
+    instantanea = salida.get("estado") == "posible_celo" and salida.get("actividad") == "alta"
+    return "alerta_celo" if instantanea or salida.get("celo_activo") else salida.get("estado", "desconocido")
+
+
+# ===================================================================
+# PROCESAMIENTO EN LOTE
+# ===================================================================
+def procesar_lote(norms, estado=None):
+    """
+    Igual que `procesar` para muchas lecturas: temperatura, acelerómetro y GPS
+    se calculan vectorizados y las etapas con memoria se aplican en orden de `ts`.
+    Devuelve la lista de salidas en el mismo orden que `norms`.
+    """
+    if not norms:
+        return []
+
+    def col(campo):
+        return [n.get(campo) for n in norms]
+
+    ts = a_flotantes([ts_lectura(n) for n in norms])
+    horas = horas_locales(ts)
+
+    temp = a_registros(procesar_temperatura_lote(col("temp_body_c"), col("temp_amb_c"), col("humedad"), horas))
+    accel = a_registros(procesar_acelerometro_lote({"ODBA_g": col("ODBA_g"), "VeDBA_g": col("VeDBA_g")}))
+    gps_cols = procesar_gps_lote({"lat": col("lat"), "lon": col("lon")})
+    gps = a_registros(gps_cols)
+    if estado is not None and estado.geocercas is not None:
+        # potrero de todos los fixes en una sola consulta al índice
+        for g, potrero in zip(gps, estado.geocercas.indice.potreros(gps_cols["lat"], gps_cols["lon"])):
+            g["potrero"] = potrero
+
+    # Las etapas con memoria dependen del orden temporal: ordenamos por ts (estable)
+    ts_lista = [t if isfinite(t) else None for t in ts.tolist()]
+    horas_lista = horas.tolist()
+    orden = sorted(range(len(norms)), key=lambda i: _ts_orden(ts_lista[i]))
+    extra = [None] * len(norms)
+    for i in orden:
+        extra[i] = _aplicar_estado(norms[i], temp[i], accel[i], gps[i], estado, ts_lista[i], horas_lista[i])
+
+    return [_armar_salida(n, t, a, g, e) for n, t, a, g, e in zip(norms, temp, accel, gps, extra)]
+
+
+def _ts_orden(ts):
+    try:
+        return float(ts)
+    except (TypeError, ValueError):
+        return float("inf")
@@ -1,5 +1,7 @@
 import numpy as np
 
+from utils.vectorizado import a_flotantes, redondear
+
 def procesar_acelerometro(accel):
     """
     Procesa los datos del acelerómetro para obtener ODBA, VeDBA y nivel de actividad.
@@ -40,3 +42,46 @@ def procesar_acelerometro(accel):
         "VeDBA": round(vedba, 3),
         "actividad": actividad
     }
+
+
+def procesar_acelerometro_lote(accel):
+    """
+    Versión vectorizada de `procesar_acelerometro`.
+    `accel` es un dict columnar {'ODBA'|'ODBA_g': array, 'VeDBA'|'VeDBA_g': array};
+    con ambas claves se elige elemento a elemento, igual que el `or` del escalar.
+    """
+    odba = _columna(accel, 'ODBA', 'ODBA_g')
+    vedba = _columna(accel, 'VeDBA', 'VeDBA_g')
+    odba, vedba = (a.copy() for a in np.broadcast_arrays(odba, vedba))
+
+    # Inválidos o fuera de rango físico → 0
+    odba[np.isnan(odba) | (np.abs(odba) > 10)] = 0.0
+    vedba[np.isnan(vedba) | (np.abs(vedba) > 10)] = 0.0
+
+    actividad = np.full(len(vedba), "baja", dtype=object)
+    actividad[vedba > 0.3] = "media"
+    actividad[vedba > 1.5] = "alta"
+
+    return {
+        "ODBA": redondear(odba, 3),
+        "VeDBA": redondear(vedba, 3),
+        "actividad": actividad,
+    }
+
+
+def _columna(datos, clave, alterna):
+    """
+    Columna `clave` con `alterna` donde el valor crudo es falso (None, "", 0), igual que
+    `a or b` por elemento: un NaN o un texto inválido no ceden el lugar y terminan en 0.
+    """
+    principal, otra = datos.get(clave), datos.get(alterna)
+    if principal is None:
+        return a_flotantes([0] if otra is None else otra)
+    if otra is None:
+        return a_flotantes(principal)
+    if isinstance(principal, np.ndarray) and principal.dtype.kind in "fiu":
+        falso = np.atleast_1d(principal == 0)
+    else:
+        falso = np.array([not v for v in principal], dtype=bool)
+    principal, otra, falso = np.broadcast_arrays(a_flotantes(principal), a_flotantes(otra), falso)
+    return np.where(falso, otra, principal)
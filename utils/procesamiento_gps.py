@@ -1,7 +1,12 @@
 import numpy as np
-from datetime import datetime
 from math import radians, sin, cos, asin, sqrt, isfinite
 
+from utils.logs import obtener_logger
+from utils.tiempo import a_epoch, a_epoch_lote
+from utils.vectorizado import a_flotantes
+
+log = obtener_logger("gps")
+
 R_EARTH = 6371000.0  # m
 
 def _to_float_or_none(x):
@@ -16,22 +21,9 @@ def _to_float_or_none(x):
 def _parse_time_to_seconds(t):
     """
     Devuelve segundos (float) desde epoch.
-    Acepta epoch (int/float/str) o ISO8601 (str).
+    Acepta epoch (int/float/str) o ISO8601 (str); ver `tiempo.a_epoch`.
     """
-    if t is None: return None
-    # epoch
-    try:
-        val = float(t)
-        if isfinite(val): return val
-    except Exception:
-        pass
-    # ISO8601
-    try:
-        # maneja '...Z'
-        iso = str(t).replace("Z", "+00:00")
-        return datetime.fromisoformat(iso).timestamp()
-    except Exception:
-        return None
+    return a_epoch(t)
 
 def _haversine(lat1, lon1, lat2, lon2):
     dlat = radians(lat2 - lat1)
@@ -39,6 +31,74 @@ def _haversine(lat1, lon1, lat2, lon2):
     a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
     return 2 * R_EARTH * asin(sqrt(max(0.0, min(1.0, a))))
 
+def haversine_np(lat1, lon1, lat2, lon2):
+    """Haversine vectorizado (grados → metros) sobre arrays del mismo largo."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * R_EARTH * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def _tiempos_a_segundos(tiempos):
+    """Array de tiempos (epoch o ISO8601) → segundos float con NaN donde no se pudo leer."""
+    return a_epoch_lote(tiempos)
+
+def _reparar_tiempos(t):
+    """
+    Rellena huecos hacia adelante (el primero vacío vale 0) y elimina regresiones
+    tomando el mínimo acumulado desde el final: t[i] = min(t[i:]).
+    """
+    if np.isnan(t).all():
+        return np.arange(len(t), dtype=float)
+    t = t.copy()
+    if np.isnan(t[0]):
+        t[0] = 0.0
+    idx = np.where(np.isnan(t), 0, np.arange(len(t)))
+    t = t[np.maximum.accumulate(idx)]
+    return np.minimum.accumulate(t[::-1])[::-1]
+
+def _trayectoria(lat, lon, tiempos):
+    """Distancia, velocidad y rectitud de una lista de fixes, todo sobre arrays."""
+    # Listas de distinto largo: se emparejan hasta la más corta (como zip)
+    n = min(len(lat), len(lon))
+    lats = a_flotantes(lat[:n])
+    lons = a_flotantes(lon[:n])
+    validos = np.flatnonzero(_mascara_validos(lats, lons))
+    if not len(validos):
+        return {"lat": None, "lon": None, "distancia": 0, "velocidad": 0, "rectitud": 1}
+
+    lats = lats[validos]
+    lons = lons[validos]
+
+    # Tiempos (uno por fix válido, en su posición); si no alcanzan, usa índice como pseudotiempo
+    if isinstance(tiempos, (list, tuple, np.ndarray)) and len(tiempos) >= len(validos):
+        t_secs = _tiempos_a_segundos(tiempos)[validos]
+    else:
+        t_secs = np.arange(len(lats), dtype=float)
+    t_secs = _reparar_tiempos(t_secs)
+
+    # Distancias segmento a segmento
+    distancia_total = float(np.nansum(haversine_np(lats[:-1], lons[:-1], lats[1:], lons[1:])))
+
+    # Duración
+    duracion = float(max(0.0, t_secs[-1] - t_secs[0]))
+    velocidad = (distancia_total / duracion) if duracion > 0 else 0.0
+
+    # Filtra velocidades absurdas (> 20 m/s ~ 72 km/h para ganado/porteador)
+    if velocidad > 20.0:
+        velocidad = 0.0  # o clamp a 20.0
+
+    # Rectitud = desplazamiento neto / distancia recorrida
+    desplazamiento_neto = _haversine(lats[0], lons[0], lats[-1], lons[-1])
+    rectitud = (desplazamiento_neto / distancia_total) if distancia_total > 0 else 1.0
+    rectitud = float(min(1.0, max(0.0, rectitud)))
+
+    return {
+        "lat": float(lats[-1]),
+        "lon": float(lons[-1]),
+        "distancia": round(distancia_total, 2),
+        "velocidad": round(velocidad, 2),
+        "rectitud": round(rectitud, 2),
+    }
+
 def procesar_gps(gps):
     """
     Calcula distancia, velocidad y rectitud de manera robusta.
@@ -54,76 +114,8 @@ def procesar_gps(gps):
         tiempos = gps.get("timestamp", [])
 
         # --- Caso trayectoria (listas) ---
-        if isinstance(lat, (list, tuple)) and isinstance(lon, (list, tuple)):
-            # Coerce a float y filtra pares válidos
-            lats = [_to_float_or_none(v) for v in lat]
-            lons = [_to_float_or_none(v) for v in lon]
-
-            # (0,0) se considera inválido (sin fix)
-            valid_idx = [
-                i for i, (la, lo) in enumerate(zip(lats, lons))
-                if la is not None and lo is not None
-                and -90.0 <= la <= 90.0 and -180.0 <= lo <= 180.0
-                and not (abs(la) < 1e-9 and abs(lo) < 1e-9)
-            ]
-            if len(valid_idx) < 1:
-                return {"lat": None, "lon": None, "distancia": 0, "velocidad": 0, "rectitud": 1}
-
-            lats = [lats[i] for i in valid_idx]
-            lons = [lons[i] for i in valid_idx]
-
-            # Tiempos
-            if isinstance(tiempos, (list, tuple)) and len(tiempos) >= len(valid_idx):
-                t_sel = [tiempos[i] for i in valid_idx]
-                t_secs = [_parse_time_to_seconds(t) for t in t_sel]
-            else:
-                # si no hay tiempos válidos, usa índice como pseudotiempo
-                t_secs = list(map(float, range(len(lats))))
-
-            # reemplaza None en tiempos por interpolación simple
-            t_secs = np.array([
-                (t if t is not None and isfinite(t) else np.nan) for t in t_secs
-            ], dtype=float)
-
-            # si todos NaN → usa índice
-            if np.isnan(t_secs).all():
-                t_secs = np.arange(len(lats), dtype=float)
-
-            # forward/backward fill básico
-            for i in range(len(t_secs)):
-                if np.isnan(t_secs[i]):
-                    t_secs[i] = t_secs[i-1] if i > 0 else 0.0
-            for i in range(len(t_secs)-2, -1, -1):
-                if t_secs[i] > t_secs[i+1]:
-                    t_secs[i] = t_secs[i+1]  # evita regresión temporal
-
-            # Distancias segmento a segmento
-            dists = [
-                _haversine(lats[i], lons[i], lats[i+1], lons[i+1])
-                for i in range(len(lats)-1)
-            ]
-            distancia_total = float(np.nansum(dists))
-
-            # Duración
-            duracion = float(max(0.0, t_secs[-1] - t_secs[0]))
-            velocidad = (distancia_total / duracion) if duracion > 0 else 0.0
-
-            # Filtra velocidades absurdas (> 20 m/s ~ 72 km/h para ganado/porteador)
-            if velocidad > 20.0:
-                velocidad = 0.0  # o clamp a 20.0
-
-            # Rectitud = desplazamiento neto / distancia recorrida
-            desplazamiento_neto = _haversine(lats[0], lons[0], lats[-1], lons[-1])
-            rectitud = (desplazamiento_neto / distancia_total) if distancia_total > 0 else 1.0
-            rectitud = float(min(1.0, max(0.0, rectitud)))
-
-            return {
-                "lat": lats[-1],
-                "lon": lons[-1],
-                "distancia": round(distancia_total, 2),
-                "velocidad": round(velocidad, 2),
-                "rectitud": round(rectitud, 2),
-            }
+        if isinstance(lat, (list, tuple, np.ndarray)) and isinstance(lon, (list, tuple, np.ndarray)):
+            return _trayectoria(lat, lon, tiempos)
 
         # --- Caso punto único ---
         la = _to_float_or_none(lat)
@@ -134,6 +126,75 @@ def procesar_gps(gps):
         return {"lat": la, "lon": lo, "distancia": 0, "velocidad": 0, "rectitud": 1}
 
     except Exception as e:
-        print(f"❌ Error en procesar_gps: {e}")
+        log.error("❌ Error en procesar_gps: %s", e)
         return {"lat": None, "lon": None, "distancia": 0, "velocidad": 0, "rectitud": 1}
 
+def procesar_gps_lote(gps):
+    """
+    Versión vectorizada de `procesar_gps` para muchos puntos únicos (uno por uplink).
+    `gps` es un dict columnar {'lat': array, 'lon': array}; cada fila se valida
+    igual que el caso de punto único (rango, NaN y (0,0) sin fix).
+    Sin más columnas cada fila es un punto aislado (distancia y velocidad 0, como el
+    escalar). Con 'animal' (y opcionalmente 'timestamp', epoch o ISO) cada fix válido
+    lleva el paso desde el fix válido anterior del mismo animal dentro del lote:
+    distancia (m) y velocidad (m/s, 0 sin tiempos o por encima de 20 m/s). El primer
+    fix de cada animal queda en 0: lo anterior al lote no se conoce aquí.
+    """
+    lat = a_flotantes(gps.get("lat"))
+    lon = a_flotantes(gps.get("lon"))
+    lat, lon = (a.copy() for a in np.broadcast_arrays(lat, lon))
+
+    validos = _mascara_validos(lat, lon)
+    lat[~validos] = np.nan
+    lon[~validos] = np.nan
+
+    n = len(lat)
+    if gps.get("animal") is None:
+        distancia = np.zeros(n, dtype=np.int64)
+        velocidad = np.zeros(n, dtype=np.int64)
+    else:
+        distancia, velocidad = _pasos_por_animal(lat, lon, validos, gps["animal"], gps.get("timestamp"))
+    return {
+        "lat": lat,
+        "lon": lon,
+        "distancia": distancia,
+        "velocidad": velocidad,
+        "rectitud": np.ones(n, dtype=np.int64),
+    }
+
+def _pasos_por_animal(lat, lon, validos, animal, tiempos):
+    """Distancia y velocidad de cada fix válido respecto del anterior del mismo animal."""
+    n = len(lat)
+    distancia = np.zeros(n)
+    velocidad = np.zeros(n)
+    idx = np.flatnonzero(validos)
+    if len(idx) < 2:
+        return distancia, velocidad
+
+    _, codigos = np.unique(np.asarray([str(a) for a in animal], dtype=object)[idx], return_inverse=True)
+    t = _tiempos_a_segundos(tiempos)[idx] if tiempos is not None else np.full(len(idx), np.nan)
+    # Por animal y, dentro de cada uno, por tiempo (estable; sin tiempo, orden de llegada)
+    orden = np.lexsort((np.where(np.isnan(t), np.inf, t), codigos))
+    idx, codigos, t = idx[orden], codigos[orden], t[orden]
+
+    mismo = codigos[1:] == codigos[:-1]
+    pasos = haversine_np(lat[idx[:-1]], lon[idx[:-1]], lat[idx[1:]], lon[idx[1:]])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dt = t[1:] - t[:-1]
+        vel = np.where(dt > 0, pasos / dt, 0.0)
+    vel[~np.isfinite(vel) | (vel > 20.0)] = 0.0
+
+    destino = idx[1:][mismo]
+    distancia[destino] = np.round(pasos[mismo], 2)
+    velocidad[destino] = np.round(vel[mismo], 2)
+    return distancia, velocidad
+
+def _mascara_validos(lat, lon):
+    """Fix válido: finito, dentro de rango y distinto de (0,0)."""
+    with np.errstate(invalid="ignore"):
+        return (
+            ~np.isnan(lat) & ~np.isnan(lon)
+            & (lat >= -90.0) & (lat <= 90.0)
+            & (lon >= -180.0) & (lon <= 180.0)
+            & ~((np.abs(lat) < 1e-9) & (np.abs(lon) < 1e-9))
+        )
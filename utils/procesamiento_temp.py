@@ -1,7 +1,13 @@
 import numpy as np
-from datetime import datetime
 from math import isfinite
 
+from utils.logs import obtener_logger
+from utils.modelo_temp import gestor_modelo
+from utils.tiempo import hora_local
+from utils.vectorizado import a_flotantes, redondear
+
+log = obtener_logger("temperatura")
+
 # RANGOS "plausibles" (ajústalos si quieres)
 RANGO_T_AMB = (-20.0, 60.0)   # °C ambiente
 RANGO_T_DOR = (20.0, 45.0)    # °C dorsal/vaca (típico 28–41)
@@ -20,12 +26,14 @@ def _to_float_or_none(x):
 def _en_rango(x, lo, hi):
     return (x is not None) and (lo <= x <= hi)
 
-def procesar_temperatura(temp_actual, temp_amb, humedad):
+def procesar_temperatura(temp_actual, temp_amb, humedad, hora=None):
     """
     Calcula temperatura base, variaciones y estado térmico de forma robusta.
     - Tolera None, strings, NaN, 0 'fantasma', y valores fuera de rango.
     - Si no hay dato válido de dorsal, retorna estado 'sin_lectura' pero igual entrega índice térmico.
     - Usa el modelo si está disponible; si no, hace fallback lineal.
+      `fuente_base` indica cuál de los dos produjo temp_base.
+    - `hora`: hora local (Bogotá) de la lectura para el modelo; por defecto, la actual.
     """
 
     # ---- Normalización segura ----
@@ -47,20 +55,21 @@ def procesar_temperatura(temp_actual, temp_amb, humedad):
         hum = 65.0
     hum = max(RANGO_HUM[0], min(RANGO_HUM[1], hum))
 
-    # Hora (para el modelo); si no te llega del payload, usa hora local
-    try:
-        hora = datetime.now().hour
-    except Exception:
-        hora = 12
+    # Hora local de la lectura (para el modelo); si no llega, la hora actual en Bogotá
+    if hora is None:
+        hora = hora_local()
 
     # ---- Temperatura base (modelo o fallback) ----
     temp_base = None
+    fuente_base = "fallback"
     try:
-        # usa tu modelo si existe en el scope
-        temp_base = float(modelo.predict([[t_amb if t_amb is not None else 25.0,
-                                           hum,
-                                           hora]])[0])
-    except Exception:
+        temp_base = gestor_modelo.predecir(t_amb if t_amb is not None else 25.0, hum, hora)
+        if temp_base is not None:
+            fuente_base = "modelo"
+    except Exception as e:
+        log.warning("⚠️ Error en modelo de temperatura: %s", e)
+        temp_base = None
+    if temp_base is None:
         # Fallback simple cuando no hay modelo o falla
         # Base = ambiente + efecto humedad (muy simple)
         base_amb = t_amb if t_amb is not None else 25.0
@@ -79,6 +88,7 @@ def procesar_temperatura(temp_actual, temp_amb, humedad):
             "delta_temp": None,
             "delta_pct": None,
             "indice_termico": round(float(indice_termico), 2),
+            "fuente_base": fuente_base,
             "estado": "sin_lectura"
         }
 
@@ -111,5 +121,71 @@ def procesar_temperatura(temp_actual, temp_amb, humedad):
         "delta_temp": round(delta, 2) if delta is not None else None,
         "delta_pct": round(delta_pct, 2) if (delta_pct is not None and np.isfinite(delta_pct)) else None,
         "indice_termico": round(float(indice_termico), 2),
+        "fuente_base": fuente_base,
         "estado": estado
     }
+
+
+def procesar_temperatura_lote(temp_actual, temp_amb, humedad, horas=None):
+    """
+    Versión vectorizada de `procesar_temperatura` para muchas lecturas a la vez.
+    - Recibe arrays/listas (mismo largo) y `horas` locales opcional (array o escalar;
+      por defecto la hora actual en Bogotá).
+    - Devuelve columnas {campo: array} con NaN donde la versión escalar da None;
+      `vectorizado.a_registros` las convierte a los mismos dicts que la escalar.
+    - temp_base se obtiene con una sola llamada a model.predict sobre toda la matriz.
+    """
+    t_dor = a_flotantes(temp_actual)
+    t_amb = a_flotantes(temp_amb)
+    hum = a_flotantes(humedad)
+    n = len(t_dor)
+
+    # Zeros fantasma y validación por rango (NaN = sin lectura)
+    t_dor[(t_dor == 0.0) | (t_dor < RANGO_T_DOR[0]) | (t_dor > RANGO_T_DOR[1])] = np.nan
+    t_amb[(t_amb == 0.0) | (t_amb < RANGO_T_AMB[0]) | (t_amb > RANGO_T_AMB[1])] = np.nan
+    hum = np.clip(np.where(np.isnan(hum), 65.0, hum), *RANGO_HUM)
+
+    if horas is None:
+        horas = hora_local()
+    horas = np.broadcast_to(np.asarray(horas, dtype=np.int64), (n,))
+
+    base_amb = np.where(np.isnan(t_amb), 25.0, t_amb)
+
+    # ---- Temperatura base (modelo o fallback) ----
+    temp_base = None
+    try:
+        temp_base = gestor_modelo.predecir_lote(base_amb, hum, horas)
+    except Exception as e:
+        log.warning("⚠️ Error en modelo de temperatura: %s", e)
+        temp_base = None
+    if temp_base is None:
+        temp_base = base_amb + 0.02 * hum
+        fuente_base = np.full(n, "fallback", dtype=object)
+    else:
+        fuente_base = np.full(n, "modelo", dtype=object)
+
+    indice_termico = base_amb + 0.1 * hum
+
+    # ---- Delta y estado ----
+    con_lectura = ~np.isnan(t_dor)
+    delta = t_dor - temp_base
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta_pct = np.where(temp_base != 0, (delta / temp_base) * 100.0, np.nan)
+    delta_pct[~np.isfinite(delta_pct)] = np.nan
+
+    estado = np.full(n, "normal", dtype=object)
+    estado[delta >= 1.5] = "posible_celo"
+    estado[delta <= -1.5] = "enfriamiento"
+    estado[~con_lectura] = "sin_lectura"
+
+    return {
+        "temp_dorsal": redondear(t_dor, 2),
+        "temp_amb": redondear(t_amb, 2),
+        "humedad": redondear(hum, 2),
+        "temp_base": redondear(temp_base, 2),
+        "delta_temp": redondear(delta, 2),
+        "delta_pct": redondear(delta_pct, 2),
+        "indice_termico": redondear(indice_termico, 2),
+        "fuente_base": fuente_base,
+        "estado": estado,
+    }
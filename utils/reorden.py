@@ -0,0 +1,151 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from math import isfinite
+
+from utils.logs import obtener_logger
+
+log = obtener_logger("reorden")
+
+
+def _ts(ts):
+    try:
+        t = float(ts)
+        return t if isfinite(t) else None
+    except (TypeError, ValueError):
+        return None
+
+
+class BufferOrden:
+    """
+    Buffer de reordenamiento por animal para las etapas con memoria.
+    - Cada uplink se retiene como máximo ~`retardo_s` segundos (reloj del servidor);
+      al vencer un plazo se libera el uplink de menor ts pendiente de ese animal,
+      así un uplink atrasado que llega dentro de la ventana se procesa en su lugar.
+    - Los que llegan con ts anterior al último ya liberado (más tarde que la ventana)
+      o sin ts no se retienen: se liberan de inmediato y se cuentan como `tardios`.
+    - `al_liberar(item)` se llama desde el hilo liberador en orden de ts por animal
+      (los tardíos, desde el hilo que llamó a `agregar`).
+    - Si hay más de `max_items` retenidos se libera el plazo más antiguo sin esperar.
+    - El ts del último liberado por animal se olvida como la caché de duplicados: a
+      los `ttl_s` segundos sin liberar nada de ese animal, y nunca más de `max_claves`.
+    """
+
+    def __init__(self, al_liberar, retardo_s=5.0, max_items=10000, ttl_s=600.0, max_claves=200_000):
+        self.al_liberar = al_liberar
+        self.retardo_s = float(retardo_s)
+        self.max_items = int(max_items)
+        self.ttl_s = float(ttl_s)
+        self.max_claves = int(max_claves)
+        self._pendientes = {}      # clave → heap [(ts, seq, item)]
+        self._max_pendiente = {}   # clave → mayor ts en su heap
+        self._plazos = deque()     # (vence_monotonic, clave) en orden de llegada
+        self._ultimo_ts = OrderedDict()  # clave → (ts del último liberado, monotonic), orden de liberación
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._hilo = None
+        self._parar = False
+        self._contadores = {"retenidos": 0, "reordenados": 0, "tardios": 0, "liberados": 0}
+
+    def __len__(self):
+        return len(self._plazos)
+
+    # ───────── ciclo de vida ─────────
+    def iniciar(self):
+        with self._cond:
+            if self._hilo is not None:
+                return
+            self._parar = False
+            self._hilo = threading.Thread(target=self._liberar_vencidos, name="reorden", daemon=True)
+            self._hilo.start()
+
+    def detener(self, timeout=5.0):
+        """Libera todo lo retenido (en orden) y detiene el hilo."""
+        with self._cond:
+            self._parar = True
+            self._cond.notify()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+            self._hilo = None
+
+    # ───────── API ─────────
+    def agregar(self, clave, ts, item):
+        """Retiene `item` del animal `clave`. Devuelve False si se liberó de inmediato (tardío)."""
+        if self._hilo is None:
+            self.iniciar()
+        ts = _ts(ts)
+        with self._cond:
+            ultimo = self._ultimo_ts.get(clave)
+            if ts is None or (ultimo is not None and ts < ultimo[0]):
+                self._contadores["tardios"] += 1
+                inmediato = True
+            else:
+                heap = self._pendientes.setdefault(clave, [])
+                maximo = self._max_pendiente.get(clave)
+                if maximo is not None and ts < maximo:
+                    self._contadores["reordenados"] += 1
+                else:
+                    self._max_pendiente[clave] = ts
+                heapq.heappush(heap, (ts, next(self._seq), item))
+                self._plazos.append((time.monotonic() + self.retardo_s, clave))
+                self._contadores["retenidos"] += 1
+                inmediato = False
+                self._cond.notify()
+        if inmediato:
+            self._entregar(item)
+        return not inmediato
+
+    def estadisticas(self):
+        with self._cond:
+            stats = dict(self._contadores)
+            stats["en_espera"] = len(self._plazos)
+        return stats
+
+    # ───────── hilo liberador ─────────
+    def _tomar_siguiente(self, forzar):
+        """Saca (bajo el candado) el próximo item a liberar, o None."""
+        if not self._plazos:
+            return None
+        vence, clave = self._plazos[0]
+        if not forzar and vence > time.monotonic() and len(self._plazos) <= self.max_items:
+            return None
+        self._plazos.popleft()
+        heap = self._pendientes[clave]
+        ts, _, item = heapq.heappop(heap)
+        if not heap:
+            del self._pendientes[clave]
+            del self._max_pendiente[clave]
+        ahora = time.monotonic()
+        self._ultimo_ts.pop(clave, None)
+        self._ultimo_ts[clave] = (ts, ahora)
+        self._expirar(ahora)
+        self._contadores["liberados"] += 1
+        return item
+
+    def _expirar(self, ahora):
+        limite = ahora - self.ttl_s
+        while self._ultimo_ts:
+            t = next(iter(self._ultimo_ts.values()))[1]
+            if t > limite and len(self._ultimo_ts) <= self.max_claves:
+                break
+            self._ultimo_ts.popitem(last=False)
+
+    def _liberar_vencidos(self):
+        while True:
+            with self._cond:
+                item = self._tomar_siguiente(forzar=self._parar)
+                if item is None:
+                    if self._parar:
+                        return
+                    espera = self._plazos[0][0] - time.monotonic() if self._plazos else None
+                    self._cond.wait(espera)
+                    continue
+            self._entregar(item)
+
+    def _entregar(self, item):
+        try:
+            self.al_liberar(item)
+        except Exception as e:
+            log.exception("❌ Error procesando uplink reordenado: %s", e)
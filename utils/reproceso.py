@@ -0,0 +1,317 @@
+# reproceso.py — reproceso/backfill offline de uplinks históricos con el mismo pipeline del webhook
+#
+#   python -m utils.reproceso historico.ndjson.gz -o salida.ndjson
+#   python -m utils.reproceso lecturas.csv -o salida.csv --procesos 8
+#   python -m utils.reproceso historico.ndjson -o columnas/ --formato columnar
+#   python -m utils.reproceso historico.ndjson --thingsboard --dispositivos dispositivos.json --tasa 20
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+from utils.logs import obtener_logger, registrar_secretos
+from utils.celo import DetectorCelo
+from utils.dispositivos import RegistroDispositivos
+from utils.linea_base import LineaBaseAnimal
+from utils.parseo import normalizar, cargar_json
+from utils.pipeline import procesar_lote, EstadoHato
+from utils.tiempo import ts_lectura
+from utils.trayectorias import AlmacenTrayectorias
+
+log = obtener_logger("reproceso")
+
+
+# ───────────────────────────────────────────────────────────────
+# LECTURA (generadores: memoria constante sin importar el tamaño)
+# ───────────────────────────────────────────────────────────────
+def _abrir_texto(ruta):
+    if ruta == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+    with open(ruta, "rb") as f:
+        gz = f.read(2) == b"\x1f\x8b"
+    if gz:
+        return gzip.open(ruta, "rt", encoding="utf-8")
+    return open(ruta, "r", encoding="utf-8", newline="")
+
+
+def _formato_entrada(ruta, formato):
+    if formato != "auto":
+        return formato
+    base = ruta[:-3] if ruta.endswith(".gz") else ruta
+    return "csv" if base.lower().endswith(".csv") else "ndjson"
+
+
+def leer_cuerpos(ruta, formato="auto"):
+    """Genera un cuerpo (dict) por línea NDJSON o fila CSV; None si la línea es inválida."""
+    formato = _formato_entrada(ruta, formato)
+    with _abrir_texto(ruta) as f:
+        if formato == "csv":
+            for fila in csv.DictReader(f):
+                yield {k: (v if v != "" else None) for k, v in fila.items() if k}
+        else:
+            for linea in f:
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    cuerpo = cargar_json(linea)
+                except ValueError:
+                    cuerpo = None
+                yield cuerpo if isinstance(cuerpo, dict) else None
+
+
+def en_bloques(iterable, tamano):
+    bloque = []
+    for x in iterable:
+        bloque.append(x)
+        if len(bloque) >= tamano:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+# ───────────────────────────────────────────────────────────────
+# PROCESAMIENTO DE UN BLOQUE (mismo parse → procesar_* → estado_general)
+# ───────────────────────────────────────────────────────────────
+_estado = None
+
+
+def procesar_bloque(cuerpos):
+    """Devuelve (salidas, errores). En multiproceso cada proceso tiene su propio estado por animal."""
+    global _estado
+    if _estado is None:
+        _estado = EstadoHato(trayectorias=AlmacenTrayectorias(), linea_base=LineaBaseAnimal(),
+                             celo=DetectorCelo())
+    norms, errores = [], 0
+    for cuerpo in cuerpos:
+        if cuerpo is None:
+            errores += 1
+            continue
+        try:
+            norms.append(normalizar(cuerpo))
+        except Exception:
+            errores += 1
+    return procesar_lote(norms, _estado), errores
+
+
+def _procesar_en_paralelo(bloques, procesos):
+    """Como map(procesar_bloque, bloques) pero con pocos bloques en vuelo (memoria acotada)."""
+    import multiprocessing as mp
+    with mp.Pool(procesos) as pool:
+        en_vuelo = deque()
+        for bloque in bloques:
+            en_vuelo.append(pool.apply_async(procesar_bloque, (bloque,)))
+            if len(en_vuelo) >= 2 * procesos:
+                yield en_vuelo.popleft().get()
+        while en_vuelo:
+            yield en_vuelo.popleft().get()
+
+
+# ───────────────────────────────────────────────────────────────
+# SALIDAS
+# ───────────────────────────────────────────────────────────────
+def _abrir_salida_texto(ruta):
+    if ruta == "-":
+        return sys.stdout
+    if ruta.endswith(".gz"):
+        return gzip.open(ruta, "wt", encoding="utf-8", newline="")
+    return open(ruta, "w", encoding="utf-8", newline="")
+
+
+class SalidaNDJSON:
+    def __init__(self, ruta):
+        self.f = _abrir_salida_texto(ruta)
+
+    def escribir(self, salidas):
+        self.f.writelines(json.dumps(s, ensure_ascii=False) + "\n" for s in salidas)
+
+    def cerrar(self):
+        if self.f is not sys.stdout:
+            self.f.close()
+
+
+# Columnas del CSV: todos los campos que puede emitir el pipeline, en el orden de
+# _armar_salida (identificación, temperatura, línea base, acelerómetro, GPS y
+# geocercas, celo). Las que falten en una lectura quedan vacías; un campo que no
+# esté aquí es un error (hay que agregarlo), no una columna que se pierde en silencio.
+COLUMNAS_CSV = (
+    "ts", "ts_epoch", "timestamp_local", "dev_id", "dev_eui", "cow_id",
+    "temp_dorsal", "temp_amb", "humedad", "temp_base", "delta_temp", "delta_pct",
+    "indice_termico", "fuente_base", "estado",
+    "temp_base_animal", "z_temp", "estado_z",
+    "ODBA", "VeDBA", "actividad",
+    "lat", "lon", "distancia", "velocidad", "rectitud",
+    "potrero", "fuera_de_cerca", "cerca_evento",
+    "celo_evento", "celo_confianza", "celo_activo",
+    "estado_general",
+)
+
+
+class SalidaCSV:
+    """CSV con las columnas fijas de COLUMNAS_CSV (ValueError ante un campo desconocido)."""
+
+    def __init__(self, ruta):
+        self.f = _abrir_salida_texto(ruta)
+        self.writer = csv.DictWriter(self.f, fieldnames=COLUMNAS_CSV, extrasaction="raise")
+        self.writer.writeheader()
+
+    def escribir(self, salidas):
+        self.writer.writerows(salidas)
+
+    def cerrar(self):
+        if self.f is not sys.stdout:
+            self.f.close()
+
+
+class SalidaColumnar:
+    """Un .npz por bloque dentro de un directorio: una columna (array) por campo."""
+
+    def __init__(self, ruta):
+        self.dir = ruta
+        os.makedirs(ruta, exist_ok=True)
+        self.n = 0
+
+    def escribir(self, salidas):
+        if not salidas:
+            return
+        columnas = {}
+        for campo in salidas[0]:
+            valores = [s.get(campo) for s in salidas]
+            try:
+                columnas[campo] = np.array(valores, dtype=float)
+            except (TypeError, ValueError):
+                columnas[campo] = np.array(["" if v is None else str(v) for v in valores])
+        np.savez_compressed(os.path.join(self.dir, f"bloque_{self.n:06d}.npz"), **columnas)
+        self.n += 1
+
+    def cerrar(self):
+        pass
+
+
+class SalidaThingsBoard:
+    """Envía cada bloque agrupado por token, respetando `tasa` peticiones por segundo."""
+
+    def __init__(self, registro, base_url, tasa=10.0, lote_max=100):
+        import requests
+        self.registro = registro
+        self.base_url = base_url.rstrip("/")
+        self.intervalo = 1.0 / tasa if tasa > 0 else 0.0
+        self.lote_max = lote_max
+        self.sesion = requests.Session()
+        self._proximo = time.monotonic()
+        self.peticiones = 0
+        self.fallidas = 0
+        self.sin_token = 0
+
+    def escribir(self, salidas):
+        from utils.cola_thingsboard import ts_ms
+        from utils.envio_thingsboard import enviar_lote_thingsboard
+        grupos = {}
+        for s in salidas:
+            token = self.registro.token(s.get("dev_eui"), s.get("dev_id"), s.get("cow_id"))
+            if not token:
+                self.sin_token += 1
+                continue
+            grupos.setdefault(token, []).append({"ts": ts_ms(ts_lectura(s)), "values": s})
+        for token, puntos in grupos.items():
+            url = f"{self.base_url}/api/v1/{token}/telemetry"
+            for i in range(0, len(puntos), self.lote_max):
+                self._esperar_turno()
+                self.peticiones += 1
+                try:
+                    if enviar_lote_thingsboard(self.sesion, url, puntos[i:i + self.lote_max]) != 200:
+                        self.fallidas += 1
+                except Exception as e:
+                    self.fallidas += 1
+                    log.error("❌ Error de conexión con ThingsBoard: %s", e)
+
+    def _esperar_turno(self):
+        ahora = time.monotonic()
+        if self._proximo > ahora:
+            time.sleep(self._proximo - ahora)
+        self._proximo = max(ahora, self._proximo) + self.intervalo
+
+    def cerrar(self):
+        self.sesion.close()
+
+
+def _crear_salida(args):
+    if args.thingsboard:
+        # Registro y URL del entorno, sin importar app.py (que abriría historial, outbox
+        # y línea base en el directorio actual y arrancaría sus hilos)
+        if not args.dispositivos:
+            raise SystemExit("--thingsboard requiere un registro de dispositivos (--dispositivos o DISPOSITIVOS_PATH)")
+        registro = RegistroDispositivos(args.dispositivos, al_recargar=lambda reg: registrar_secretos(reg.tokens()),
+                                        por_cow_id=os.getenv("DISPOSITIVOS_POR_COW_ID", "0") == "1")
+        return SalidaThingsBoard(registro, args.tb_base, tasa=args.tasa, lote_max=args.lote_tb)
+    formato = args.formato
+    if formato == "auto":
+        base = args.salida[:-3] if args.salida.endswith(".gz") else args.salida
+        formato = "csv" if base.lower().endswith(".csv") else "ndjson"
+    return {"ndjson": SalidaNDJSON, "csv": SalidaCSV, "columnar": SalidaColumnar}[formato](args.salida)
+
+
+# ───────────────────────────────────────────────────────────────
+# MAIN
+# ───────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        prog="python -m utils.reproceso",
+        description="Reprocesa uplinks históricos (NDJSON TTN v3 o CSV plano, opcionalmente .gz).",
+    )
+    ap.add_argument("entrada", help="archivo de entrada ('-' = stdin)")
+    ap.add_argument("-o", "--salida", default="-", help="archivo o directorio de salida ('-' = stdout)")
+    ap.add_argument("--formato-entrada", choices=["auto", "ndjson", "csv"], default="auto")
+    ap.add_argument("--formato", choices=["auto", "ndjson", "csv", "columnar"], default="auto",
+                    help="formato de salida (auto según extensión)")
+    ap.add_argument("--bloque", type=int, default=5000, help="lecturas por bloque vectorizado")
+    ap.add_argument("--procesos", type=int, default=1,
+                    help="procesos en paralelo (trayectorias y líneas base solo son continuas con 1)")
+    ap.add_argument("--thingsboard", action="store_true", help="enviar a ThingsBoard en vez de a archivo")
+    ap.add_argument("--tasa", type=float, default=10.0, help="peticiones/s máximas hacia ThingsBoard")
+    ap.add_argument("--lote-tb", type=int, default=100, help="puntos por petición a ThingsBoard")
+    ap.add_argument("--dispositivos", default=os.getenv("DISPOSITIVOS_PATH"),
+                    help="registro de dispositivos para --thingsboard (por defecto DISPOSITIVOS_PATH)")
+    ap.add_argument("--tb-base", default=os.getenv("THINGSBOARD_BASE", "https://thingsboard.cloud"),
+                    help="URL base de ThingsBoard (por defecto THINGSBOARD_BASE)")
+    args = ap.parse_args(argv)
+
+    salida = _crear_salida(args)
+    bloques = en_bloques(leer_cuerpos(args.entrada, args.formato_entrada), max(1, args.bloque))
+    resultados = (_procesar_en_paralelo(bloques, args.procesos) if args.procesos > 1
+                  else map(procesar_bloque, bloques))
+
+    t0 = time.perf_counter()
+    procesados = errores = 0
+    try:
+        for salidas, err in resultados:
+            salida.escribir(salidas)
+            procesados += len(salidas)
+            errores += err
+    finally:
+        salida.cerrar()
+
+    dur = time.perf_counter() - t0
+    resumen = {
+        "procesados": procesados,
+        "errores": errores,
+        "segundos": round(dur, 2),
+        "lecturas_por_s": round(procesados / dur, 1) if dur > 0 else None,
+    }
+    if isinstance(salida, SalidaThingsBoard):
+        resumen.update(peticiones_tb=salida.peticiones, fallidas_tb=salida.fallidas, sin_token=salida.sin_token)
+    print(json.dumps(resumen), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
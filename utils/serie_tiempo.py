@@ -0,0 +1,301 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils.logs import obtener_logger
+from utils.procesamiento_gps import _haversine
+from utils.tiempo import _offset_hora, ts_lectura
+
+log = obtener_logger("serie_tiempo")
+
+# Campos de la telemetría (`salida`) que se guardan por lectura
+CAMPOS = ("temp_dorsal", "temp_amb", "delta_temp", "z_temp", "ODBA", "VeDBA",
+          "actividad", "lat", "lon", "estado_general")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS lecturas (
+    clave          TEXT    NOT NULL,
+    ts             REAL    NOT NULL,
+    temp_dorsal    REAL,
+    temp_amb       REAL,
+    delta_temp     REAL,
+    z_temp         REAL,
+    ODBA           REAL,
+    VeDBA          REAL,
+    actividad      TEXT,
+    lat            REAL,
+    lon            REAL,
+    estado_general TEXT,
+    distancia_seg  REAL,
+    activo_s       REAL,
+    PRIMARY KEY (clave, ts)
+) WITHOUT ROWID;
+
+-- Resumen horario mantenido al insertar: las consultas por hora/día no recorren lecturas
+CREATE TABLE IF NOT EXISTS resumen_hora (
+    clave      TEXT    NOT NULL,
+    hora       INTEGER NOT NULL,
+    n          INTEGER NOT NULL,
+    n_temp     INTEGER NOT NULL,
+    suma_temp  REAL    NOT NULL,
+    min_temp   REAL,
+    max_temp   REAL,
+    distancia  REAL    NOT NULL,
+    activo_s   REAL    NOT NULL,
+    PRIMARY KEY (clave, hora)
+) WITHOUT ROWID;
+"""
+
+_UPSERT_RESUMEN = """
+INSERT INTO resumen_hora (clave, hora, n, n_temp, suma_temp, min_temp, max_temp, distancia, activo_s)
+VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (clave, hora) DO UPDATE SET
+    n         = n + 1,
+    n_temp    = n_temp + excluded.n_temp,
+    suma_temp = suma_temp + excluded.suma_temp,
+    min_temp  = CASE WHEN excluded.min_temp IS NULL THEN min_temp
+                     WHEN min_temp IS NULL OR excluded.min_temp < min_temp THEN excluded.min_temp
+                     ELSE min_temp END,
+    max_temp  = CASE WHEN excluded.max_temp IS NULL THEN max_temp
+                     WHEN max_temp IS NULL OR excluded.max_temp > max_temp THEN excluded.max_temp
+                     ELSE max_temp END,
+    distancia = distancia + excluded.distancia,
+    activo_s  = activo_s + excluded.activo_s
+"""
+
+_INSERT_LECTURA = (
+    f"INSERT OR IGNORE INTO lecturas (clave, ts, {', '.join(CAMPOS)}, distancia_seg, activo_s) "
+    f"VALUES ({', '.join('?' * (len(CAMPOS) + 4))})"
+)
+
+# Posiciones dentro de la fila (clave, ts, *CAMPOS)
+_I_TEMP, _I_ACT, _I_LAT, _I_LON = (2 + CAMPOS.index(c) for c in ("temp_dorsal", "actividad", "lat", "lon"))
+
+
+def _ts_segundos(ts):
+    """Epoch en segundos con precisión de ms (dos lecturas del mismo segundo son distintas)."""
+    try:
+        t = float(ts)
+        return round(t, 3) if 0 < t < float("inf") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _offset_local(epoch):
+    """Offset local (s) en el epoch `epoch`; se registra como función SQL `offset_local`."""
+    return _offset_hora(int(epoch) // 3600)
+
+
+class SerieTiempo:
+    """
+    Almacén local de la telemetría procesada, indexado por (clave, ts_epoch).
+    - `agregar` solo encola; un hilo escritor inserta en lote (group-commit, WAL).
+    - Al insertar se calcula la distancia desde el fix anterior y los segundos
+      en actividad media/alta (hueco acotado a `hueco_max_s`), y se actualiza
+      un resumen por hora para que los agregados no recorran todas las lecturas.
+    - El último fix por animal se guarda en memoria para `max_animales` (LRU); el
+      resto se vuelve a leer de la base al siguiente uso.
+    """
+
+    def __init__(self, ruta, commit_cada_s=0.2, hueco_max_s=900.0, max_animales=100_000):
+        self.ruta = ruta
+        self.commit_cada_s = commit_cada_s
+        self.hueco_max_s = hueco_max_s
+        self.max_animales = int(max_animales)
+        self._pendientes = []
+        self._lock = threading.Lock()
+        self._hay_pendientes = threading.Event()
+        self._vaciado = threading.Condition(self._lock)
+        self._en_escritura = 0
+        self._parar = threading.Event()
+        self._hilo = None
+        self._local = threading.local()
+        self._contadores = {"escritas": 0, "duplicadas": 0, "errores": 0}
+        self._ultimo = OrderedDict()  # clave → (ts, lat, lon) de la última lectura insertada, orden LRU
+        with self._conexion() as con:
+            con.executescript(_ESQUEMA)
+
+    # ───────── conexión (una por hilo) ─────────
+    def _conexion(self):
+        con = getattr(self._local, "con", None)
+        if con is None or getattr(self._local, "pid", None) != os.getpid():
+            con = sqlite3.connect(self.ruta, timeout=30, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.create_function("offset_local", 1, _offset_local, deterministic=True)
+            self._local.con, self._local.pid = con, os.getpid()
+        return con
+
+    # ───────── escritura ─────────
+    def iniciar(self):
+        if self._hilo is not None:
+            return
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._escribir, name="serie-tiempo", daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout=5.0):
+        self._parar.set()
+        self._hay_pendientes.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+            self._hilo = None
+
+    def agregar(self, salida, clave):
+        """Encola una lectura procesada para el animal `clave`."""
+        ts = _ts_segundos(ts_lectura(salida)) or round(time.time(), 3)
+        fila = (clave, ts) + tuple(salida.get(c) for c in CAMPOS)
+        if self._hilo is None:
+            self.iniciar()
+        with self._lock:
+            self._pendientes.append(fila)
+        self._hay_pendientes.set()
+
+    def vaciar(self, timeout=10.0):
+        """Espera a que todo lo encolado quede escrito (útil antes de consultar)."""
+        limite = time.monotonic() + timeout
+        with self._vaciado:
+            while (self._pendientes or self._en_escritura) and time.monotonic() < limite:
+                self._hay_pendientes.set()
+                self._vaciado.wait(0.05)
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._contadores)
+            stats["en_memoria"] = len(self._pendientes)
+        stats["animales"] = len(self._ultimo)
+        return stats
+
+    def _escribir(self):
+        while True:
+            self._hay_pendientes.wait(1.0)
+            parar = self._parar.is_set()
+            if not parar:
+                time.sleep(self.commit_cada_s)
+            self._hay_pendientes.clear()
+            with self._lock:
+                lote, self._pendientes = self._pendientes, []
+                self._en_escritura = len(lote)
+            try:
+                if lote:
+                    self._insertar(lote)
+            except Exception as e:
+                self._contadores["errores"] += len(lote)
+                log.error("❌ Error escribiendo serie de tiempo: %s", e)
+            finally:
+                with self._vaciado:
+                    self._en_escritura = 0
+                    self._vaciado.notify_all()
+            if parar:
+                return
+
+    def _previo(self, con, clave):
+        """Último fix conocido de `clave` (memoria, o la base al primer uso tras un reinicio)."""
+        previo = self._ultimo.get(clave)
+        if previo is not None:
+            self._ultimo.move_to_end(clave)
+            return previo
+        fila = con.execute(
+            "SELECT ts, lat, lon FROM lecturas WHERE clave = ? ORDER BY ts DESC LIMIT 1", (clave,)
+        ).fetchone()
+        previo = self._ultimo[clave] = tuple(fila) if fila else (None, None, None)
+        while len(self._ultimo) > self.max_animales:
+            self._ultimo.popitem(last=False)
+        return previo
+
+    def _insertar(self, lote):
+        con = self._conexion()
+        lote.sort(key=lambda f: (f[0], f[1]))
+        with con:
+            for fila in lote:
+                clave, ts = fila[0], fila[1]
+                lat, lon, temp = fila[_I_LAT], fila[_I_LON], fila[_I_TEMP]
+                ts_prev, lat_prev, lon_prev = self._previo(con, clave)
+                distancia, activo_s = 0.0, 0.0
+                en_orden = ts_prev is None or ts > ts_prev
+                if ts_prev is not None and ts > ts_prev:
+                    if fila[_I_ACT] in ("media", "alta"):
+                        activo_s = min(ts - ts_prev, self.hueco_max_s)
+                    if lat is not None and lon is not None and lat_prev is not None:
+                        distancia = _haversine(lat_prev, lon_prev, lat, lon)
+                if con.execute(_INSERT_LECTURA, fila + (distancia, activo_s)).rowcount == 0:
+                    self._contadores["duplicadas"] += 1  # misma (clave, ts) ya guardada
+                    continue
+                self._contadores["escritas"] += 1
+                con.execute(_UPSERT_RESUMEN, (
+                    clave, int(ts // 3600) * 3600,
+                    1 if temp is not None else 0, temp or 0.0, temp, temp,
+                    distancia, activo_s,
+                ))
+                if en_orden:
+                    if lat is None or lon is None:
+                        lat, lon = lat_prev, lon_prev
+                    self._ultimo[clave] = (ts, lat, lon)
+
+    # ───────── consultas ─────────
+    def rango(self, clave, desde, hasta, campos=CAMPOS):
+        """Lecturas de `clave` con desde <= ts < hasta, ordenadas por ts."""
+        campos = [c for c in campos if c in CAMPOS]
+        filas = self._conexion().execute(
+            f"SELECT ts, {', '.join(campos)} FROM lecturas WHERE clave = ? AND ts >= ? AND ts < ? ORDER BY ts",
+            (clave, float(desde), float(hasta)),
+        ).fetchall()
+        nombres = ["ts"] + campos
+        return [dict(zip(nombres, f)) for f in filas]
+
+    def agregados(self, desde, hasta, paso_s=3600, clave=None):
+        """
+        Agregados por intervalo de `paso_s` (múltiplo de 3600) para un animal o todo el hato:
+        temp media/mín/máx, distancia total (m), minutos de actividad media/alta y nº de lecturas.
+        Los intervalos de más de una hora se alinean a la hora local (un día va de
+        medianoche a medianoche en Bogotá, no en UTC); `t` es el epoch de su inicio.
+        """
+        paso_s = max(3600, int(paso_s) - int(paso_s) % 3600)
+        filtro, params = "hora >= ? AND hora < ?", [int(desde) - int(desde) % 3600, int(hasta)]
+        if clave is not None:
+            filtro = "clave = ? AND " + filtro
+            params.insert(0, clave)
+        if paso_s == 3600:
+            # el resumen ya es horario: sin GROUP BY
+            consulta = f"""
+                SELECT clave, hora, n, suma_temp / NULLIF(n_temp, 0), min_temp, max_temp,
+                       distancia, activo_s / 60.0
+                FROM resumen_hora WHERE {filtro}
+                ORDER BY clave, hora
+            """
+        else:
+            # cubetas sobre la hora local; `t` vuelve a epoch con el offset de ese instante
+            consulta = f"""
+                SELECT clave, ((hora + offset_local(hora)) / {paso_s}) * {paso_s} AS t,
+                       SUM(n), SUM(suma_temp) / NULLIF(SUM(n_temp), 0), MIN(min_temp), MAX(max_temp),
+                       SUM(distancia), SUM(activo_s) / 60.0
+                FROM resumen_hora WHERE {filtro}
+                GROUP BY clave, t ORDER BY clave, t
+            """
+        filas = self._conexion().execute(consulta, params).fetchall()
+        if paso_s > 3600:
+            filas = [(c, t - _offset_local(t - _offset_local(t)), *resto) for c, t, *resto in filas]
+        return [
+            {
+                "clave": c, "t": t, "n": n,
+                "temp_media": round(tm, 2) if tm is not None else None,
+                "temp_min": tmin, "temp_max": tmax,
+                "distancia_m": round(d, 1), "minutos_actividad": round(m, 1),
+            }
+            for c, t, n, tm, tmin, tmax, d, m in filas
+        ]
+
+
+def crear_desde_entorno():
+    """Serie de tiempo según SERIE_TIEMPO_PATH (vacío = deshabilitada)."""
+    ruta = os.getenv("SERIE_TIEMPO_PATH", "serie_tiempo.sqlite3")
+    if not ruta:
+        return None
+    return SerieTiempo(
+        ruta,
+        commit_cada_s=float(os.getenv("SERIE_TIEMPO_COMMIT_S", 0.2)),
+        hueco_max_s=float(os.getenv("SERIE_TIEMPO_HUECO_MAX_S", 900)),
+        max_animales=int(os.getenv("SERIE_TIEMPO_MAX_ANIMALES", 100_000)),
+    )
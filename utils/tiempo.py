@@ -0,0 +1,185 @@
+# tiempo.py — manejo de tiempo del camino caliente: un timestamp canónico por uplink,
+# hora local con caché por hora UTC y conversiones vectorizadas para lotes
+
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from math import isfinite
+
+import numpy as np
+import pytz
+
+# ───────── Zona horaria ─────────
+TZ = pytz.timezone("America/Bogota")
+
+# epoch_s por debajo de esto (2001-09) se toma como reloj del nodo sin sincronizar
+EPOCH_MIN = 1_000_000_000
+
+
+# ===================================================================
+# OFFSET LOCAL POR HORA UTC
+# ===================================================================
+@lru_cache(maxsize=8192)
+def _offset_hora(hora_utc):
+    """Offset local (s) para la hora UTC `hora_utc` (epoch // 3600). Una consulta a pytz por hora."""
+    return int(datetime.fromtimestamp(hora_utc * 3600, TZ).utcoffset().total_seconds())
+
+
+@lru_cache(maxsize=64)
+def _zona_fija(offset_s):
+    return timezone(timedelta(seconds=offset_s))
+
+
+def _epoch(ts):
+    try:
+        t = float(ts)
+    except (TypeError, ValueError):
+        return None
+    return t if isfinite(t) else None
+
+
+def hora_local(ts=None):
+    """Hora del día (0-23) en Bogotá para el epoch `ts` (ahora si no es válido)."""
+    t = _epoch(ts)
+    if t is None:
+        t = time.time()
+    try:
+        return int((t + _offset_hora(int(t // 3600))) // 3600 % 24)
+    except (OverflowError, OSError, ValueError):
+        return hora_local()
+
+
+def horas_locales(ts):
+    """Versión vectorizada de `hora_local`: array de epochs → array int64 de horas (NaN → ahora)."""
+    t = np.asarray(ts, dtype=float)
+    t = np.where(np.isfinite(t), t, time.time())
+    horas_utc = np.floor_divide(t, 3600).astype(np.int64)
+    unicas, inversa = np.unique(horas_utc, return_inverse=True)
+    offsets = np.array([_offset_hora(int(h)) for h in unicas.tolist()], dtype=float)
+    return (np.floor_divide(t + offsets[np.ravel(inversa)], 3600) % 24).astype(np.int64)
+
+
+def epoch_a_local_iso(ts):
+    """Epoch → ISO 8601 en hora de Bogotá (mismo texto que datetime.astimezone(TZ).isoformat())."""
+    t = float(ts)
+    return datetime.fromtimestamp(t, _zona_fija(_offset_hora(int(t // 3600)))).isoformat()
+
+
+# ===================================================================
+# ISO 8601 → LOCAL / EPOCH
+# ===================================================================
+# received_at de TTN: 'YYYY-MM-DDTHH:MM:SS[.fracción]Z' (UTC)
+_RE_UTC = re.compile(r"(\d{4}-\d\d-\d\dT\d\d):([0-5]\d):([0-5]\d)(?:\.(\d+))?Z\Z")
+
+
+@lru_cache(maxsize=4096)
+def _hora_utc(prefijo_utc):
+    """
+    'YYYY-MM-DDTHH' en UTC → (epoch de esa hora, 'YYYY-MM-DDTHH' local, '-05:00'), o el
+    local en None si el offset no es de horas enteras. Una conversión por hora, no por mensaje.
+    """
+    utc = datetime.fromisoformat(prefijo_utc + ":00:00+00:00")
+    local = utc.astimezone(TZ)
+    if local.utcoffset().total_seconds() % 3600:
+        return utc.timestamp(), None, None
+    iso = local.isoformat()
+    return utc.timestamp(), iso[:13], iso[19:]
+
+
+def iso_a_local(iso):
+    """ISO 8601 (p. ej. received_at de TTN) → ISO en hora de Bogotá; None si no se puede leer."""
+    try:
+        m = _RE_UTC.match(iso)
+        partes = _hora_utc(m.group(1)) if m else None
+        if partes is not None and partes[1] is not None:
+            # mismo texto que datetime.isoformat(): microsegundos truncados, omitidos si son 0
+            frac = (m.group(4) or "")[:6].ljust(6, "0")
+            frac = "." + frac if frac != "000000" else ""
+            return f"{partes[1]}:{m.group(2)}:{m.group(3)}{frac}{partes[2]}"
+        dt = datetime.fromisoformat(iso.replace("Z", "+00:00"))
+        return dt.astimezone(TZ).isoformat()
+    except (AttributeError, TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def iso_a_epoch(iso):
+    """ISO 8601 → epoch (s); sin zona horaria se toma como UTC. None si no se puede leer."""
+    try:
+        m = _RE_UTC.match(iso)
+        if m:
+            frac = m.group(4)
+            return (_hora_utc(m.group(1))[0] + int(m.group(2)) * 60 + int(m.group(3))
+                    + (float("0." + frac) if frac else 0.0))
+        dt = datetime.fromisoformat(iso.replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    except (AttributeError, TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def a_epoch(t):
+    """Epoch (int/float/str numérico) o ISO 8601 → segundos float; None si no se puede leer."""
+    if t is None:
+        return None
+    v = _epoch(t)
+    if v is not None:
+        return v
+    return iso_a_epoch(str(t))
+
+
+def a_epoch_lote(valores):
+    """
+    Versión vectorizada de `a_epoch`: secuencia de epochs o ISO 8601 → array float (NaN si inválido).
+    Los ISO UTC ('...Z') se parsean en un solo paso con numpy (datetime64); el resto,
+    por elemento con la caché por hora de `iso_a_epoch`.
+    """
+    try:
+        t = np.array(valores, dtype=float)
+    except (TypeError, ValueError):
+        t = np.full(len(valores), np.nan)
+        textos = []
+        for i, v in enumerate(valores):
+            e = _epoch(v)
+            if e is not None:
+                t[i] = e
+            elif isinstance(v, str):
+                textos.append(i)
+        if textos:
+            cadenas = [valores[i] for i in textos]
+            try:
+                if not all(c.endswith("Z") for c in cadenas):
+                    raise ValueError("ISO con offset")
+                t[textos] = np.array([c[:-1] for c in cadenas], dtype="datetime64[ns]").astype(np.int64) / 1e9
+            except (ValueError, TypeError, OverflowError):
+                t[textos] = [np.nan if e is None else e for e in map(iso_a_epoch, cadenas)]
+    t[~np.isfinite(t)] = np.nan
+    return t
+
+
+# ===================================================================
+# TIMESTAMP CANÓNICO DEL UPLINK
+# ===================================================================
+def ts_canonico(epoch_s=None, received_at=None, ahora=None):
+    """
+    Un solo instante (epoch s) por uplink para todas las etapas: epoch_s del nodo si es
+    plausible, si no received_at (TTN) y, en último caso, `ahora` (la hora de llegada).
+    """
+    t = _epoch(epoch_s)
+    if t is not None and t >= EPOCH_MIN:
+        return t
+    if received_at:
+        t = iso_a_epoch(received_at)
+        if t is not None:
+            return t
+    return ahora
+
+
+def ts_lectura(registro):
+    """
+    Timestamp canónico de un uplink normalizado o de su salida (`ts`); en un dict
+    sin `ts` (registros sueltos, historiales viejos), el ts_epoch si es plausible.
+    """
+    ts = registro.get("ts")
+    return ts if ts is not None else ts_canonico(registro.get("ts_epoch"))
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+from math import isfinite
+
+import numpy as np
+
+from utils.procesamiento_gps import _haversine
+
+
+class _Pista:
+    """
+    Buffer circular de los últimos fixes de un animal (arrays, no listas de dicts).
+    seg[i] guarda la distancia desde el fix anterior hasta el fix i, así al
+    expulsar el más viejo basta restar un valor de la distancia acumulada.
+    """
+    __slots__ = ("lat", "lon", "t", "seg", "inicio", "n", "distancia", "ultimo_uso")
+
+    def __init__(self, capacidad):
+        self.lat = np.empty(capacidad, dtype=float)
+        self.lon = np.empty(capacidad, dtype=float)
+        self.t = np.empty(capacidad, dtype=float)
+        self.seg = np.zeros(capacidad, dtype=float)
+        self.inicio = 0
+        self.n = 0
+        self.distancia = 0.0
+        self.ultimo_uso = 0.0
+
+    def _idx(self, k):
+        return (self.inicio + k) % len(self.t)
+
+    def _expulsar_primero(self):
+        self.inicio = self._idx(1)
+        self.n -= 1
+        # el segmento que llegaba al nuevo primero ya no cuenta
+        self.distancia -= self.seg[self.inicio]
+        self.seg[self.inicio] = 0.0
+        if self.n <= 1:
+            self.distancia = 0.0
+
+    def agregar(self, lat, lon, t, ventana_s):
+        cap = len(self.t)
+        if self.n:
+            ult = self._idx(self.n - 1)
+            t = max(t, self.t[ult])  # evita regresión temporal
+            d = _haversine(self.lat[ult], self.lon[ult], lat, lon)
+        else:
+            d = 0.0
+        if self.n == cap:
+            self._expulsar_primero()
+        i = self._idx(self.n)
+        self.lat[i], self.lon[i], self.t[i], self.seg[i] = lat, lon, t, d
+        self.n += 1
+        self.distancia += d
+        while self.n > 1 and t - self.t[self.inicio] > ventana_s:
+            self._expulsar_primero()
+
+    def metricas(self, vel_max):
+        if self.n < 2:
+            return {"distancia": 0, "velocidad": 0, "rectitud": 1}
+        p, u = self.inicio, self._idx(self.n - 1)
+        distancia = max(0.0, self.distancia)
+        duracion = max(0.0, self.t[u] - self.t[p])
+        velocidad = (distancia / duracion) if duracion > 0 else 0.0
+        if velocidad > vel_max:
+            velocidad = 0.0
+        neto = _haversine(self.lat[p], self.lon[p], self.lat[u], self.lon[u])
+        rectitud = (neto / distancia) if distancia > 0 else 1.0
+        rectitud = float(min(1.0, max(0.0, rectitud)))
+        return {
+            "distancia": round(float(distancia), 2),
+            "velocidad": round(float(velocidad), 2),
+            "rectitud": round(rectitud, 2),
+        }
+
+
+class AlmacenTrayectorias:
+    """
+    Trayectoria incremental por animal (cow_id / DevEUI) alimentada uplink a uplink.
+    - Cada animal guarda como máximo `capacidad` fixes dentro de `ventana_s` segundos.
+    - distancia/velocidad/rectitud se actualizan en O(1) por uplink.
+    - Animales sin datos por más de `inactividad_s` (o por encima de `max_animales`)
+      se expulsan en orden LRU para acotar la memoria.
+    """
+
+    def __init__(self, capacidad=32, ventana_s=3600.0, inactividad_s=86400.0,
+                 max_animales=50000, vel_max=20.0):
+        self.capacidad = max(2, int(capacidad))
+        self.ventana_s = float(ventana_s)
+        self.inactividad_s = float(inactividad_s)
+        self.max_animales = int(max_animales)
+        self.vel_max = vel_max
+        self._pistas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pistas)
+
+    def agregar(self, clave, lat, lon, ts=None):
+        """Suma un fix a la pista del animal y devuelve sus métricas actualizadas."""
+        ahora = time.time()
+        try:
+            t = float(ts)
+            if not isfinite(t):
+                t = ahora
+        except (TypeError, ValueError):
+            t = ahora
+
+        with self._lock:
+            pista = self._pistas.get(clave)
+            if pista is None:
+                pista = self._pistas[clave] = _Pista(self.capacidad)
+            else:
+                self._pistas.move_to_end(clave)
+            pista.ultimo_uso = ahora
+            pista.agregar(float(lat), float(lon), t, self.ventana_s)
+            metricas = pista.metricas(self.vel_max)
+            self._expulsar_inactivos(ahora)
+        return metricas
+
+    def metricas(self, clave):
+        with self._lock:
+            pista = self._pistas.get(clave)
+            return pista.metricas(self.vel_max) if pista else None
+
+    def _expulsar_inactivos(self, ahora):
+        while self._pistas:
+            clave, pista = next(iter(self._pistas.items()))
+            if len(self._pistas) <= self.max_animales and ahora - pista.ultimo_uso <= self.inactividad_s:
+                break
+            self._pistas.popitem(last=False)
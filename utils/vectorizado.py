@@ -0,0 +1,59 @@
+import numpy as np
+from math import isfinite
+
+
+def a_flotantes(valores):
+    """
+    Convierte una secuencia a array float64; lo inválido (None, texto, NaN, inf) queda como NaN.
+    Equivale a aplicar `_to_float_or_none` elemento a elemento, pero sin bucle en el caso común.
+    """
+    try:
+        arr = np.asarray(valores, dtype=float)
+    except (TypeError, ValueError):
+        arr = np.array([_float_o_nan(v) for v in valores], dtype=float)
+    arr = np.atleast_1d(arr).copy()
+    arr[~np.isfinite(arr)] = np.nan
+    return arr
+
+
+def _float_o_nan(x):
+    try:
+        if x is None: return np.nan
+        xf = float(x)
+        return xf if isfinite(xf) else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def redondear(arr, decimales):
+    """
+    Igual que round(x, decimales) de Python elemento a elemento.
+    np.round puede diferir cuando x*10^d queda a un ulp de .5; esos casos
+    (muy pocos) se recalculan con round() para que ambos caminos coincidan.
+    """
+    arr = np.asarray(arr, dtype=float)
+    escala = 10.0 ** decimales
+    escalado = arr * escala
+    out = np.round(escalado) / escala
+    frac = np.abs(escalado - np.floor(escalado) - 0.5)
+    dudosos = np.flatnonzero(frac < 1e-6)
+    if dudosos.size:
+        out = out.copy()
+        for i in dudosos:
+            out[i] = round(float(arr[i]), decimales)
+    return out
+
+
+def a_lista(arr):
+    """Array float → lista de Python con NaN convertido a None."""
+    arr = np.asarray(arr)
+    if arr.dtype.kind != "f":
+        return arr.tolist()
+    return [None if v != v else v for v in arr.tolist()]
+
+
+def a_registros(columnas):
+    """Columnas {nombre: array} → lista de dicts por lectura (formato de las funciones escalares)."""
+    nombres = list(columnas)
+    listas = [a_lista(columnas[n]) for n in nombres]
+    return [dict(zip(nombres, fila)) for fila in zip(*listas)]
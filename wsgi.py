@@ -0,0 +1,14 @@
+# wsgi.py — punto de entrada para servidores WSGI de producción
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Los hilos de fondo (cola TB, outbox, línea base, historial, logs) no se
+# arrancan al importar: con preload_app el import ocurre en el master y cada
+# worker los arranca en post_fork (ver gunicorn.conf.py).
+
+import os
+
+os.environ.setdefault("INICIO_DIFERIDO", "1")
+
+from app import app, iniciar_servicios, detener_servicios  # noqa: E402
+